@@ -1,14 +1,46 @@
 # -*- coding: utf-8 -*-
 """
 Game Engine Toolkit
+
+Submodules are imported on first use of one of their names, so
+`from amethyst_games import Filter` does not load the engine or plugins.
 """
 # SPDX-License-Identifier: LGPL-3.0
 
 __version__ = "0.6.0"
 
-from amethyst_games.engine import *    # noqa: F401, F403
-from amethyst_games.filters import *   # noqa: F401, F403
-from amethyst_games.notice import *    # noqa: F401, F403
-from amethyst_games.plugin import *    # noqa: F401, F403
-from amethyst_games.plugins import *   # noqa: F401, F403
-from amethyst_games.util import *      # noqa: F401, F403
+import importlib
+
+# Names exported by each submodule (their __all__)
+_exports = {
+    "blueprint": "EngineBlueprint EnginePool",
+    "engine":  "Engine",
+    "filters": "IFilter Filter FILTER_ALL IFilterable Filterable FilterIndex",
+    "notice":  "Notice NoticeType",
+    "plugin":  "EnginePlugin action event_listener",
+    "plugins": "Clock Grant GrantManager Grid ObjectStore Replica SimultaneousPhase Turns",
+    "replica": "ReplicaWriter ReplicaReader",
+    "storage": "DictStorage SqliteStorage Snapshot",
+    "timer":   "TimerQueue",
+    "transport": "GameServer GameClient ClientConnection Channel compression_dictionary",
+    "util":    """
+        GAME_MASTER NOBODY nonce random tupley
+        AmethystGameException NotificationSequenceException PluginCompatibilityException UnknownActionException
+    """,
+}
+_origin = { name: module for module, names in _exports.items() for name in names.split() }
+
+__all__ = list(_origin)
+
+
+def __getattr__(name):
+    module = _origin.get(name)
+    if module is None:
+        raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+    value = getattr(importlib.import_module("amethyst_games." + module), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""
+Engine classes generated from a validated plugin configuration.
+"""
+# SPDX-License-Identifier: LGPL-3.0
+__all__ = 'EngineBlueprint EnginePool'.split()
+
+import copy
+import threading
+
+from amethyst_games.engine import Engine
+from amethyst_games.util import PluginCompatibilityException, tupley
+
+
+def _slot_method(name, idx, func):
+    def method(self, *args, **kwargs):
+        return func(self.plugins[idx], self, *args, **kwargs)
+    method.__name__ = name
+    method.__qualname__ = name
+    method.__doc__ = func.__doc__
+    return method
+
+
+class EngineBlueprint(object):
+    """
+    A plugin configuration which is validated once and turned into an
+    Engine subclass. Games created from a blueprint skip dependency
+    checks and per-instance method wrappers, the plugin engine methods
+    are real methods of the generated class:
+
+        blueprint = EngineBlueprint(Engine, [
+            GrantManager,
+            Turns,
+            (Grid, lambda game: dict(width=game.width, height=game.height)),
+            (TicTacToe, dict(), "TicTacToe"),
+        ])
+        game = blueprint.new(dict(players=[0, 1]))
+
+    Each plugin is given as a class or as a tuple `(CLASS, KWARGS)` or
+    `(CLASS, KWARGS, NAME)`. KWARGS is a dict (copied for every game) or
+    a callable which receives the new engine (after its attributes are
+    set) and returns the dict. Plugins are constructed and registered in
+    the listed order.
+
+    The engine class should not register plugins in its constructor.
+    Additional plugins may still be added to a game with
+    `register_plugin()`.
+
+    `reset()` of a generated engine resets the plugins with the blueprint
+    KWARGS, so games can be recycled (see `EnginePool`).
+
+    :ivar engine_class: The generated Engine subclass.
+    """
+    def __init__(self, engine_class=Engine, plugins=(), name=None):
+        self.base = engine_class
+        self.slots = []
+        names = set()
+        methods = dict()
+        for idx, spec in enumerate(plugins):
+            cls, kwargs, pname = self._spec(spec)
+            # Prototype, to check compatibility and resolve method names
+            proto = cls(**(copy.deepcopy(kwargs) if isinstance(kwargs, dict) else {}))
+            names.add(pname)
+            for dep in tupley(cls.AMETHYST_ENGINE_DEPENDS):
+                if dep not in names:
+                    raise PluginCompatibilityException("Plugin {} requires plugin {}".format(pname, dep))
+            for meth, attr in proto.engine_methods():
+                if meth in methods or hasattr(engine_class, meth):
+                    raise PluginCompatibilityException("Engine already has a method '{}' (attempted override by {})".format(meth, pname))
+                methods[meth] = _slot_method(meth, idx, getattr(cls, attr))
+            self.slots.append((cls, kwargs, pname))
+
+        blueprint = self
+        def __init__(self, *args, **kwargs):
+            engine_class.__init__(self, *args, **kwargs)
+            for cls, plugin_kwargs, pname in blueprint.slots:
+                if callable(plugin_kwargs):
+                    plugin_kwargs = plugin_kwargs(self)
+                else:
+                    plugin_kwargs = copy.deepcopy(plugin_kwargs)
+                self._attach_plugin(cls(**plugin_kwargs), pname)
+
+        def reset(self, *args, plugin_attrs=None, **kwargs):
+            if plugin_attrs is None:
+                plugin_attrs = [ kw if callable(kw) else copy.deepcopy(kw) for cls, kw, pname in blueprint.slots ]
+            return engine_class.reset(self, *args, plugin_attrs=plugin_attrs, **kwargs)
+        reset.__doc__ = engine_class.reset.__doc__
+
+        methods.update(
+            __init__=__init__,
+            reset=reset,
+            __module__=engine_class.__module__,
+            __doc__=engine_class.__doc__,
+            amethyst_register_type=False,
+        )
+        self.engine_class = type(name or engine_class.__name__, (engine_class,), methods)
+
+    @staticmethod
+    def _spec(spec):
+        if isinstance(spec, type):
+            spec = (spec,)
+        cls = spec[0]
+        kwargs = spec[1] if len(spec) > 1 and spec[1] is not None else dict()
+        name = spec[2] if len(spec) > 2 else cls.__name__
+        return cls, kwargs, name
+
+    def new(self, *args, **kwargs):
+        """Create a game, arguments are passed to the engine constructor."""
+        return self.engine_class(*args, **kwargs)
+
+    __call__ = new
+
+
+class EnginePool(object):
+    """
+    Bounded pool of reusable games built from an `EngineBlueprint`.
+
+        pool = EnginePool(blueprint, size=100)
+        game = pool.acquire(dict(players=[0, 1]))
+        ...
+        pool.release(game)
+
+    Released games are `reset()` right away (cancelling their timers and
+    dropping their observers) and kept for a later `acquire()` while the
+    pool holds fewer than `size` idle games. The pool is thread-safe.
+    """
+    def __init__(self, blueprint, size=64):
+        self.blueprint = blueprint
+        self.size = size
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._idle)
+
+    def acquire(self, *args, **kwargs):
+        """
+        Return an idle game or a new one. Arguments are engine attributes,
+        as for the engine constructor.
+        """
+        with self._lock:
+            game = self._idle.pop() if self._idle else None
+        if game is None:
+            return self.blueprint.new(*args, **kwargs)
+        if args or kwargs:
+            game.reset(*args, **kwargs)
+        return game
+
+    def release(self, game):
+        """
+        Reset a finished game and keep it for reuse. Returns False if the
+        pool is full and the game was discarded.
+        """
+        if type(game) is not self.blueprint.engine_class:
+            raise Exception("Game was not built from the pool blueprint")
+        game.reset()
+        with self._lock:
+            if any(g is game for g in self._idle):
+                return True
+            if len(self._idle) < self.size:
+                self._idle.append(game)
+                return True
+        return False
@@ -6,14 +6,18 @@
 __all__ = 'Engine'.split()
 
 import copy
+import importlib
 import json
 import queue
+import sys
 import warnings
+import weakref
 
 from amethyst.core import Object, Attr, cached_property
 
 from amethyst_games.notice import Notice, NoticeType
-from amethyst_games.util import AmethystWriteLocker
+from amethyst_games.timer import TimerQueue
+from amethyst_games.util import AmethystWriteLocker, AmethystGameException
 from amethyst_games.util import UnknownActionException, PluginCompatibilityException, NotificationSequenceException
 from amethyst_games.util import random
 from amethyst_games.util import tupley
@@ -24,6 +28,15 @@ NoticeType.register(INIT="::init")
 ENGINE_CALL_ORDER = "before action after".split()
 ENGINE_CALL_TYPES = ENGINE_CALL_ORDER + "check init notify undo".split()
 
+# Modules defining the package's amethyst types. The package imports them
+# lazily, so loads() imports them when it meets one of their type keys.
+_TYPE_PREFIX = "__amethyst_games."
+_TYPE_MODULES = frozenset("amethyst_games." + name for name in """
+    filters notice plugin storage
+    plugins.clock plugins.grants plugins.grid plugins.object_store
+    plugins.replica plugins.simultaneous plugins.turns
+""".split())
+
 class Engine(AmethystWriteLocker, Object):
     """
     Engine
@@ -37,19 +50,33 @@ class Engine(AmethystWriteLocker, Object):
     # Private attributes:
     #   _client_mode:  bool: True when running in client mode
     #   _client_seq:    int: client event sequence number
+    #   _acting:        int: depth of actions being executed
+    #   _notice_codes: dict: TYPE => CODE, negotiated wire codes (see set_notice_codes)
+    #   _notice_types: list: CODE => TYPE
+    #   _notice_table: dict: active code table
     #   initialization_data: dict: cached initialization data
     #   journal:       list: tuple(action, kwargs)
     #   notified:      dict: PLAYER => [ [ COUNTER, CALLBACK ], ... ]
     #   plugin_names:   set: set of plugin names for dependency resolution
     #   plugins        lsit: plugin Objects
+    #   timers:  TimerQueue: delivers call_later() callbacks to our queue
+    #   _timer_handles: WeakSet: pending call_later() handles, cancelled by reset()
 
     def __init__(self, *args, **kwargs):
         client = kwargs.pop("client", False)
+        self.timers = kwargs.pop("timers", None)
+        if self.timers is None:
+            self.timers = TimerQueue.default()
         self.plugins = []
         super(Engine,self).__init__(*args, **kwargs)
 
         self._client_mode = client
         self._client_seq = 0
+        self._acting = 0
+        self._notice_codes = None
+        self._notice_types = None
+        self._notice_table = None
+        self._timer_handles = weakref.WeakSet()
         self._event_dispatch = {
             NoticeType.CALL: [
                 lambda game, seq, player_num, notice: self.call_immediate(notice.name, notice.data),
@@ -79,6 +106,8 @@ class Engine(AmethystWriteLocker, Object):
                     self.notify_immediate(*args, **kwargs)
                 elif typ == 'dispatch':
                     self.dispatch_immediate(*args, **kwargs)
+                elif typ == 'timer':
+                    args[0](self, *args[1:], **kwargs)
                 elif typ == 'exit':
                     return False
                 else:
@@ -119,6 +148,28 @@ class Engine(AmethystWriteLocker, Object):
         self._queue.put(('notify', args, kwargs))
         return self
 
+    def call_later(self, delay, callback, *args):
+        """
+        Arrange for `callback(engine, *args)` to be called from the run
+        queue after `delay` seconds. Returns a handle whose `.cancel()`
+        method will prevent the call.
+        """
+        return self.call_at(self.timers.clock() + delay, callback, *args)
+
+    def call_at(self, when, callback, *args):
+        """
+        Arrange for `callback(engine, *args)` to be called from the run
+        queue at time `when` (as measured by `self.timers.clock`,
+        `time.monotonic` by default). Returns a cancelable handle.
+        """
+        handle = self.timers.add(when, self, ('timer', (callback,) + args, {}))
+        self._timer_handles.add(handle)
+        return handle
+
+    def is_acting(self):
+        """True while the before, action, and after callbacks of an action are running"""
+        return self._acting > 0
+
     def is_client(self):
         """True when running in client mode"""
         return self._client_mode
@@ -232,16 +283,24 @@ class Engine(AmethystWriteLocker, Object):
                 self.undoable += 1
 
                 # Execute the action
-                for action, plugin in actions:
-                    action.call('before', plugin, self, stash, **kwargs)
-                for action, plugin in actions:
-                    action.call('action', plugin, self, stash, **kwargs)
-                for action, plugin in actions:
-                    action.call('after', plugin, self, stash, **kwargs)
+                self._acting += 1
+                try:
+                    for action, plugin in actions:
+                        action.call('before', plugin, self, stash, **kwargs)
+                    for action, plugin in actions:
+                        action.call('action', plugin, self, stash, **kwargs)
+                    for action, plugin in actions:
+                        action.call('after', plugin, self, stash, **kwargs)
+                finally:
+                    self._acting -= 1
 
                 # TODO: Undoable actions
                 self.commit()
 
+            # Plugins may have batched up notices during the action
+            for plugin in self.plugins:
+                plugin.on_action_end(self, name, stash)
+
             # If anyone wants to be notified, send them notification information.
             for player_num in self.notified:
                 p_kwargs = copy.deepcopy(kwargs)
@@ -346,7 +405,7 @@ class Engine(AmethystWriteLocker, Object):
     def has_plugin(self, plugin):
         if isinstance(plugin, type):
             plugin = plugin.__name__
-        return plugin in self.plugin
+        return plugin in self.plugin_names
 
     def register_plugin(self, plugin, name=None):
         """
@@ -361,13 +420,7 @@ class Engine(AmethystWriteLocker, Object):
             if dep not in self.plugin_names:
                 raise PluginCompatibilityException("Plugin {} requires plugin {}".format(name, dep))
 
-        for attr in tupley(plugin.AMETHYST_ENGINE_METHODS):
-            meth = attr[1:] if attr.startswith("_") else attr
-            if plugin.amethyst_method_prefix:
-                meth = "{}{}".format(plugin.amethyst_method_prefix, meth)
-            if plugin.amethyst_method_suffix:
-                meth = "{}{}".format(meth, plugin.amethyst_method_suffix)
-
+        for meth, attr in plugin.engine_methods():
             if hasattr(self, meth):
                 raise PluginCompatibilityException("Engine already has a method '{}' (attempted override by {})".format(meth, name))
             self._register_method(meth, getattr(plugin, attr))
@@ -383,11 +436,62 @@ class Engine(AmethystWriteLocker, Object):
         )
 
 
+    def _attach_plugin(self, plugin, name):
+        """Register a plugin whose engine methods are already on the class (see EngineBlueprint)"""
+        self.plugins.append(plugin)
+        self.plugin_names.add(name)
+        plugin.on_assign_to_game(self)
+
+
+    def reset(self, *args, plugin_attrs=None, **kwargs):
+        """
+        Return the engine and every plugin to their newly constructed
+        (pre-`initialize`) state so the engine can be reused for another
+        game. Engine attributes are set from the passed data as in the
+        constructor, plugins are reset by `EnginePlugin.reset()` with the
+        corresponding entry of `plugin_attrs` (a dict, or a callable which
+        receives the engine and returns a dict, None to reuse the arguments
+        the plugin was constructed with).
+
+        The journal, observers, and run queue are cleared and pending
+        `call_later()` timers are cancelled. Plugins, event listeners,
+        client mode, and notice codes are kept.
+        """
+        for handle in tuple(self._timer_handles):
+            handle.cancel()
+        self._timer_handles = weakref.WeakSet()
+        self._queue = queue.Queue()
+        self.journal = [ ]
+        self.notified = dict()
+        self._client_seq = 0
+        self._acting = 0
+
+        self.make_mutable()
+        self.dict = dict()
+        data = dict()
+        for d in args:
+            data.update(d)
+        data.update(kwargs)
+        if data:
+            self.load_data(data, verifyclass=False)
+        for name, attr in self._attrs.items():
+            if attr.default is not None and name not in self.dict:
+                self.dict[name] = attr.get_default()
+
+        for idx, p in enumerate(self.plugins):
+            attrs = plugin_attrs[idx] if plugin_attrs is not None and idx < len(plugin_attrs) else None
+            p.reset(self, attrs(self) if callable(attrs) else attrs)
+        del self.initialization_data
+        return self
+
     def initialize(self, attrs=None):
         self.initialize_early(attrs)
 
         if attrs is not None:
             plugin_init = attrs.pop("plugin_init", [])
+            notice_codes = attrs.pop("notice_codes", None)
+            if notice_codes:
+                self.set_notice_codes(notice_codes)
             self.load_data(attrs, verifyclass=False)
             for idx, p in enumerate(self.plugins):
                 p.initialize_early(self, plugin_init[idx] if idx < len(plugin_init) else None)
@@ -420,13 +524,27 @@ class Engine(AmethystWriteLocker, Object):
     def initialization_data(self):
         data = copy.deepcopy(self.dict)
         data["plugin_init"] = [ p.initialization_data for p in self.plugins ]
+        if self._notice_table is not None:
+            data["notice_codes"] = self._notice_table
         return data
 
     def get_state(self, player_num):
         d = copy.deepcopy(self.dict)
-        d['plugin_state'] = [ p.get_state(player_num) for p in tupley(d.pop('plugins', [])) ]
+        d['plugin_state'] = [ p.get_state(player_num) for p in self.plugins ]
         return d
 
+    def get_states(self, player_nums):
+        """
+        Return a dict mapping each of the given players to their state, as
+        `get_state()` would. Parts of the state which are the same for
+        several players are copied once and shared (see
+        `EnginePlugin.state_views`), so the states must not be modified.
+        """
+        player_nums = tuple(player_nums)
+        base = copy.deepcopy(self.dict)
+        views = [ p.state_views(player_nums) for p in self.plugins ]
+        return { p: dict(base, plugin_state=[ v[idx] for v in views ]) for idx, p in enumerate(player_nums) }
+
     def set_state(self, state):
         plugin_state = state.pop("plugin_state", [])
         self.set(**state)
@@ -451,6 +569,65 @@ class Engine(AmethystWriteLocker, Object):
     def loads(self, data):
         return json.loads(data, object_hook=self.JSONObjectHook)
 
+    def encode_event(self, seq, player_num, notice):
+        """
+        Return the JSON encoding of an observer event, `[seq, player_num,
+        notice]`. The notice is encoded only once however many observers
+        it is sent to (see `Notice.encoded`).
+        """
+        return "[{}, {}, {}]".format(self.dumps(seq), self.dumps(player_num), notice.encoded(self.dumps))
+
+    def set_notice_codes(self, table=None):
+        """
+        Send notice types as numeric codes rather than strings.
+
+        `table` is a code table as returned by `NoticeType.code_table()`
+        (the default). Both ends of a connection must use the same table,
+        so servers include the active table in their `initialization_data`
+        and clients adopt it in `initialize()`. Pass `False` to go back to
+        sending type strings.
+
+        Returns the active table (or None).
+
+        :raises AmethystGameException: If the table version does not match
+        its types (corrupt or incompatible table).
+        """
+        if table is False:
+            self._notice_codes = self._notice_types = None
+            self._notice_table = None
+            return None
+        if table is None:
+            table = NoticeType.code_table()
+        types = list(table.get("types", ()))
+        if table.get("version") != NoticeType.table_version(types):
+            raise AmethystGameException("Notice code table version mismatch")
+        self._notice_types = types
+        self._notice_codes = { t: code for code, t in enumerate(types) }
+        self._notice_table = dict(version=table["version"], types=types)
+        del self.initialization_data
+        return self._notice_table
+
+    def JSONEncoder(self, obj):
+        if self._notice_codes is not None and obj.__class__ is Notice and obj.type in self._notice_codes:
+            return { Notice._dundername: dict(obj.dict, type=self._notice_codes[obj.type]) }
+        return super().JSONEncoder(obj)
+
+    def JSONObjectHook(self, obj):
+        if self._notice_types is not None and len(obj) == 1 and Notice._dundername in obj:
+            data = obj[Notice._dundername]
+            code = data.get("type") if isinstance(data, dict) else None
+            if isinstance(code, int):
+                if not 0 <= code < len(self._notice_types):
+                    raise AmethystGameException("Unknown notice code {}".format(code))
+                data["type"] = self._notice_types[code]
+        if len(obj) == 1:
+            for key in obj:
+                if key.startswith(_TYPE_PREFIX):
+                    module = key[2:-2].rpartition(".")[0]
+                    if module in _TYPE_MODULES and module not in sys.modules:
+                        importlib.import_module(module)
+        return super().JSONObjectHook(obj)
+
     def register_event_listener(self, type, listener):
         if type not in self._event_dispatch:
             self._event_dispatch[type] = []
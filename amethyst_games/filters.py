@@ -13,6 +13,8 @@ IFilter
 IFilterable
    Filterable
 
+FilterIndex
+
 """.split()
 
 from amethyst.core import Object, Attr
@@ -224,10 +226,159 @@ class Filterable(IFilterable, Object):
     id = Attr(isa=str, default=nonce, OVERRIDE=True)
     name = Attr(isa=str, OVERRIDE=True)
     type = Attr(isa=str, OVERRIDE=True)
-    flags = Attr(isa=set, default=set, OVERRIDE=True)
+    flags = Attr(set, default=set, OVERRIDE=True)
 
     def __init__(self, *args, **kwargs):
         super(Filterable,self).__init__(*args, **kwargs)
         self.make_immutable()
     def make_immutable(self):
         self.amethyst_make_immutable()
+
+
+class FilterIndex(object):
+    """
+    Inverted index of filterables by id, name, type, and flag.
+
+    Entries are stored under caller-chosen keys (for instance, `(player,
+    id)` pairs) so that the same filterable may be indexed more than once.
+    The index only narrows a search, callers must still test the
+    candidates returned by `lookup()` with `filt.accepts()`.
+
+        index = FilterIndex()
+        index.add(key, obj)
+        keys = index.lookup(filt)
+        if keys is None:
+            keys = all_keys     # filter not indexable, scan everything
+        matches = [ k for k in keys if filt.accepts(objects[k]) ]
+
+    Objects must not change their id, name, type, or flags while indexed
+    (`Filterable` objects are immutable, so this is usually not an issue).
+    """
+    def __init__(self):
+        self._terms = dict()
+
+    def __bool__(self):
+        return bool(self._terms)
+
+    @staticmethod
+    def terms(obj):
+        """Iterate the index terms of a filterable."""
+        yield ("id", obj.id)
+        if obj.name is not None:
+            yield ("name", obj.name)
+        if obj.type is not None:
+            yield ("type", obj.type)
+        for flag in (obj.flags or ()):
+            yield ("flag", flag)
+
+    def add(self, key, obj):
+        """Index obj under key."""
+        for term in self.terms(obj):
+            if term in self._terms:
+                self._terms[term].add(key)
+            else:
+                self._terms[term] = { key }
+
+    def discard(self, key, obj):
+        """Remove key from the index. obj must be the object indexed under key."""
+        for term in self.terms(obj):
+            keys = self._terms.get(term)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._terms[term]
+
+    def clear(self):
+        self._terms.clear()
+
+    def get(self, field, value):
+        """
+        Return a new set of keys whose object has the given field value
+        (field is one of "id", "name", "type", or "flag").
+        """
+        return set(self._keys(field, value))
+
+    def _keys(self, field, value):
+        """Iterable of keys for a single term. Override to change storage."""
+        return self._terms.get((field, value), ())
+
+    def count(self, field, value):
+        """Return the number of keys whose object has the given field value."""
+        return len(self._terms.get((field, value), ()))
+
+    def lookup(self, filt):
+        """
+        Return a set of candidate keys which may be accepted by the filter
+        or `None` if the filter can not be answered by the index.
+
+        Supports `Filter` objects as well as `&` and `|` combinations of
+        them. Other filters (including negations) return `None`.
+        """
+        if isinstance(filt, Filter):
+            return self._lookup_filter(filt)
+        if isinstance(filt, AndFilter):
+            left, right = self.lookup(filt.left), self.lookup(filt.right)
+            if left is None:
+                return right
+            if right is None:
+                return left
+            return left & right
+        if isinstance(filt, OrFilter):
+            left = self.lookup(filt.left)
+            if left is None:
+                return None
+            right = self.lookup(filt.right)
+            if right is None:
+                return None
+            return left | right
+        return None
+
+    def _lookup_item(self, field, test):
+        if test is None:
+            return None
+        if isinstance(test, str):
+            return self.get(field, test)
+        if isinstance(test, (list, tuple, set, frozenset)):
+            rv = set()
+            for t in test:
+                rv.update(self._keys(field, t))
+            return rv
+        return None
+
+    def _lookup_flags(self, test):
+        if test is None:
+            return None
+        if isinstance(test, str):
+            return self.get("flag", test)
+        if isinstance(test, (list, tuple)):
+            # ALL flags required, an empty list accepts everything
+            rv = None
+            for t in test:
+                keys = self._keys("flag", t)
+                rv = set(keys) if rv is None else rv.intersection(keys)
+            return rv
+        if isinstance(test, (set, frozenset)):
+            return self._lookup_item("flag", test)
+        return None
+
+    def _lookup_filter(self, filt):
+        found = [
+            self._lookup_item("id", filt.id),
+            self._lookup_item("name", filt.name),
+            self._lookup_item("type", filt.type),
+            self._lookup_flags(filt.flag),
+        ]
+
+        if filt.any:
+            subs = [ self.lookup(f) for f in filt.any ]
+            if None not in subs:
+                found.append(set().union(*subs))
+
+        if filt.all:
+            found.extend(self.lookup(f) for f in filt.all)
+
+        rv = None
+        for keys in found:
+            if keys is not None:
+                rv = keys if rv is None else rv & keys
+        return rv
@@ -5,6 +5,8 @@
 # SPDX-License-Identifier: LGPL-3.0
 __all__ = 'Notice NoticeType'.split()
 
+import hashlib
+import importlib
 import warnings
 
 from amethyst.core import Attr
@@ -12,8 +14,33 @@ from amethyst.core import Attr
 from amethyst_games.filters import Filterable
 from amethyst_games.util import AmethystGameException
 
-class NoticeType(object):
+# Modules which register the notice types of the engine and bundled plugins
+_BUILTIN_TYPES = "amethyst_games.engine amethyst_games.plugins.clock amethyst_games.plugins.grants amethyst_games.plugins.grid amethyst_games.plugins.object_store amethyst_games.plugins.simultaneous".split()
+_builtin_loaded = False
+
+def _load_builtin_types():
+    """Import the modules registering built-in notice types (once). Returns True on the first call."""
+    global _builtin_loaded
+    if _builtin_loaded:
+        return False
+    _builtin_loaded = True
+    for name in _BUILTIN_TYPES:
+        importlib.import_module(name)
+    return True
+
+
+class _NoticeTypeMeta(type):
+    def __getattr__(self, key):
+        # The package imports plugins lazily, so the types they register
+        # may not exist yet. Load them before giving up.
+        if key.isupper() and _load_builtin_types():
+            return getattr(self, key)
+        raise AttributeError("NoticeType has no type '{}'".format(key))
+
+
+class NoticeType(object, metaclass=_NoticeTypeMeta):
     _tokens = dict()
+    _table = None
 
     @classmethod
     def register(self, **kwargs):
@@ -49,7 +76,7 @@ class NoticeType(object):
                 raise AmethystGameException("Notice type must be a valid identifier, got '{}'".format(key))
             if key != key.upper():
                 raise AmethystGameException("Notice type must be upper-case, got '{}'".format(key))
-            if hasattr(self, key):
+            if key in vars(self):
                 if token == getattr(self, key):
                     warnings.warn("Duplicate notice type declaration of '{}'".format(key))
                     continue
@@ -60,6 +87,7 @@ class NoticeType(object):
 
             setattr(self, key, token)
             self._tokens[token] = key
+            NoticeType._table = None
 
     @classmethod
     def names(self):
@@ -68,6 +96,30 @@ class NoticeType(object):
         """
         return self._tokens.values()
 
+    @classmethod
+    def code_table(self):
+        """
+        Return the numeric code table of all registered types, used to
+        send notice types as small integers (see `Engine.set_notice_codes`).
+
+            dict(version="...", types=[ "::call", "::clock", ... ])
+
+        The code of a type is its position in the `types` list. Types are
+        sorted, so processes with the same registrations derive the same
+        table. `version` is a hash of the types, the same version means
+        the same codes.
+        """
+        _load_builtin_types()
+        if NoticeType._table is None:
+            types = sorted(self._tokens)
+            NoticeType._table = dict(version=self.table_version(types), types=types)
+        return NoticeType._table
+
+    @staticmethod
+    def table_version(types):
+        """Version hash of a list of types."""
+        return hashlib.sha1("\n".join(types).encode("utf-8")).hexdigest()[:16]
+
     @classmethod
     def items(self):
         """Iterate known identifiers and types, like dict.items()."""
@@ -78,3 +130,24 @@ class NoticeType(object):
 class Notice(Filterable):
     source = Attr(isa=str)
     data = Attr(isa=dict)
+
+    def encoded(self, dumps):
+        """
+        Return `dumps(self)`, computed once per codec.
+
+        Notices sent to several observers are the same object, so network
+        observers should use this rather than encoding the notice
+        themselves (see also `Engine.encode_event`):
+
+            def observer(game, seq, player_num, notice):
+                conn.send(notice.encoded(game.dumps))
+
+        Notices must not be modified after they are sent.
+        """
+        cache = getattr(self, "_encoded", None)
+        if cache is None:
+            cache = self._encoded = dict()
+        data = cache.get(dumps)
+        if data is None:
+            data = cache[dumps] = dumps(self)
+        return data
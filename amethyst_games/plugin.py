@@ -16,6 +16,7 @@ import amethyst.core.obj
 from amethyst.core import Object, Attr, cached_property
 
 from amethyst_games.util import PluginCompatibilityException, nonce
+from amethyst_games.util import GAME_MASTER, tupley
 
 
 class event_listener(object):
@@ -192,6 +193,15 @@ class action(object):
 #         return self
 
 
+def _owned_part(value, player):
+    """The part of an "owner" visibility value which belongs to player."""
+    if isinstance(value, dict):
+        return { player: copy.deepcopy(value[player]) } if player in value else {}
+    if isinstance(value, list):
+        return [ copy.deepcopy(v) if i == player else None for i, v in enumerate(value) ]
+    return None
+
+
 class PluginMetaclass(amethyst.core.obj.AttrsMetaclass):
     def __new__(cls, class_name, bases, attrs):
         actions = dict()
@@ -232,6 +242,20 @@ class EnginePlugin(Object, BasePlugin):
         integer portion of this value. (See `compat`)
     :type AMETHYST_PLUGIN_COMPAT: float or int
 
+    :cvar AMETHYST_STATE_VISIBILITY: dict mapping attribute names to their
+        visibility in `get_state()`. Attributes not listed are "public".
+
+        * "public": visible to everyone. Copied once and shared between
+          the states built by a single `state_views()` call.
+        * "owner": a dict keyed by player number (or a list indexed by
+          player number), each player only sees their own entry.
+        * "master": only visible to GAME_MASTER (e.g., saved games).
+        * "derived": never included, rebuilt by the plugin (e.g., in
+          `set_state()`).
+        * callable: `visibility(plugin, player, value)` returns the value
+          to show to the player (copied by the callable as needed).
+    :type AMETHYST_STATE_VISIBILITY: dict
+
     :ivar compat: Version number of instance. When plugin data is
         deserialized, this value is compared against the class variable
         `AMETHYST_PLUGIN_COMPAT`. If they do not have the same integer
@@ -245,9 +269,16 @@ class EnginePlugin(Object, BasePlugin):
     # constructed objects over the wire. Allows server to verify that the
     # server plugin version is compatible with the client plugin version.
     AMETHYST_PLUGIN_COMPAT  = None
+    AMETHYST_STATE_VISIBILITY = {}
     compat = Attr(float)
     id = Attr(isa=str, default=nonce)
 
+    def __new__(cls, *args, **kwargs):
+        self = super().__new__(cls)
+        # Constructor arguments (by reference), copied by reset()
+        self._constructor_args = (args, kwargs)
+        return self
+
     def __init__(self, *args, **kwargs):
         self.amethyst_method_prefix = kwargs.pop("amethyst_method_prefix", self.AMETHYST_ENGINE_DEFAULT_METHOD_PREFIX)
         self.amethyst_method_suffix = kwargs.pop("amethyst_method_suffix", self.AMETHYST_ENGINE_DEFAULT_METHOD_SUFFIX)
@@ -259,6 +290,22 @@ class EnginePlugin(Object, BasePlugin):
         if int(self.compat) != int(self.AMETHYST_PLUGIN_COMPAT):
             raise PluginCompatibilityException("Plugin {} imported incompatible serialized data: Loaded {} data, this is version {}".format(self.__class__.__name__, self.compat, self.AMETHYST_PLUGIN_COMPAT))
 
+    def engine_methods(self):
+        """
+        Return a list of (ENGINE_METHOD_NAME, PLUGIN_ATTRIBUTE) for the
+        `AMETHYST_ENGINE_METHODS` of this plugin, applying the method
+        prefix and suffix.
+        """
+        methods = []
+        for attr in tupley(self.AMETHYST_ENGINE_METHODS):
+            meth = attr[1:] if attr.startswith("_") else attr
+            if self.amethyst_method_prefix:
+                meth = "{}{}".format(self.amethyst_method_prefix, meth)
+            if self.amethyst_method_suffix:
+                meth = "{}{}".format(meth, self.amethyst_method_suffix)
+            methods.append((meth, attr))
+        return methods
+
     def make_mutable(self):
         self.amethyst_make_mutable()
     def make_immutable(self):
@@ -273,6 +320,56 @@ class EnginePlugin(Object, BasePlugin):
         for listener in self._listeners:
             game.register_event_listener(listener.type, self._listener_callback(listener))
 
+    def on_action_end(self, game, name, stash):
+        """
+        Called for every plugin after each successful action, before the
+        action CALL notices are sent. Plugins which batch up changes
+        during an action should send their notices here.
+        """
+        pass
+
+    def on_turn_start(self, game, turn, round, player_num):
+        """
+        Called for every plugin by turn-tracking plugins (see `Turns`)
+        whenever a new turn starts.
+        """
+        pass
+
+    def reset(self, game, attrs=None):
+        """
+        Called by `Engine.reset()`. Return the plugin to the state of a
+        newly constructed plugin with the given attributes (the arguments
+        originally passed to the constructor if None). The plugin stays
+        registered with the engine.
+
+        The default implementation runs the constructor again with a deep
+        copy of the constructor arguments. Arguments are kept by reference
+        until then, so must not be modified in place after construction
+        (by the caller, or through plugin attributes sharing them).
+        Plugins holding external resources, which can not be copied,
+        should release or keep them here (see `_reset_args`).
+        """
+        args, kwargs = self._reset_args(attrs)
+        self.__init__(*args, **kwargs)
+
+    def _reset_args(self, attrs=None, **shared):
+        """
+        (ARGS, KWARGS) for the constructor call made by `reset()`. The
+        `shared` keyword arguments replace constructor arguments of the
+        same name and are passed on without being copied.
+        """
+        if attrs is None:
+            args, kwargs = self._constructor_args
+            args, kwargs = copy.deepcopy((args, { k: v for k, v in kwargs.items() if k not in shared }))
+        else:
+            args, kwargs = (), dict(attrs)
+        kwargs.update(
+            shared,
+            amethyst_method_prefix=self.amethyst_method_prefix,
+            amethyst_method_suffix=self.amethyst_method_suffix,
+        )
+        return args, kwargs
+
     def initialize_early(self, game, attrs=None):
         pass
 
@@ -288,7 +385,51 @@ class EnginePlugin(Object, BasePlugin):
         return None
 
     def get_state(self, player):
-        return copy.deepcopy(self.dict)
+        return self.state_views((player,))[0]
+
+    def state_views(self, players):
+        """
+        Return a list of states, one for each of the given players,
+        according to `AMETHYST_STATE_VISIBILITY`. Values visible to several
+        players are copied once and shared between their states, so the
+        states must be treated as read-only (typically they are encoded
+        and sent right away).
+
+        Plugins which override `get_state()` are called once per player.
+        """
+        if type(self).get_state is not EnginePlugin.get_state:
+            return [ self.get_state(p) for p in players ]
+        visibility = self.AMETHYST_STATE_VISIBILITY
+        views = [ dict() for p in players ]
+        for key, value in self.dict.items():
+            vis = visibility.get(key, "public")
+            if vis == "public":
+                value = copy.deepcopy(value)
+                for view in views:
+                    view[key] = value
+            elif vis == "master":
+                if GAME_MASTER in players:
+                    value = copy.deepcopy(value)
+                    for p, view in zip(players, views):
+                        if p is GAME_MASTER:
+                            view[key] = value
+            elif vis == "owner":
+                full = None
+                for p, view in zip(players, views):
+                    if p is GAME_MASTER:
+                        if full is None:
+                            full = copy.deepcopy(value)
+                        view[key] = full
+                    else:
+                        view[key] = _owned_part(value, p)
+            elif vis == "derived":
+                pass
+            elif callable(vis):
+                for p, view in zip(players, views):
+                    view[key] = vis(self, p, value)
+            else:
+                raise Exception("Unknown visibility '{}' of {}.{}".format(vis, type(self).__name__, key))
+        return views
 
     def set_state(self, state):
         self.set(**state)
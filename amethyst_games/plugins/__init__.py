@@ -1,9 +1,34 @@
 # -*- coding: utf-8 -*-
 """
-
+Bundled engine plugins, each imported on first use.
 """
 # SPDX-License-Identifier: LGPL-3.0
 
-from amethyst_games.plugins.grants       import *   # noqa: F401, F403
-from amethyst_games.plugins.object_store import *   # noqa: F401, F403
-from amethyst_games.plugins.turns        import *   # noqa: F401, F403
+import importlib
+
+# Names exported by each plugin module (their __all__)
+_exports = {
+    "clock":        "Clock",
+    "grants":       "Grant GrantManager",
+    "grid":         "Grid",
+    "object_store": "ObjectStore",
+    "replica":      "Replica",
+    "simultaneous": "SimultaneousPhase",
+    "turns":        "Turns",
+}
+_origin = { name: module for module, names in _exports.items() for name in names.split() }
+
+__all__ = list(_origin)
+
+
+def __getattr__(name):
+    module = _origin.get(name)
+    if module is None:
+        raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+    value = getattr(importlib.import_module("amethyst_games.plugins." + module), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
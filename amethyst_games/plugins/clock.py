@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""
+
+"""
+# SPDX-License-Identifier: LGPL-3.0
+__all__ = 'Clock'.split()
+
+from amethyst.core import Attr
+
+from amethyst_games.notice import Notice, NoticeType
+from amethyst_games.plugin import EnginePlugin, action, event_listener
+
+NoticeType.register(CLOCK="::clock")
+
+
+class Clock(EnginePlugin):
+    """
+    Per-player game clocks and per-turn deadlines.
+
+    Timing uses the engine `TimerQueue` (see `Engine.call_later`), so any
+    number of games share a single timer thread. When a player runs out
+    of time, the `clock_timeout` action is scheduled on the engine with
+    the `player_num` argument. Add your own `clock_timeout` action to a
+    plugin to decide what happens (forfeit, skip the turn, ...):
+
+        @action
+        def clock_timeout(self, game, stash, player_num):
+            game.turn_start()
+
+    With `auto` enabled (the default) the running clock follows the Turns
+    plugin, otherwise call `clock_start(player_num)` and `clock_stop()`.
+    Clocks only run on the server, clients receive CLOCK notices with the
+    remaining time of every player whenever the running clock changes.
+    After restoring state via `set_state()`, call `clock_start(running)`
+    to resume the running clock.
+
+    Configurable attributes
+    -----------------------
+
+    :ivar initial: Time bank of each player in seconds, 0 for no bank
+    (only `turn_limit` applies).
+
+    :ivar increment: Seconds added to the bank of a player after each of
+    their turns (Fischer increment).
+
+    :ivar delay: Seconds at the start of each turn which are not charged to
+    the bank (simple delay).
+
+    :ivar turn_limit: Maximum seconds per turn (after `delay`), 0 for no
+    limit.
+
+    :ivar auto: Start the clock of the current player at every turn start.
+
+
+    State Attributes
+    ----------------
+
+    :ivar remaining: Time bank of each player (by player number) as of the
+    time the running clock started.
+
+    :ivar running: Player number whose clock is running or -1.
+    """
+    AMETHYST_PLUGIN_COMPAT  = 1.0
+    AMETHYST_ENGINE_METHODS = "_start _stop _remaining _set".split()
+    AMETHYST_ENGINE_DEFAULT_METHOD_PREFIX = "clock_"
+
+    initial    = Attr(float, default=0.0)
+    increment  = Attr(float, default=0.0)
+    delay      = Attr(float, default=0.0)
+    turn_limit = Attr(float, default=0.0)
+    auto       = Attr(bool, default=True)
+
+    remaining  = Attr(list, default=list)
+    running    = Attr(int, default=-1)
+    # Private attributes:
+    #   _started:  float: clock time at which the running clock started
+    #   _timer:    TimerHandle: pending timeout
+    #   _armed:    int: generation of the pending timeout, stale timeouts
+    #              already in the run queue do not match
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._started = None
+        self._timer = None
+        self._armed = 0
+
+    def set_state(self, state):
+        self._cancel()
+        self._started = None
+        super().set_state(state)
+
+    def _banks(self, game):
+        if len(self.remaining) < len(game.players):
+            self.remaining.extend([ self.initial ] * (len(game.players) - len(self.remaining)))
+        return self.remaining
+
+    def _charge(self, game):
+        """Charge the running player for time used so far this turn."""
+        if self.running < 0 or self._started is None:
+            return 0.0
+        used = max(0.0, game.timers.clock() - self._started - self.delay)
+        if self.initial:
+            self._banks(game)[self.running] = max(0.0, self.remaining[self.running] - used)
+        return used
+
+    def _cancel(self):
+        self._armed += 1
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _arm(self, game):
+        limits = []
+        if self.initial:
+            limits.append(self._banks(game)[self.running])
+        if self.turn_limit:
+            limits.append(self.turn_limit)
+        if limits:
+            self._armed += 1
+            self._timer = game.call_at(self._started + self.delay + min(limits), self._on_timer, self.running, self._armed)
+
+    def _notify(self, game):
+        game.notify(None, Notice(source=self.id, type=NoticeType.CLOCK, data=dict(
+            remaining=list(self._banks(game)), running=self.running,
+        )))
+
+    def _start(self, game, player_num):
+        """
+            mygame.clock_start(player_num)
+
+        Stop the running clock (adding the increment to its bank) and start
+        the clock of the given player.
+        """
+        if not game.is_server():
+            return
+        self._stop(game, notify=False)
+        self._banks(game)
+        self.running = player_num
+        self._started = game.timers.clock()
+        self._arm(game)
+        self._notify(game)
+
+    def _stop(self, game, notify=True):
+        """
+            mygame.clock_stop()
+
+        Stop the running clock (adding the increment to its bank).
+        """
+        if not game.is_server() or self.running < 0:
+            return
+        self._cancel()
+        self._charge(game)
+        if self.initial and self.increment:
+            self.remaining[self.running] += self.increment
+        self.running = -1
+        self._started = None
+        if notify:
+            self._notify(game)
+
+    def _remaining(self, game, player_num):
+        """
+            mygame.clock_remaining(player_num)
+
+        Return the seconds remaining in the bank of a player, or in the
+        current turn if there is no bank. None if there is no limit.
+        """
+        banks = self._banks(game)
+        used = 0.0
+        if player_num == self.running and self._started is not None:
+            used = max(0.0, game.timers.clock() - self._started - self.delay)
+        limits = []
+        if self.initial:
+            limits.append(max(0.0, banks[player_num] - used))
+        if self.turn_limit and player_num == self.running:
+            limits.append(max(0.0, self.turn_limit - used))
+        return min(limits) if limits else None
+
+    def _set(self, game, player_num, seconds):
+        """
+            mygame.clock_set(player_num, seconds)
+
+        Set the bank of a player (e.g., to add time as a penalty or bonus).
+        """
+        self._banks(game)[player_num] = float(seconds)
+        if player_num == self.running and game.is_server():
+            self._cancel()
+            self._started = game.timers.clock()
+            self._arm(game)
+        self._notify(game)
+
+    def on_turn_start(self, game, turn, round, player_num):
+        if self.auto:
+            self._start(game, player_num)
+
+    def _on_timer(self, game, player_num, armed):
+        if armed != self._armed:
+            return
+        self._timer = None
+        if self.running != player_num:
+            return
+        self._charge(game)
+        self.running = -1
+        self._started = None
+        self._notify(game)
+        game.schedule("clock_timeout", dict(player_num=player_num))
+
+    @action
+    def clock_timeout(self, game, stash, player_num):
+        """
+        Called (via the engine queue) when a player runs out of time.
+        Other plugins add their own `clock_timeout` action to respond.
+        """
+        pass
+
+    @event_listener(NoticeType.CLOCK)
+    def on_clock(self, game, seq, player_num, notice):
+        """Process a Notice from our upstream."""
+        if notice.source == self.id:
+            self.remaining = list(notice.data['remaining'])
+            self.running = notice.data['running']
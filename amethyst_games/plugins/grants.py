@@ -9,15 +9,20 @@ Grant
 GrantManager
 """.split()
 
+import heapq
+import itertools
+import time
+
 from amethyst.core import Attr
 
 from amethyst_games.notice  import Notice, NoticeType
 from amethyst_games.plugin  import EnginePlugin, event_listener
-from amethyst_games.util    import tupley
-from amethyst_games.filters import Filterable, FILTER_ALL
+from amethyst_games.util    import GAME_MASTER, tupley
+from amethyst_games.filters import Filterable, FilterIndex, FILTER_ALL
 
 NoticeType.register(GRANT="::grant")
 NoticeType.register(EXPIRE="::expire")
+NoticeType.register(GRANT_COUNT="::grant-count")
 
 
 class Grant(Filterable):
@@ -42,6 +47,31 @@ class Grant(Filterable):
 
     :ivar list(str) expires: Grant ids which will be expired upon
         successful submission of the action call.
+
+    :ivar float dt_expires: Wall-clock time (as returned by `time.time()`)
+        at which the grant will be expired automatically by the server.
+
+    :ivar int turn_expires: Grant is valid through the given turn number
+        and will be expired when any later turn starts.
+
+    :ivar round_expires: Grant is valid until the end of the given round
+        and will be expired when a turn starts in a later round (a round
+        which has already been played, or a lower round number).
+
+    :ivar list(str) requires: Grant ids which must be held by the same
+        player for this grant to be available.
+
+    :ivar list(str) consumes: Like `requires`, but the listed grants are
+        also expired when this grant is triggered.
+
+    :ivar list(str) conflicts: Grant ids which are mutually exclusive with
+        this grant. Triggering either one expires the other.
+
+    :ivar list(str) before: This grant expires once any of the listed
+        grants is triggered.
+
+    :ivar list(str) after: This grant is unavailable while the player holds
+        any of the listed grants.
     """
 
     kwargs = Attr(isa=dict)
@@ -51,13 +81,15 @@ class Grant(Filterable):
 #     mandatory = Attr(bool)
 #     immediate = Attr(bool)
 #
-#     before = Attr(tupley)
-#     after = Attr(tupley)
-#     dt_expires = Attr(int)
+    before = Attr(tupley)
+    after = Attr(tupley)
+    dt_expires = Attr(float)
+    turn_expires = Attr(int)
+    round_expires = Attr()
     expires = Attr(tupley)
-#     consumes = Attr(tupley)
-#     requires = Attr(tupley)
-#     conflicts = Attr(tupley)
+    consumes = Attr(tupley)
+    requires = Attr(tupley)
+    conflicts = Attr(tupley)
 
     def call(self, **kwargs):
         return Call(id=self.id, name=self.name, kwargs=kwargs)
@@ -75,18 +107,215 @@ class Call(Filterable):
 
 class GrantManager(EnginePlugin):
     """
-    :ivar grants: Currently active grants. dict: PLAYER_NUM => list(GRANTS)
+    Grant expiry deadlines (`dt_expires`, `turn_expires`, and
+    `round_expires`) are kept in heaps on the server. Wall-clock deadlines
+    are delivered through the engine run queue by a single engine timer
+    for the earliest deadline, turn and round deadlines are processed at
+    the start of each turn (requires the `Turns` plugin). Expiring N
+    grants costs O(N log G) regardless of how many grants G are
+    outstanding.
+
+    GRANT and EXPIRE notices are only sent to the affected players and to
+    GAME_MASTER observers, other players never see grant contents.
+
+    Grant dependencies (`requires`, `consumes`, `conflicts`, `before`, and
+    `after`) are kept in a graph keyed by player and grant id. The
+    availability of a grant only depends on the other grants held by the
+    same player, so adding or expiring a grant only updates the grants
+    which refer to it, and clients (which receive their own grants)
+    compute the same availability as the server from GRANT and EXPIRE
+    notices. Expiry (`consumes`, `conflicts`, `before`, `expires`) applies
+    to the listed grant ids whichever player holds them.
+
+    :ivar grants: Currently active grants. dict: PLAYER_NUM => dict(ID => GRANT)
+        Players only receive their own grants in `get_state()`.
+
+    :ivar notify_counts: When True, observers which did not receive a
+        GRANT or EXPIRE notice are sent a compact GRANT_COUNT notice with
+        the new number of grants held by each affected player (see
+        `count_grants`).
     """
     AMETHYST_PLUGIN_COMPAT  = 1
     AMETHYST_ENGINE_METHODS = """
     grant
+    grant_many
     trigger
     expire
+    expire_due
     find_grant
+    locate_grant
+    grant_available
     list_grants
+    count_grants
     """.split()
+    AMETHYST_STATE_VISIBILITY = dict(grants="owner")
 
     grants = Attr(isa=dict, default=dict)
+    notify_counts = Attr(bool)
+    # Private attributes:
+    #   _index: FilterIndex of (PLAYER_NUM, ID) => GRANT
+    #   _deadlines:       heap of (dt_expires, SEQ, PLAYER_NUM, GRANT)
+    #   _turn_deadlines:  heap of (turn_expires, SEQ, PLAYER_NUM, GRANT)
+    #   _round_deadlines: dict: ROUND => list((PLAYER_NUM, GRANT))
+    #   _rounds_seen:     set: rounds in which a turn has started
+    #   _timer:           (dt_expires, handle) of the armed engine timer
+    #   _counts:          dict: PLAYER_NUM => int, (client) from GRANT_COUNT
+    #   _dependents:      dict: (PLAYER_NUM, ID) => dict(DEPENDENT_ID => WEIGHT)
+    #                     +1 per requires/consumes, -1 per after reference
+    #   _rev_conflicts:   dict: ID => set(ids of grants which conflict with ID)
+    #   _rev_before:      dict: ID => set(ids of grants listing ID in before)
+    #   _blocked:         dict: (PLAYER_NUM, ID) => number of unmet dependencies (if > 0)
+    #
+    # Deadline entries are removed lazily, an entry whose grant is no
+    # longer active is simply discarded when it reaches the top of a heap.
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._index = FilterIndex()
+        self._deadlines = []
+        self._turn_deadlines = []
+        self._round_deadlines = dict()
+        self._rounds_seen = set()
+        self._seq = itertools.count()
+        self._timer = None
+        self._counts = dict()
+        self._dependents = dict()
+        self._rev_conflicts = dict()
+        self._rev_before = dict()
+        self._blocked = dict()
+        self._reindex()
+
+    def _clear_index(self):
+        self._index.clear()
+        del self._deadlines[:]
+        del self._turn_deadlines[:]
+        self._round_deadlines.clear()
+        self._dependents.clear()
+        self._rev_conflicts.clear()
+        self._rev_before.clear()
+        self._blocked.clear()
+
+    def _reindex(self):
+        self._clear_index()
+        grants, self.grants = self.grants, dict()
+        for p, pgrants in grants.items():
+            self.grants[p] = dict()
+            for a in pgrants.values():
+                self._add(p, a)
+                self._track_deadlines(p, a)
+
+    def _track_deadlines(self, player_num, grant):
+        if grant.dt_expires is not None:
+            heapq.heappush(self._deadlines, (grant.dt_expires, next(self._seq), player_num, grant))
+        if grant.turn_expires is not None:
+            heapq.heappush(self._turn_deadlines, (grant.turn_expires, next(self._seq), player_num, grant))
+        if grant.round_expires is not None:
+            self._round_deadlines.setdefault(grant.round_expires, []).append((player_num, grant))
+
+    def _is_active(self, player_num, grant):
+        return self.grants.get(player_num, {}).get(grant.id) is grant
+
+    def _add(self, player_num, grant):
+        grants = self.grants.get(player_num)
+        if grants is None:
+            grants = self.grants[player_num] = dict()
+        old = grants.get(grant.id)
+        if old is not None:
+            self._index.discard((player_num, grant.id), old)
+            self._deactivate(player_num, old)
+        elif not self._index.count("id", grant.id):
+            self._link(grant)
+        grants[grant.id] = grant
+        self._index.add((player_num, grant.id), grant)
+        self._activate(player_num, grant)
+
+    def _remove(self, player_num, id):
+        grant = self.grants[player_num].pop(id)
+        self._index.discard((player_num, id), grant)
+        self._deactivate(player_num, grant)
+        if not self._index.count("id", id):
+            self._unlink_expiry(grant)
+        return grant
+
+    def _link(self, grant):
+        """Grant id has become active, link its expiry references."""
+        for x in tupley(grant.conflicts):
+            self._rev_conflicts.setdefault(x, set()).add(grant.id)
+        for x in tupley(grant.before):
+            self._rev_before.setdefault(x, set()).add(grant.id)
+
+    def _unlink_expiry(self, grant):
+        """Grant id is no longer active, unlink its expiry references."""
+        for x in tupley(grant.conflicts):
+            self._unlink(self._rev_conflicts, x, grant.id)
+        for x in tupley(grant.before):
+            self._unlink(self._rev_before, x, grant.id)
+
+    def _activate(self, player_num, grant):
+        """Player holds grant, link it into the dependency graph of the player."""
+        id = grant.id
+        held = self.grants[player_num]
+        blocked = 0
+        for x, weight in self._dependencies(grant).items():
+            self._dependents.setdefault((player_num, x), dict())[id] = weight
+            active = x in held
+            if (weight > 0 and not active) or (weight < 0 and active):
+                blocked += abs(weight)
+        if blocked:
+            self._blocked[(player_num, id)] = blocked
+
+        for dep, weight in self._dependents.get((player_num, id), {}).items():
+            self._unblock((player_num, dep), weight)
+
+    def _deactivate(self, player_num, grant):
+        """Player no longer holds grant, unlink it from the dependency graph of the player."""
+        id = grant.id
+        for x in self._dependencies(grant):
+            self._unlink(self._dependents, (player_num, x), id)
+        self._blocked.pop((player_num, id), None)
+
+        for dep, weight in self._dependents.get((player_num, id), {}).items():
+            self._unblock((player_num, dep), -weight)
+
+    @staticmethod
+    def _dependencies(grant):
+        rv = dict()
+        for x in tupley(grant.requires):
+            rv[x] = rv.get(x, 0) + 1
+        for x in tupley(grant.consumes):
+            rv[x] = rv.get(x, 0) + 1
+        for x in tupley(grant.after):
+            rv[x] = rv.get(x, 0) - 1
+        return rv
+
+    @staticmethod
+    def _unlink(graph, x, id):
+        linked = graph.get(x)
+        if linked is not None:
+            if isinstance(linked, dict):
+                linked.pop(id, None)
+            else:
+                linked.discard(id)
+            if not linked:
+                del graph[x]
+
+    def _unblock(self, key, n):
+        blocked = self._blocked.get(key, 0) - n
+        if blocked:
+            self._blocked[key] = blocked
+        else:
+            self._blocked.pop(key, None)
+
+    def initialize(self, game, attrs=None):
+        super().initialize(game, attrs)
+        self._reindex()
+
+    def set_state(self, state):
+        if 'grants' in state:
+            # JSON object keys are strings, player numbers are not
+            state = dict(state, grants={ (int(p) if isinstance(p, str) and p.isdigit() else p): g for p, g in state['grants'].items() })
+        super().set_state(state)
+        self._reindex()
 
     def trigger(self, game, player_num, id, kwargs):
         """
@@ -105,7 +334,7 @@ class GrantManager(EnginePlugin):
         be consumed even if successful).
         """
         grant = self.find_grant(game, player_num, id)
-        if not grant:
+        if not grant or (player_num, grant.id) in self._blocked:
             return False
 
         # Grants can default or force certain kwargs:
@@ -119,63 +348,248 @@ class GrantManager(EnginePlugin):
 
         # Finally try to schedule the action
         if game.schedule(grant.name, kwargs):
-            self.expire(game, grant.expires)
+            expires = dict.fromkeys(tupley(grant.expires))
+            expires.update(dict.fromkeys(tupley(grant.consumes)))
+            expires.update(dict.fromkeys(tupley(grant.conflicts)))
+            expires.update(dict.fromkeys(self._rev_conflicts.get(grant.id, ())))
+            expires.update(dict.fromkeys(self._rev_before.get(grant.id, ())))
             if not grant.repeatable:
-                self.expire(game, grant.id)
+                expires[grant.id] = None
+            self.expire(game, tuple(expires))
             return True
         return False
 
-    def _grant(self, game, player_nums, actions):
-        for p in tupley(player_nums):
-            if p not in self.grants:
-                self.grants[p] = dict()
-            for a in tupley(actions):
-                self.grants[p][a.id] = a
-        game.notify(None, Notice(
-            source=self.id, type=NoticeType.GRANT,
-            data=dict(player_nums=player_nums, actions=actions),
-        ))
+    def _notify(self, game, player_nums, notice, private=None):
+        """
+        Send notice to the listed players and GAME_MASTER observers, then
+        a GRANT_COUNT notice to everyone else (if `notify_counts` is set).
+
+        When `private` is given (dict: PLAYER_NUM => Notice), the listed
+        players are sent their private notice instead and only GAME_MASTER
+        observers receive `notice`.
+        """
+        if private:
+            for p, pnotice in private.items():
+                game.notify(p, pnotice)
+            game.notify(GAME_MASTER, notice)
+        else:
+            game.notify(tuple(player_nums) + (GAME_MASTER,), notice)
+
+        if self.notify_counts:
+            others = tuple(p for p in game.notified if p is not GAME_MASTER and p not in player_nums)
+            if others:
+                game.notify(others, Notice(
+                    source=self.id, type=NoticeType.GRANT_COUNT,
+                    data={ 'counts': { p: len(self.grants.get(p, ())) for p in player_nums } },
+                ))
+
+    def _grant(self, game, batch):
+        server = game.is_server()
+        by_player = dict()
+        for player_nums, actions in batch:
+            actions = tuple(tupley(actions))
+            for p in tupley(player_nums):
+                for a in actions:
+                    self._add(p, a)
+                    if server:
+                        self._track_deadlines(p, a)
+                by_player.setdefault(p, []).extend(actions)
+
+        if len(by_player) == 1:
+            for p, actions in by_player.items():
+                self._notify(game, (p,), Notice(
+                    source=self.id, type=NoticeType.GRANT,
+                    data=dict(player_nums=(p,), actions=actions),
+                ))
+        elif by_player:
+            # Players only learn of their own grants
+            private = {
+                p: Notice(
+                    source=self.id, type=NoticeType.GRANT,
+                    data=dict(player_nums=(p,), actions=actions),
+                ) for p, actions in by_player.items()
+            }
+            self._notify(game, tuple(by_player), Notice(
+                source=self.id, type=NoticeType.GRANT,
+                data=dict(batch=batch),
+            ), private)
+
+        if server and self._deadlines:
+            self._arm_timer(game)
 
     def grant(self, game, player_nums, actions):
         """Process a grant Notice AS the server."""
         if game.is_server():
-            self._grant(game, player_nums, actions)
+            self._grant(game, [ (player_nums, actions) ])
+        return self
+
+    def grant_many(self, game, batch):
+        """
+        Grant many actions at once (as the server). `batch` is an iterable
+        of `(player_nums, actions)` pairs, as would be passed to `grant()`.
+        Each affected player receives a single GRANT notice.
+        """
+        if game.is_server():
+            self._grant(game, [ (tuple(tupley(p)), tuple(tupley(a))) for p, a in batch ])
         return self
+
     @event_listener(NoticeType.GRANT)
     def on_grant(self, game, seq, player_num, notice):
         """Process a grant Notice FROM the server."""
         if game.is_client() and notice.source == self.id:
-            self._grant(game, notice.data.get('player_nums'), notice.data.get('actions'))
+            if 'batch' in notice.data:
+                self._grant(game, notice.data['batch'])
+            else:
+                self._grant(game, [ (notice.data.get('player_nums'), notice.data.get('actions')) ])
+
+    def _matching(self, filt):
+        """Return set of (PLAYER_NUM, ID) pairs of grants accepted by filt."""
+        if isinstance(filt, str):
+            return self._index.get("id", filt)
+        keys = self._index.lookup(filt)
+        if keys is None:
+            keys = [ (p, id) for p, grants in self.grants.items() for id in grants ]
+        return set(k for k in keys if filt.accepts(self.grants[k[0]][k[1]]))
 
     def _expire(self, game, filters):
+        """
+        Expire all grants matching any of the filters (grant ids or filter
+        objects). Sends a single EXPIRE notice covering all of the filters,
+        and only if some grant was actually expired.
+        """
         if not filters:
             return
-        game.notify(None, Notice(
-            source=self.id, type=NoticeType.EXPIRE,
-            data={ 'filters': filters },
-        ))
-        for filt in filters:
+        if any(filt is FILTER_ALL for filt in filters):
             # Optimization for a common case
-            if filt is FILTER_ALL:
-                self.grants = dict()
-                return
-            elif isinstance(filt, str):
-                for g in self.grants.values():
-                    g.pop(filt, None)
-            else:
-                for p in self.grants:
-                    self.grants[p] = [ a for a in self.grants[p] if not filt.accepts(a) ]
+            affected = [ p for p, grants in self.grants.items() if grants ]
+            self.grants.clear()
+            self._clear_index()
+        else:
+            doomed = set()
+            for filt in filters:
+                doomed.update(self._matching(filt))
+            affected = dict()
+            for p, id in doomed:
+                self._remove(p, id)
+                affected[p] = True
+
+        if affected:
+            self._notify(game, tuple(affected), Notice(
+                source=self.id, type=NoticeType.EXPIRE,
+                data={ 'filters': filters },
+            ))
 
     def expire(self, game, filters=FILTER_ALL):
+        """
+        Expire grants matching a grant id, filter, or an iterable of ids
+        and/or filters. Filters on grant id, name, type, and flag (for
+        instance, `Filter(flag=game.turn_flag())`) are answered from an
+        index, touching only the matching grants.
+        """
         if filters is not None:
-            self._expire(game, tupley(filters))
+            self._expire(game, tuple(tupley(filters)))
+        return self
+    def expire_due(self, game, now=None):
+        """
+        Expire all grants whose `dt_expires` time is at or before `now`
+        (default: `time.time()`) and arm the engine timer for the next
+        deadline.
+
+        This is called automatically (through the engine run queue) when
+        running as a server. It only needs to be called explicitly to arm
+        the timer after restoring grants via `set_state()`.
+        """
+        if not game.is_server():
+            return self
+        if now is None:
+            now = time.time()
+        ids = dict()
+        while self._deadlines and self._deadlines[0][0] <= now:
+            dt, seq, p, grant = heapq.heappop(self._deadlines)
+            if self._is_active(p, grant):
+                ids[grant.id] = True
+        self._expire(game, tuple(ids))
+        self._arm_timer(game)
         return self
+
+    def _arm_timer(self, game):
+        while self._deadlines and not self._is_active(*self._deadlines[0][2:]):
+            heapq.heappop(self._deadlines)
+        when = self._deadlines[0][0] if self._deadlines else None
+        if self._timer is not None:
+            if self._timer[0] == when:
+                return
+            self._timer[1].cancel()
+            self._timer = None
+        if when is not None:
+            self._timer = (when, game.call_later(max(0, when - time.time()), self._on_timer))
+
+    def _on_timer(self, game):
+        self._timer = None
+        self.expire_due(game)
+
+    def on_turn_start(self, game, turn, round, player_num):
+        """Expire grants whose `turn_expires` or `round_expires` has passed."""
+        ids = dict()
+        while self._turn_deadlines and self._turn_deadlines[0][0] < turn:
+            t, seq, p, grant = heapq.heappop(self._turn_deadlines)
+            if self._is_active(p, grant):
+                ids[grant.id] = True
+        self._rounds_seen.add(round)
+        for r in [ r for r in self._round_deadlines if self._round_passed(r, round) ]:
+            for p, grant in self._round_deadlines.pop(r):
+                if self._is_active(p, grant):
+                    ids[grant.id] = True
+        if game.is_server():
+            self._expire(game, tuple(ids))
+
+    def _round_passed(self, r, round):
+        if r == round:
+            return False
+        if r in self._rounds_seen:
+            return True
+        # Rounds are usually numbers, setup rounds are strings
+        return isinstance(r, int) and isinstance(round, int) and r < round
+
     @event_listener(NoticeType.EXPIRE)
     def on_expire(self, game, seq, player_num, notice):
         """Process an expire Notice from the server."""
         if game.is_client() and notice.source == self.id:
             self._expire(game, notice.data.get('filters'))
 
+    @event_listener(NoticeType.GRANT_COUNT)
+    def on_grant_count(self, game, seq, player_num, notice):
+        """Process a grant count Notice from the server."""
+        if game.is_client() and notice.source == self.id:
+            self._counts.update(notice.data.get('counts', ()))
+
+    def count_grants(self, game, player_num):
+        """
+        Return the number of grants held by a player. Clients only know
+        the grants of their own player, the count for other players is
+        taken from GRANT_COUNT notices (see `notify_counts`).
+        """
+        if player_num in self.grants:
+            return len(self.grants[player_num])
+        return self._counts.get(player_num, 0)
+
+    def locate_grant(self, game, id):
+        """
+        Find a grant by id, whichever player holds it. Returns a tuple of
+        `(player_num, grant)` pairs, one for each player holding the grant.
+        """
+        return tuple((p, self.grants[p][id]) for p, _ in self._index.get("id", id))
+
+    def grant_available(self, game, id, player_num=None):
+        """
+        True if grant id is held by the player (default: by any player)
+        and all of its dependencies are met for that player (see
+        `Grant.requires`, `Grant.consumes`, and `Grant.after`).
+        """
+        if player_num is not None:
+            return id in self.grants.get(player_num, ()) and (player_num, id) not in self._blocked
+        return any(key not in self._blocked for key in self._index.get("id", id))
+
     def find_grant(self, game, player_num, id):
         """
         Find a player grant by id and returns it, else returns `None`.
@@ -187,14 +601,25 @@ class GrantManager(EnginePlugin):
                     return a
         return None
 
-    def list_grants(self, game, player_num, filt=FILTER_ALL):
+    def list_grants(self, game, player_num, filt=FILTER_ALL, blocked=False):
         """
-        Return a tuple of player grants matching the requested filter (default all grants).
+        Return a tuple of player grants matching the requested filter
+        (default all grants). Grants whose dependencies are not met are
+        omitted unless `blocked` is True.
         """
         if player_num not in self.grants:
             return ()
 
+        grants = self.grants[player_num]
         if filt is FILTER_ALL:
-            return tuple(self.grants[player_num].values())
+            rv = grants.values()
         else:
-            return tuple(a for a in self.grants[player_num].values() if filt.accepts(a))
+            keys = self._index.lookup(filt)
+            if keys is None:
+                rv = [ a for a in grants.values() if filt.accepts(a) ]
+            else:
+                rv = [ grants[id] for p, id in keys if p == player_num and filt.accepts(grants[id]) ]
+
+        if self._blocked and not blocked:
+            return tuple(a for a in rv if (player_num, a.id) not in self._blocked)
+        return tuple(rv)
@@ -0,0 +1,299 @@
+# -*- coding: utf-8 -*-
+"""
+
+"""
+# SPDX-License-Identifier: LGPL-3.0
+__all__ = 'Grid'.split()
+
+from amethyst.core import Attr
+
+from amethyst_games.notice import Notice, NoticeType
+from amethyst_games.plugin import EnginePlugin, event_listener
+
+NoticeType.register(GRID_SET="::grid-set")
+
+_DIRECTIONS = {
+    # Orthogonal neighbors
+    "square":  ((1, 0), (0, 1), (-1, 0), (0, -1)),
+    # Orthogonal and diagonal neighbors
+    "square8": ((1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1)),
+    # Axial coordinates (q, r)
+    "hex":     ((1, 0), (1, -1), (0, -1), (-1, 0), (-1, 1), (0, 1)),
+}
+
+# Neighbor tables are immutable and shared by grids of the same size
+_neighbor_tables = dict()   # (SHAPE, WIDTH, HEIGHT) => tuple(tuple(INDEX))
+
+def _neighbor_table(shape, width, height):
+    key = (shape, width, height)
+    table = _neighbor_tables.get(key)
+    if table is None:
+        table = _neighbor_tables[key] = tuple(
+            tuple((y + dy) * width + x + dx for dx, dy in _DIRECTIONS[shape] if 0 <= x + dx < width and 0 <= y + dy < height)
+            for y in range(height) for x in range(width)
+        )
+    return table
+
+
+class Grid(EnginePlugin):
+    """
+    Spatial index of a rectangular board of square or hexagonal cells.
+
+    Each cell holds at most one occupant (any hashable JSON value, e.g.,
+    an ObjectStore id or a player number). Cells are addressed by `(x, y)`
+    tuples (lists are accepted as well). Occupancy lookups, placement
+    validation, and the number of free cells are O(1), listing free cells
+    or the cells of an occupant is O(k) in the number of results, and
+    neighbor lists are computed once for each grid size and shape.
+
+    Changes are sent to observers in GRID_SET notices and applied by the
+    GRID_SET listener on clients, so a client grid follows its server
+    like the ObjectStore does.
+
+    Configurable attributes
+    -----------------------
+
+    :ivar width: Number of columns.
+
+    :ivar height: Number of rows.
+
+    :ivar shape: Neighborhood of a cell. One of "square" (4 orthogonal
+    neighbors), "square8" (orthogonal and diagonal neighbors), or "hex"
+    (6 neighbors, axial coordinates `(q, r)` over a `width` x `height`
+    parallelogram).
+
+
+    State Attributes
+    ----------------
+
+    :ivar cells: Occupant (or None) of every cell, row-major. Do not modify
+    directly, use the provided API methods.
+    """
+    AMETHYST_PLUGIN_COMPAT  = 1.0
+    AMETHYST_ENGINE_METHODS = """
+    _at _is_free _where _occupied _free _count_free
+    _place _remove _move _clear
+    _directions _neighbors _line _run _region _rect
+    """.split()
+    AMETHYST_ENGINE_DEFAULT_METHOD_PREFIX = "grid_"
+
+    width  = Attr(int, default=3)
+    height = Attr(int, default=3)
+    shape  = Attr(str, default="square")
+    cells  = Attr(list)
+    # Private attributes:
+    #   _occupants: dict: OCCUPANT => set(INDEX), cells holding an occupant
+    #   _empty:     set(INDEX), empty cells
+    #   _adjacent:  tuple: INDEX => tuple(INDEX), neighbor table (shared)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.shape not in _DIRECTIONS:
+            raise Exception("Unknown grid shape '{}'".format(self.shape))
+        self._reindex()
+
+    def _reindex(self):
+        size = self.width * self.height
+        if self.cells is None or len(self.cells) != size:
+            self.cells = [None] * size
+        self._occupants = dict()
+        self._empty = set()
+        for idx, occupant in enumerate(self.cells):
+            if occupant is None:
+                self._empty.add(idx)
+            else:
+                self._occupants.setdefault(occupant, set()).add(idx)
+        self._adjacent = _neighbor_table(self.shape, self.width, self.height)
+
+    def initialize(self, game, attrs=None):
+        super().initialize(game, attrs)
+        self._reindex()
+
+    def set_state(self, state):
+        super().set_state(state)
+        self._reindex()
+
+    def _contains(self, x, y):
+        return 0 <= x < self.width and 0 <= y < self.height
+
+    def _index(self, x, y):
+        return y * self.width + x
+
+    def _cell(self, idx):
+        return divmod(idx, self.width)[::-1]
+
+    def _idx(self, cell):
+        x, y = cell
+        if not self._contains(x, y):
+            raise IndexError("Cell {} is not on the grid".format(tuple(cell)))
+        return self._index(x, y)
+
+    def _assign(self, idx, occupant):
+        """Set cell contents without notifying."""
+        old = self.cells[idx]
+        if old is not None:
+            cells = self._occupants[old]
+            cells.discard(idx)
+            if not cells:
+                del self._occupants[old]
+        self.cells[idx] = occupant
+        if occupant is None:
+            self._empty.add(idx)
+        else:
+            self._empty.discard(idx)
+            self._occupants.setdefault(occupant, set()).add(idx)
+
+    def _update(self, game, changes):
+        """Apply a list of (INDEX, OCCUPANT) and send a single notice."""
+        for idx, occupant in changes:
+            self._assign(idx, occupant)
+        if changes:
+            game.notify(None, Notice(source=self.id, type=NoticeType.GRID_SET, data=dict(
+                cells=[ [ *self._cell(idx), occupant ] for idx, occupant in changes ]
+            )))
+
+    def _at(self, game, cell):
+        """Return the occupant of a cell (None if empty)."""
+        return self.cells[self._idx(cell)]
+
+    def _is_free(self, game, cell):
+        """True if the cell is on the grid and empty."""
+        x, y = cell
+        return self._contains(x, y) and self.cells[self._index(x, y)] is None
+
+    def _where(self, game, occupant):
+        """Return a list of cells holding the occupant."""
+        return [ self._cell(idx) for idx in sorted(self._occupants.get(occupant, ())) ]
+
+    def _occupied(self, game):
+        """Return a dict mapping occupied cells to their occupants."""
+        return { self._cell(idx): occupant for occupant, cells in self._occupants.items() for idx in cells }
+
+    def _free(self, game):
+        """Return a list of empty cells."""
+        return [ self._cell(idx) for idx in sorted(self._empty) ]
+
+    def _count_free(self, game):
+        """Return the number of empty cells."""
+        return len(self._empty)
+
+    def _place(self, game, cell, occupant):
+        """
+        Put an occupant into an empty cell. Returns False (and does
+        nothing) if the cell is occupied or off the grid.
+        """
+        if occupant is None or not self._is_free(game, cell):
+            return False
+        self._update(game, [ (self._idx(cell), occupant) ])
+        return True
+
+    def _remove(self, game, *cells):
+        """Empty the given cells. Returns the list of removed occupants."""
+        idxs = [ self._idx(cell) for cell in cells ]
+        removed = [ self.cells[idx] for idx in idxs if self.cells[idx] is not None ]
+        self._update(game, [ (idx, None) for idx in idxs if self.cells[idx] is not None ])
+        return removed
+
+    def _move(self, game, src, dst):
+        """
+        Move the occupant of `src` to the empty cell `dst`. Returns False
+        (and does nothing) if `src` is empty or `dst` is not free.
+        """
+        occupant = self._at(game, src)
+        if occupant is None or not self._is_free(game, dst):
+            return False
+        self._update(game, [ (self._idx(src), None), (self._idx(dst), occupant) ])
+        return True
+
+    def _clear(self, game):
+        """Empty every cell."""
+        self._update(game, [ (idx, None) for cells in tuple(self._occupants.values()) for idx in sorted(cells) ])
+
+    def _directions(self, game):
+        """Return the neighbor offsets `(dx, dy)` for the grid shape."""
+        return _DIRECTIONS[self.shape]
+
+    def _neighbors(self, game, cell, free=None):
+        """
+        Return a list of cells adjacent to a cell. Pass `free=True` or
+        `free=False` to list only empty or only occupied neighbors.
+        """
+        idxs = self._adjacent[self._idx(cell)]
+        if free is not None:
+            idxs = [ idx for idx in idxs if (self.cells[idx] is None) == free ]
+        return [ self._cell(idx) for idx in idxs ]
+
+    def _line(self, game, cell, direction, length=None):
+        """
+        Return the list of cells visited by stepping from `cell`
+        (exclusive) in `direction` until the edge of the grid or until
+        `length` cells have been visited.
+        """
+        (x, y), (dx, dy) = cell, direction
+        cells = []
+        while length is None or len(cells) < length:
+            x, y = x + dx, y + dy
+            if not self._contains(x, y):
+                break
+            cells.append((x, y))
+        return cells
+
+    def _run(self, game, cell, direction):
+        """
+        Return the list of cells in the line through `cell` along
+        `direction` (both ways) which hold the same occupant as `cell`,
+        ordered along `direction`. Useful for "N in a row" checks.
+        """
+        occupant = self._at(game, cell)
+        if occupant is None:
+            return []
+        back = []
+        for c in self._line(game, cell, (-direction[0], -direction[1])):
+            if self.cells[self._index(*c)] != occupant:
+                break
+            back.append(c)
+        forward = []
+        for c in self._line(game, cell, direction):
+            if self.cells[self._index(*c)] != occupant:
+                break
+            forward.append(c)
+        return back[::-1] + [ tuple(cell) ] + forward
+
+    def _region(self, game, cell, radius):
+        """
+        Return the list of cells within `radius` steps of `cell`
+        (including `cell`), nearest first.
+        """
+        start = self._idx(cell)
+        seen = { start }
+        frontier = [ start ]
+        found = [ start ]
+        for i in range(radius):
+            nxt = []
+            for idx in frontier:
+                for n in self._adjacent[idx]:
+                    if n not in seen:
+                        seen.add(n)
+                        nxt.append(n)
+            found.extend(nxt)
+            frontier = nxt
+        return [ self._cell(idx) for idx in found ]
+
+    def _rect(self, game, x0, y0, x1, y1, free=None):
+        """
+        Return the list of cells with x0 <= x <= x1 and y0 <= y <= y1
+        (clipped to the grid). Pass `free=True` or `free=False` to list
+        only empty or only occupied cells.
+        """
+        cells = []
+        for y in range(max(y0, 0), min(y1, self.height - 1) + 1):
+            for x in range(max(x0, 0), min(x1, self.width - 1) + 1):
+                if free is None or (self.cells[self._index(x, y)] is None) == free:
+                    cells.append((x, y))
+        return cells
+
+    @event_listener(NoticeType.GRID_SET)
+    def on_grid_set(self, game, seq, player_num, notice):
+        """Process a Notice from our upstream."""
+        if notice.source == self.id:
+            self._update(game, [ (self._idx((x, y)), occupant) for x, y, occupant in notice.data['cells'] ])
@@ -7,17 +7,99 @@ __all__ = """
 ObjectStore
 """.split()
 
+import bisect
+import collections.abc
+import contextlib
 import copy
 
-from amethyst.core import Attr
+from amethyst.core import Object, Attr
 
 from amethyst_games.filters import FILTER_ALL
 from amethyst_games.notice  import Notice, NoticeType
 from amethyst_games.plugin  import EnginePlugin, event_listener
+from amethyst_games.storage import DictStorage, Snapshot
 from amethyst_games.util    import GAME_MASTER, NOBODY
 
 NoticeType.register(STORE_SET="::store-set")
 NoticeType.register(STORE_DEL="::store-del")
+NoticeType.register(STORE_PATCH="::store-patch")
+
+# Location key for the shared store (player stores use the player number)
+_SHARED = object()
+# Pending change marker for deleted ids
+_DELETED = object()
+# Values which can not change in place
+_ATOMS = (str, bytes, int, float, complex, type(None))
+
+
+def _frozen(value):
+    if isinstance(value, _ATOMS):
+        return True
+    if isinstance(value, (tuple, frozenset)):
+        return all(_frozen(v) for v in value)
+    return False
+
+
+class _TrackedDict(dict):
+    """
+    Data dictionary installed on stored amethyst Objects when the
+    ObjectStore is tracking changes. Reports the name of every field which
+    is set or deleted to the store.
+    """
+    __slots__ = ('store', 'obj', 'owners')
+
+    def __init__(self, obj, store):
+        super().__init__(obj.dict)
+        self.store = store
+        self.obj = obj
+        self.owners = set()     # (LOCATION, ID) pairs
+
+    def _touch(self, fields):
+        for owner in self.owners:
+            self.store._touch(owner, self.obj, fields)
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._touch((key,))
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._touch((key,))
+
+    def update(self, *args, **kwargs):
+        data = dict(*args, **kwargs)
+        super().update(data)
+        self._touch(data)
+
+    def setdefault(self, key, dflt=None):
+        if key not in self:
+            self._touch((key,))
+        return super().setdefault(key, dflt)
+
+    def pop(self, key, *args):
+        if key in self:
+            self._touch((key,))
+        return super().pop(key, *args)
+
+    def popitem(self):
+        rv = super().popitem()
+        self._touch((rv[0],))
+        return rv
+
+    def clear(self):
+        fields = tuple(self)
+        super().clear()
+        self._touch(fields)
+
+    # Copies are plain dictionaries
+    def __copy__(self):
+        return dict(self)
+
+    def __deepcopy__(self, memo):
+        return copy.deepcopy(dict(self), memo)
+
+    def __reduce__(self):
+        return (dict, (dict(self),))
 
 
 class ObjectStore(EnginePlugin):
@@ -29,23 +111,415 @@ class ObjectStore(EnginePlugin):
     (via the API) will trigger a notice so that clients can keep their
     storage up to date.
 
-    WARNING: The ObjectStore WILL NOT see changes made directly to your
-    stored objects. If data internal to the stored object changes, you will
-    need to call the appropriate `stor_set` in order to send the updated
-    object to clients.
+    WARNING: By default, the ObjectStore WILL NOT see changes made
+    directly to your stored objects. If data internal to the stored object
+    changes, you will need to call the appropriate `stor_set` in order to
+    send the updated object to clients, or else enable `track_changes`.
+
+    :ivar track_changes: When True, the server tracks field changes made
+        to stored amethyst Objects (by replacing their `.dict` with a
+        recording dictionary). Changed fields are sent in a single
+        STORE_PATCH notice at the end of each action or when `stor_flush`
+        is called. Only assignments to object fields are seen, changes
+        made inside a field value (e.g., appending to a list) still
+        require reassigning the field or a `stor_set`.
+
+        `get_state` also keeps a `Snapshot` of each store and only copies
+        the objects which may have changed since the previous call, rather
+        than deep-copying every store each time (at the cost of holding a
+        copy of the stores in memory). An object is reused from the
+        snapshot only when all of its fields hold immutable values (str,
+        numbers, None, or tuples of those), so every change to it is seen.
+        Other stored values (objects with list or dict fields, plain
+        dicts, ...) are copied again on each call.
+
+    :ivar coalesce: When True, STORE_SET and STORE_DEL notices are not
+        sent immediately. Instead, all changes made during an action are
+        collected and sent as at most one STORE_SET and one STORE_DEL
+        notice per recipient when the action completes. Repeated changes
+        to the same key collapse to the last one. Changes made outside of
+        an action are held until the next action completes or until
+        `stor_flush` is called. See also `stor_batch` and the `_many`
+        methods which batch changes explicitly.
+
+    :param storage: Storage backend (constructor keyword only). Defaults
+        to `DictStorage`, in-memory dictionaries. Pass a `SqliteStorage`
+        to keep large object catalogs on disk with a bounded cache of
+        live objects. Tracked changes to objects are written back to the
+        backend at the end of each action. Any previous contents of the
+        backend are replaced by the store state.
+
+    :param namespace: Prefix of the backend store names (constructor
+        keyword only), defaults to the plugin id. Games sharing a storage
+        backend (e.g., one sqlite file) must use distinct namespaces.
+
+    :ivar indexes: Secondary indexes on attributes of stored objects, a
+        dict mapping attribute names to "hash" (equality lookups via
+        `stor_find`) or "sorted" (equality and range lookups via
+        `stor_range`). Indexes cover the shared and every player store
+        and are updated when objects are set or deleted and, with
+        `track_changes`, when an indexed attribute is assigned. Without
+        `track_changes`, objects must be set again after changing an
+        indexed attribute. Missing (None) and unhashable values are not
+        indexed. Indexes are built by the first lookup after the stores
+        are loaded, so restoring a large on-disk store stays cheap until
+        the indexes are used.
+
+            ObjectStore(indexes=dict(owner="hash", cost="sorted"))
     """
     AMETHYST_PLUGIN_COMPAT  = 1.0
     AMETHYST_ENGINE_METHODS = """
-    _get _del
-    _get_player _set_player _del_player _list_player
-    _get_shared _set_shared _del_shared _list_shared
+    _get _del _flush _batch _del_many
+    _get_player _set_player _del_player _list_player _set_player_many
+    _get_shared _set_shared _del_shared _list_shared _set_shared_many
+    _find _find_player _range _range_player
     """.split()
     AMETHYST_ENGINE_DEFAULT_METHOD_PREFIX = "stor_"
 
     # These are not meant to be accessed directly
     _storage = Attr(isa=dict, default=dict)
     _player_storage = Attr(isa=dict, default=dict)
+    track_changes = Attr(bool)
+    coalesce = Attr(bool)
+    indexes = Attr(dict, default=dict)
+    # Private attributes:
+    #   _locations: dict: ID => set(PLAYER_NUM), player stores holding ID
+    #   _dirty:     dict: (LOCATION, ID) => [OBJ, set(FIELD)], tracked changes
+    #   _backend:   storage backend (DictStorage by default)
+    #   _snapshots: dict: LOCATION => Snapshot, last get_state copy
+    #   _stale:     dict: LOCATION => set(ID), changed since the snapshot
+    #   _volatile:  dict: LOCATION => set(ID), may change unseen, always copied
+    #   _hashed:    dict: LOCATION => FIELD => dict(VALUE => set(ID))
+    #   _sorted:    dict: LOCATION => FIELD => ([VALUE...], [ID...]), parallel sorted lists
+    #   _indexed:   dict: (LOCATION, ID) => dict(FIELD => VALUE), indexed values
+    #   _built:     bool: True when the indexes cover the stores
+    #   _namespace: str: prefix of backend store names
+
+    #   _server:    bool: True when assigned to a server engine
+    #   _pending:   dict: LOCATION => dict(ID => OBJ or _DELETED), unsent changes
+    #   _batching:   int: depth of open stor_batch() contexts
+
+    def __init__(self, *args, storage=None, namespace=None, **kwargs):
+        self._backend = storage or DictStorage()
+        super().__init__(*args, **kwargs)
+        self._namespace = self.id if namespace is None else namespace
+        self._locations = dict()
+        self._dirty = dict()
+        self._snapshots = dict()
+        self._stale = dict()
+        self._volatile = dict()
+        self._hashed = dict()
+        self._sorted = dict()
+        self._indexed = dict()
+        self._built = False
+        self._pending = dict()
+        self._batching = 0
+        self._server = False
+        self._reindex()
+
+    def reset(self, game, attrs=None):
+        # Empty the backend stores, they are reused by the next game
+        if type(self._backend) is not DictStorage:
+            for loc, stor in self._stores():
+                stor.clear()
+            self._backend.sync()
+        args, kwargs = self._reset_args(attrs, storage=self._backend, namespace=self._namespace)
+        self.__init__(*args, **kwargs)
+        self._server = game.is_server()
+        self._reindex()
+
+    def on_assign_to_game(self, game):
+        super().on_assign_to_game(game)
+        self._server = game.is_server()
+        self._reindex()
+
+    def _open(self, loc):
+        stor = self._backend.open("{}/{}".format(self._namespace, "shared" if loc is _SHARED else "player-{}".format(loc)))
+        if hasattr(stor, "on_load"):
+            stor.on_load = lambda id, obj: self._loaded(loc, id, obj)
+        return stor
+
+    def _adopt(self):
+        """Move plain dictionary contents (e.g., from set_state) into the backend."""
+        if type(self._backend) is DictStorage:
+            return
+        if isinstance(self._storage, dict):
+            stor = self._open(_SHARED)
+            stor.clear()
+            stor.update(self._storage)
+            self.direct_set("_storage", stor)
+        for p, data in tuple(self._player_storage.items()):
+            if isinstance(data, dict):
+                stor = self._player_storage[p] = self._open(p)
+                stor.clear()
+                stor.update(data)
+
+    def _stores(self):
+        """Iterate (LOCATION, STORAGE) for every store."""
+        yield _SHARED, self._storage
+        yield from self._player_storage.items()
+
+    @staticmethod
+    def _live(stor):
+        """Iterate (ID, OBJ) for objects in memory."""
+        cached = getattr(stor, "cached_items", None)
+        return stor.items() if cached is None else cached()
+
+    def _reindex(self):
+        self._adopt()
+        self._locations.clear()
+        self._dirty.clear()
+        self._snapshots.clear()
+        self._stale.clear()
+        self._volatile.clear()
+        self._clear_indexes()
+        for loc, stor in self._stores():
+            if loc is not _SHARED:
+                for id in stor:
+                    self._locations.setdefault(id, set()).add(loc)
+            if self.track_changes and self._server:
+                for id, obj in self._live(stor):
+                    self._track(loc, id, obj)
+
+    def _unindex(self):
+        for loc, stor in self._stores():
+            for id, obj in self._live(stor):
+                self._untrack(loc, id, obj)
+
+    def _loaded(self, loc, id, obj):
+        if self.track_changes and self._server:
+            self._track(loc, id, obj)
+
+    def initialize(self, game, attrs=None):
+        self._unindex()
+        super().initialize(game, attrs)
+        self._reindex()
+
+    def set_state(self, state):
+        # Snapshots are shared, take a private copy
+        state = { k: self._thaw(v) for k, v in state.items() }
+        if isinstance(state.get('_player_storage'), dict):
+            state['_player_storage'] = { p: self._thaw(v) for p, v in state['_player_storage'].items() }
+        self._unindex()
+        super().set_state(state)
+        self._reindex()
+
+    @staticmethod
+    def _thaw(value):
+        return copy.deepcopy(value) if isinstance(value, Snapshot) else value
+
+    def _stor(self, loc, create=False):
+        if loc is _SHARED:
+            return self._storage
+        stor = self._player_storage.get(loc)
+        if stor is None and create:
+            stor = self._player_storage[loc] = self._open(loc)
+        return stor
+
+    def _place(self, loc, id, obj):
+        """Put obj into a location (_SHARED or player number) without notifying."""
+        stor = self._stor(loc, True)
+        old = stor.get(id)
+        if old is not None:
+            self._untrack(loc, id, old)
+        stor[id] = obj
+        self._changed(loc, id)
+        self._index(loc, id, obj)
+        if loc is not _SHARED:
+            self._locations.setdefault(id, set()).add(loc)
+        if self.track_changes and self._server:
+            self._track(loc, id, obj)
+
+    def _displace(self, loc, id):
+        """Remove an id from a location without notifying."""
+        stor = self._stor(loc)
+        if stor is not None:
+            old = stor.pop(id, None)
+            if old is not None:
+                self._untrack(loc, id, old)
+                self._changed(loc, id)
+                self._unindex_obj(loc, id)
+        if loc is not _SHARED:
+            self._unlocate(id, loc)
+
+    def _unlocate(self, id, player_num):
+        locs = self._locations.get(id)
+        if locs is not None:
+            locs.discard(player_num)
+            if not locs:
+                del self._locations[id]
+
+    def _track(self, loc, id, obj):
+        if isinstance(obj, Object):
+            data = obj.dict
+            if not (isinstance(data, _TrackedDict) and data.store is self):
+                data = obj.dict = _TrackedDict(obj, self)
+            data.owners.add((loc, id))
+
+    def _untrack(self, loc, id, obj):
+        self._dirty.pop((loc, id), None)
+        data = getattr(obj, "dict", None)
+        if isinstance(data, _TrackedDict) and data.store is self:
+            data.owners.discard((loc, id))
+            if not data.owners:
+                obj.dict = dict(data)
+
+    def _changed(self, loc, id):
+        if loc in self._snapshots:
+            if loc in self._stale:
+                self._stale[loc].add(id)
+            else:
+                self._stale[loc] = { id }
+
+    def _touch(self, owner, obj, fields):
+        self._changed(*owner)
+        if self.indexes and any(f in self.indexes for f in fields):
+            self._index(owner[0], owner[1], obj)
+        if owner in self._dirty:
+            self._dirty[owner][1].update(fields)
+        else:
+            self._dirty[owner] = [ obj, set(fields) ]
+
+    def _clear_indexes(self):
+        for f, kind in self.indexes.items():
+            if kind not in ("hash", "sorted"):
+                raise Exception("Unknown index type '{}' for '{}'".format(kind, f))
+        self._indexed.clear()
+        self._hashed.clear()
+        self._sorted.clear()
+        self._built = False
+
+    def _build_indexes(self):
+        self._built = True
+        for loc, stor in self._stores():
+            scan = getattr(stor, "scan", None)
+            for id, obj in (stor.items() if scan is None else scan()):
+                self._index(loc, id, obj)
+
+    @staticmethod
+    def _value(obj, field):
+        if isinstance(obj, collections.abc.Mapping):
+            return obj.get(field)
+        return getattr(obj, field, None)
 
+    def _index(self, loc, id, obj):
+        """Add or update the index entries for an object."""
+        if not (self.indexes and self._built):
+            return
+        self._unindex_obj(loc, id)
+        values = dict()
+        for field, kind in self.indexes.items():
+            value = self._value(obj, field)
+            if value is None:
+                continue
+            if kind == "hash":
+                index = self._hashed.setdefault(loc, dict()).setdefault(field, dict())
+                try:
+                    index.setdefault(value, set()).add(id)
+                except TypeError:       # unhashable
+                    continue
+            else:
+                vals, ids = self._sorted.setdefault(loc, dict()).setdefault(field, ([], []))
+                try:
+                    i = bisect.bisect_right(vals, value)
+                except TypeError:       # not comparable
+                    continue
+                vals.insert(i, value)
+                ids.insert(i, id)
+            values[field] = value
+        if values:
+            self._indexed[(loc, id)] = values
+
+    def _unindex_obj(self, loc, id):
+        values = self._indexed.pop((loc, id), None)
+        if not values:
+            return
+        for field, value in values.items():
+            if self.indexes[field] == "hash":
+                index = self._hashed[loc][field]
+                index[value].discard(id)
+                if not index[value]:
+                    del index[value]
+            else:
+                vals, ids = self._sorted[loc][field]
+                i = bisect.bisect_left(vals, value)
+                i += ids[i:bisect.bisect_right(vals, value, i)].index(id)
+                del vals[i]
+                del ids[i]
+
+    def _lookup(self, loc, field, lo, hi):
+        """Ids in a location with lo <= field <= hi."""
+        kind = self.indexes.get(field)
+        if not self._built:
+            self._build_indexes()
+        if kind == "hash":
+            return self._hashed.get(loc, {}).get(field, {}).get(lo, ())
+        if kind == "sorted":
+            vals, ids = self._sorted.get(loc, {}).get(field, ((), ()))
+            i = 0 if lo is None else bisect.bisect_left(vals, lo)
+            j = len(vals) if hi is None else bisect.bisect_right(vals, hi)
+            return ids[i:j]
+        raise Exception("No index on '{}'".format(field))
+
+    def _find_in(self, loc, criteria):
+        stor = self._stor(loc) or {}
+        if not criteria:
+            return list(stor.values())
+        found = None
+        # Hash lookups first, they are cheapest
+        for field, value in sorted(criteria.items(), key=lambda kv: self.indexes.get(kv[0]) != "hash"):
+            ids = self._lookup(loc, field, value, value)
+            found = set(ids) if found is None else found.intersection(ids)
+            if not found:
+                return []
+        return [ stor[id] for id in found ]
+
+    def _range_in(self, loc, field, lo, hi):
+        if self.indexes.get(field) != "sorted":
+            raise Exception("Range queries require a sorted index on '{}'".format(field))
+        stor = self._stor(loc) or {}
+        return [ stor[id] for id in self._lookup(loc, field, lo, hi) ]
+
+    def _find(self, game, **criteria):
+        """
+        Return a list of items in shared storage having all of the given
+        (indexed) attribute values, e.g., `stor_find(type="gem", color="red")`.
+        """
+        return self._find_in(_SHARED, criteria)
+
+    def _find_player(self, game, player_num, **criteria):
+        """Return a list of items in player storage having all of the given (indexed) attribute values."""
+        return self._find_in(player_num, criteria)
+
+    def _range(self, game, field, lo=None, hi=None):
+        """
+        Return a list of items in shared storage with lo <= field <= hi
+        (either bound may be None), ordered by field. The field must have a
+        "sorted" index.
+        """
+        return self._range_in(_SHARED, field, lo, hi)
+
+    def _range_player(self, game, player_num, field, lo=None, hi=None):
+        """Return a list of items in player storage with lo <= field <= hi, ordered by field."""
+        return self._range_in(player_num, field, lo, hi)
+
+    def _send(self, game, type, shared=None, player=None):
+        """
+        Send one notice of the given type to each recipient. Every
+        observer receives the shared part. Players with private changes
+        receive them in the same notice as the shared part.
+        """
+        if shared and player:
+            for p, data in player.items():
+                game.notify(p, Notice(source=self.id, type=type, data=dict(shared=shared, player={ p: data })))
+            others = tuple(p for p in game.notified if p not in player)
+            if others:
+                game.notify(others, Notice(source=self.id, type=type, data=dict(shared=shared)))
+        elif shared:
+            game.notify(None, Notice(source=self.id, type=type, data=dict(shared=shared)))
+        elif player:
+            for p, data in player.items():
+                game.notify(p, Notice(source=self.id, type=type, data=dict(player={ p: data })))
 
     def _get(self, game, id):
         """
@@ -54,17 +528,125 @@ class ObjectStore(EnginePlugin):
         """
         if id in self._storage:
             return self._storage[id]
-        for stor in self._player_storage.values():
-            if id in stor:
-                return stor[id]
+        locs = self._locations.get(id)
+        if locs:
+            for p in locs:
+                return self._player_storage[p][id]
 
     def _del(self, game, *ids):
         """Delete key(s) from shared and all per-player stores. Returns None."""
         for id in ids:
-            self._storage.pop(id, None)
-            for stor in self._player_storage.values():
-                stor.pop(id, None)
-        game.notify(None, Notice(source=self.id, type=NoticeType.STORE_DEL, data=dict(all=ids)))
+            if id in self._storage:
+                self._displace(_SHARED, id)
+                self._record(_SHARED, id, _DELETED)
+            for p in tuple(self._locations.get(id, ())):
+                self._displace(p, id)
+                self._record(p, id, _DELETED)
+        self._maybe_flush(game)
+
+    def _del_many(self, game, all=(), shared=(), player=None):
+        """
+        Delete many keys, sending at most one STORE_DEL notice per
+        recipient. `all` keys are deleted from every store (as `stor_del`),
+        `shared` keys from shared storage, and `player` is a dict mapping
+        player numbers to keys to delete from that player storage.
+        """
+        with self._batch(game):
+            if all:
+                self._del(game, *all)
+            if shared:
+                self._del_shared(game, *shared)
+            for p, ids in (player or {}).items():
+                self._del_player(game, p, *ids)
+
+    @contextlib.contextmanager
+    def _batch(self, game):
+        """
+        Context manager which holds back STORE_SET and STORE_DEL notices
+        until the outermost batch exits, then sends at most one of each
+        per recipient:
+
+            with game.stor_batch():
+                for card in deck:
+                    game.stor_set_player(card.owner, card.id, card)
+        """
+        self._batching += 1
+        try:
+            yield self
+        finally:
+            self._batching -= 1
+            self._maybe_flush(game)
+
+    def _record(self, loc, id, obj):
+        if loc in self._pending:
+            self._pending[loc][id] = obj
+        else:
+            self._pending[loc] = { id: obj }
+
+    def _maybe_flush(self, game):
+        if not (self._batching or self.coalesce):
+            self._flush_pending(game)
+
+    def _flush_pending(self, game):
+        if not self._pending:
+            return
+        set_shared, set_player = dict(), dict()
+        del_shared, del_player = [], dict()
+        for loc, changes in self._pending.items():
+            for id, obj in changes.items():
+                if obj is _DELETED:
+                    if loc is _SHARED:
+                        del_shared.append(id)
+                    else:
+                        del_player.setdefault(loc, []).append(id)
+                else:
+                    self._dirty.pop((loc, id), None)   # Sending the whole thing
+                    if loc is _SHARED:
+                        set_shared[id] = obj
+                    else:
+                        set_player.setdefault(loc, dict())[id] = obj
+        self._pending.clear()
+        self._send(game, NoticeType.STORE_SET, set_shared, set_player)
+        self._send(game, NoticeType.STORE_DEL, tuple(del_shared), del_player)
+
+    def _flush(self, game):
+        """
+        Send any held back STORE_SET and STORE_DEL notices (see
+        `coalesce`), then a STORE_PATCH notice with all tracked changes to
+        stored objects (see `track_changes`). Called automatically at the
+        end of every action.
+        """
+        if self._batching:
+            return
+        self._flush_pending(game)
+        if self._dirty:
+            self._flush_dirty(game)
+        self._backend.sync()
+
+    def _flush_dirty(self, game):
+        shared, player = dict(), dict()
+        for (loc, id), (obj, fields) in self._dirty.items():
+            self._write_back(loc, id, obj)
+            data = obj.dict
+            patch = dict(set={ f: data[f] for f in fields if f in data })
+            unset = [ f for f in fields if f not in data ]
+            if unset:
+                patch['unset'] = unset
+            if loc is _SHARED:
+                shared[id] = patch
+            else:
+                player.setdefault(loc, dict())[id] = patch
+        self._dirty.clear()
+        self._send(game, NoticeType.STORE_PATCH, shared, player)
+
+    def _write_back(self, loc, id, obj):
+        """Save a modified object to a backend which does not hold references."""
+        stor = self._stor(loc)
+        if obj is not None and stor is not None and not isinstance(stor, dict):
+            stor[id] = obj
+
+    def on_action_end(self, game, name, stash):
+        self._flush(game)
 
     def _get_shared(self, game, id, dflt=None):
         """Retrieve an item from shared storage"""
@@ -72,19 +654,38 @@ class ObjectStore(EnginePlugin):
 
     def _set_shared(self, game, id, obj):
         """Set or update an item in shared storage"""
-        self._storage[id] = obj
-        game.notify(None, Notice(source=self.id, type=NoticeType.STORE_SET, data=dict(shared={id: obj})))
+        self._place(_SHARED, id, obj)
+        self._record(_SHARED, id, obj)
+        self._maybe_flush(game)
         return id
 
+    def _set_shared_many(self, game, items):
+        """
+        Set or update many items (a dict or iterable of (id, obj) pairs)
+        in shared storage, sending a single STORE_SET notice.
+        """
+        with self._batch(game):
+            for id, obj in (items.items() if isinstance(items, dict) else items):
+                self._set_shared(game, id, obj)
+
     def _del_shared(self, game, *ids):
         """Delete key(s) from shared storage. Returns None."""
         for id in ids:
-            self._storage.pop(id, None)
-        game.notify(None, Notice(source=self.id, type=NoticeType.STORE_DEL, data=dict(shared=ids)))
+            self._displace(_SHARED, id)
+            self._record(_SHARED, id, _DELETED)
+        self._maybe_flush(game)
+
+    @staticmethod
+    def _select(stor, filt):
+        lookup = getattr(stor, "lookup", None)
+        ids = None if lookup is None else lookup(filt)
+        if ids is None:
+            return [x for x in stor.values() if filt.accepts(x)]
+        return [x for x in (stor.get(id) for id in ids) if x is not None and filt.accepts(x)]
 
     def _list_shared(self, game, filt=FILTER_ALL):
         """Return a list of items in shared storage matching a filter."""
-        return [x for x in self._storage.values() if filt.accepts(x)]
+        return self._select(self._storage, filt)
 
     def _get_player(self, game, player_num, id, dflt=None):
         """Retrieve an item from a player storage"""
@@ -94,60 +695,151 @@ class ObjectStore(EnginePlugin):
 
     def _set_player(self, game, player_num, id, obj):
         """Set or update an item in player storage"""
-        self._player_storage[player_num][id] = obj
-        game.notify(player_num, Notice(
-            source=self.id, type=NoticeType.STORE_SET,
-            data=dict(player={ player_num: {id: obj} }),
-        ))
+        self._place(player_num, id, obj)
+        self._record(player_num, id, obj)
+        self._maybe_flush(game)
         return id
 
+    def _set_player_many(self, game, player_num, items):
+        """
+        Set or update many items (a dict or iterable of (id, obj) pairs)
+        in a player storage, sending a single STORE_SET notice.
+        """
+        with self._batch(game):
+            for id, obj in (items.items() if isinstance(items, dict) else items):
+                self._set_player(game, player_num, id, obj)
+
     def _del_player(self, game, player_num, *ids):
         """Delete key(s) from player storage. Returns None."""
-        if player_num in self._player_storage:
-            for id in ids:
-                self._player_storage[player_num].pop(id, None)
-        game.notify(player_num, Notice(
-            source=self.id, type=NoticeType.STORE_DEL,
-            data=dict(player={ player_num: ids }),
-        ))
+        for id in ids:
+            self._displace(player_num, id)
+            self._record(player_num, id, _DELETED)
+        self._maybe_flush(game)
 
     def _list_player(self, game, player_num, filt=FILTER_ALL):
         """Return a list of items in player storage matching a filter."""
-        return [x for x in self._player_storage[player_num].values() if filt.accepts(x)]
+        return self._select(self._player_storage.get(player_num, {}), filt)
 
 
     @event_listener(NoticeType.STORE_SET)
     def on_store_set(self, game, seq, player_num, notice):
         """Process a Notice from our upstream."""
         if notice.source == self.id:
-            if 'shared' in notice.data:
-                for k, v in notice.data['shared'].items():
-                    self._set_shared(game, k, v)
-            if 'player' in notice.data:
-                for p, data in notice.data['player'].items():
-                    for k, v in data.items():
-                        self._set_player(game, p, k, v)
+            with self._batch(game):
+                if 'shared' in notice.data:
+                    for k, v in notice.data['shared'].items():
+                        self._set_shared(game, k, v)
+                if 'player' in notice.data:
+                    for p, data in notice.data['player'].items():
+                        for k, v in data.items():
+                            self._set_player(game, p, k, v)
+            self._flush(game)
 
     @event_listener(NoticeType.STORE_DEL)
     def on_store_del(self, game, seq, player_num, notice):
         """Process a Notice from our upstream."""
         if notice.source == self.id:
-            if 'all' in notice.data:
-                self._del(game, *notice.data['all'])
-            if 'shared' in notice.data:
-                self._del_shared(game, *notice.data['shared'])
-            if 'player' in notice.data:
-                for p, data in notice.data['player'].items():
-                    self._del_player(game, p, *data)
+            with self._batch(game):
+                if 'all' in notice.data:
+                    self._del(game, *notice.data['all'])
+                if 'shared' in notice.data:
+                    self._del_shared(game, *notice.data['shared'])
+                if 'player' in notice.data:
+                    for p, data in notice.data['player'].items():
+                        self._del_player(game, p, *data)
+            self._flush(game)
+
+    @event_listener(NoticeType.STORE_PATCH)
+    def on_store_patch(self, game, seq, player_num, notice):
+        """Process a Notice from our upstream."""
+        if notice.source == self.id:
+            for id, patch in notice.data.get('shared', {}).items():
+                obj = self._storage.get(id)
+                self._patch(obj, patch)
+                self._write_back(_SHARED, id, obj)
+                self._changed(_SHARED, id)
+                if obj is not None:
+                    self._index(_SHARED, id, obj)
+            for p, data in notice.data.get('player', {}).items():
+                stor = self._player_storage.get(p, {})
+                for id, patch in data.items():
+                    obj = stor.get(id)
+                    self._patch(obj, patch)
+                    self._write_back(p, id, obj)
+                    self._changed(p, id)
+                    if obj is not None:
+                        self._index(p, id, obj)
+            self._backend.sync()
+            self._send(game, NoticeType.STORE_PATCH, notice.data.get('shared'), notice.data.get('player'))
+
+    @staticmethod
+    def _patch(obj, patch):
+        # Mirrors the server, so bypasses object mutability
+        if obj is not None:
+            obj.dict.update(patch.get('set', ()))
+            for f in patch.get('unset', ()):
+                obj.dict.pop(f, None)
+
+    def _copy(self, loc):
+        """Copy of a store, a Snapshot when changes are tracked."""
+        stor = self._stor(loc)
+        if not (self.track_changes and self._server):
+            return copy.deepcopy(dict(stor))
+        snap = self._snapshots.get(loc)
+        volatile = self._volatile.setdefault(loc, set())
+
+        def take(id, obj):
+            if self._sealed(obj):
+                volatile.discard(id)
+            else:
+                volatile.add(id)
+            return copy.deepcopy(obj)
+
+        if snap is None:
+            volatile.clear()
+            snap = Snapshot((id, take(id, obj)) for id, obj in stor.items())
+        else:
+            ids = self._stale.get(loc, set()) | volatile
+            if ids:
+                changes = dict()
+                for id in ids:
+                    if id in stor:
+                        changes[id] = take(id, stor[id])
+                    else:
+                        volatile.discard(id)
+                        changes[id] = Snapshot.DELETE
+                snap = snap.evolve(changes)
+        self._stale.pop(loc, None)
+        self._snapshots[loc] = snap
+        return snap
+
+    def _sealed(self, obj):
+        # True when every change to obj is reported to the store
+        data = getattr(obj, "dict", None)
+        return (isinstance(obj, Object) and isinstance(data, _TrackedDict)
+                and data.store is self and all(_frozen(v) for v in data.values()))
 
     def get_state(self, player_num):
-        state = dict(_storage=copy.deepcopy(self._storage))
-        if player_num is GAME_MASTER:
-            # save game: append ALL objects
-            state['_player_storage'] = copy.deepcopy(self._player_storage)
-        elif player_num is NOBODY:
-            pass # kibbitzer, only public knowledge
-        elif player_num in self._player_storage:
-            # Specific player, hide others' data
-            state['_player_storage'] = { player_num: copy.deepcopy(self._player_storage[player_num]) }
-        return state
+        return self.state_views((player_num,))[0]
+
+    def state_views(self, players):
+        # Each store is copied once, however many players see it
+        copies = dict()
+        def copy_of(loc):
+            if loc not in copies:
+                copies[loc] = self._copy(loc)
+            return copies[loc]
+
+        views = []
+        for player_num in players:
+            state = dict(_storage=copy_of(_SHARED))
+            if player_num is GAME_MASTER:
+                # save game: append ALL objects
+                state['_player_storage'] = { p: copy_of(p) for p in self._player_storage }
+            elif player_num is NOBODY:
+                pass # kibbitzer, only public knowledge
+            elif player_num in self._player_storage:
+                # Specific player, hide others' data
+                state['_player_storage'] = { player_num: copy_of(player_num) }
+            views.append(state)
+        return views
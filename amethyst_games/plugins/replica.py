@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+
+"""
+# SPDX-License-Identifier: LGPL-3.0
+__all__ = 'Replica'.split()
+
+from amethyst.core import Attr
+
+from amethyst_games.plugin  import EnginePlugin
+from amethyst_games.replica import ReplicaWriter
+from amethyst_games.util    import NOBODY
+
+
+class Replica(EnginePlugin):
+    """
+    Publish the public game state (`engine.get_state(NOBODY)`, which
+    includes the shared part of the ObjectStore) to a shared memory
+    segment at the end of every action. Spectator and analytics processes
+    attach a `ReplicaReader` to the segment and read the state without
+    any requests to the game process.
+
+        game.register_plugin(Replica(name="game-1234", min_interval=0.5))
+
+        # In another process
+        version, state = ReplicaReader("game-1234", loads=engine.loads).load()
+
+    Register only on the server engine. Enable `track_changes` on the
+    ObjectStore so that the public state copy is incremental.
+
+    Every publish copies and encodes the whole public state in the game
+    thread, a cost proportional to the size of the state. Publishes are
+    therefore throttled by `min_interval`: the first action is published
+    at once, later actions at most once per interval. Set it to 0 to
+    publish after every action only when the state is small.
+
+    Configurable attributes
+    -----------------------
+
+    :ivar name: Shared memory segment name (random if not set, see
+    `replica_name()`).
+
+    :ivar size: Segment payload capacity in bytes.
+
+    :ivar min_interval: Minimum seconds between publishes (default 0.1).
+    Actions within the interval are published together when it expires.
+    """
+    AMETHYST_PLUGIN_COMPAT  = 1.0
+    AMETHYST_ENGINE_METHODS = "_publish _name _close".split()
+    AMETHYST_ENGINE_DEFAULT_METHOD_PREFIX = "replica_"
+
+    name         = Attr(str)
+    size         = Attr(int, default=1 << 20)
+    min_interval = Attr(float, default=0.1)
+    # Private attributes:
+    #   _writer:    ReplicaWriter, created on first use
+    #   _last:      float: time of the last publish
+    #   _timer:     TimerHandle: pending throttled publish
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._writer = None
+        self._last = None
+        self._timer = None
+
+    def reset(self, game, attrs=None):
+        # Keep publishing to the same segment
+        writer = self._writer
+        super().reset(game, attrs)
+        if writer is not None:
+            if self.name in (None, writer.name) and self.size <= writer.capacity:
+                self._writer = writer
+                self.name = writer.name
+            else:
+                writer.close()
+
+    def get_state(self, player):
+        return dict()
+
+    def _open(self):
+        if self._writer is None:
+            self._writer = ReplicaWriter(self.name, self.size)
+            self.name = self._writer.name
+        return self._writer
+
+    def _name(self, game):
+        """Return the shared memory segment name."""
+        return self._open().name
+
+    def _publish(self, game):
+        """Publish the public state now. Returns the replica version."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._last = game.timers.clock()
+        return self._open().publish(game.dumps(game.get_state(NOBODY)).encode("utf-8"))
+
+    def _close(self, game):
+        """Stop publishing and remove the shared memory segment."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def on_action_end(self, game, name, stash):
+        if not self.min_interval or self._last is None:
+            self._publish(game)
+            return
+        wait = self._last + self.min_interval - game.timers.clock()
+        if wait <= 0:
+            self._publish(game)
+        elif self._timer is None:
+            self._timer = game.call_later(wait, self._on_timer)
+
+    def _on_timer(self, game):
+        self._timer = None
+        self._publish(game)
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""
+
+"""
+# SPDX-License-Identifier: LGPL-3.0
+__all__ = 'SimultaneousPhase'.split()
+
+import copy
+
+from amethyst.core import Attr
+
+from amethyst_games.filters import Filter
+from amethyst_games.notice  import Notice, NoticeType
+from amethyst_games.plugin  import EnginePlugin, action, event_listener
+from amethyst_games.plugins.grants import Grant
+from amethyst_games.util    import GAME_MASTER
+
+NoticeType.register(PHASE_SUBMITTED="::phase-submitted")
+
+def _own_choices(plugin, player, choices):
+    # Players only see their own choice until the phase resolves
+    if player is GAME_MASTER:
+        return copy.deepcopy(choices)
+    return [ copy.deepcopy(c) if p == player else None for p, c in zip(plugin.players, choices) ]
+
+
+class SimultaneousPhase(EnginePlugin):
+    """
+    Phases in which all players act at once.
+
+    `phase_open()` opens a slot for each participant. Players fill their
+    slot with the `phase_submit` action (granted to each participant when
+    the GrantManager plugin is loaded). When every slot is filled, or when
+    the optional timeout passes, a single `phase_resolve` action is
+    scheduled which receives all submissions together:
+
+        class RockPaperScissors(EnginePlugin):
+            @action
+            def begin_round(self, game, stash):
+                game.phase_open("throw", timeout=30)
+
+            @action
+            def phase_submit(self, game, stash, player_num, choice):
+                pass
+
+            @phase_submit.check
+            def phase_submit(self, game, stash, player_num, choice):
+                return choice in ("rock", "paper", "scissors")
+
+            @action
+            def phase_resolve(self, game, stash, phase, submissions, missing, generation):
+                # submissions: [ [player_num, choice], ... ]
+                ...
+
+    Submissions are validated as they arrive by `phase_submit` check
+    callbacks (add your own, as above). `generation` identifies the
+    opening of the phase being resolved: a timeout and the last
+    submission may both schedule a resolution, only the first one
+    resolves the phase, even if the same phase name is opened again in
+    the meantime. Until the phase resolves, other
+    players only learn that a player has submitted, not their choice:
+    the `phase_submit` action is only sent to the submitting player (and
+    the game master), other observers receive a PHASE_SUBMITTED notice
+    which marks the player done on their engines without running the
+    `phase_submit` callbacks.
+
+    Configurable attributes
+    -----------------------
+
+    :ivar grants: Grant `phase_submit` to participants when a phase opens
+    (requires GrantManager).
+
+
+    State Attributes
+    ----------------
+
+    :ivar phase: Name of the open phase or None.
+
+    :ivar players: Participating player numbers.
+
+    :ivar done: Whether each participant (by position in `players`) has
+    submitted.
+
+    :ivar choices: Submission of each participant.
+
+    :ivar generation: Number of phases opened, identifies the open phase.
+    """
+    AMETHYST_PLUGIN_COMPAT  = 1.0
+    AMETHYST_ENGINE_METHODS = "_open _resolve _is_open _waiting _submitted".split()
+    AMETHYST_ENGINE_DEFAULT_METHOD_PREFIX = "phase_"
+    AMETHYST_STATE_VISIBILITY = dict(choices=_own_choices)
+
+    grants  = Attr(bool, default=True)
+
+    phase   = Attr()
+    players = Attr(list, default=list)
+    done    = Attr(list, default=list)
+    choices = Attr(list, default=list)
+    generation = Attr(int, default=0)
+    # Private attributes:
+    #   _timer:    TimerHandle: pending phase deadline
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._timer = None
+
+    def _open(self, game, name, players=None, timeout=None):
+        """
+            mygame.phase_open("bid", timeout=60)
+
+        Open a simultaneous phase for the given players (default: all).
+        If `timeout` (seconds) is given, the phase resolves when it passes
+        even if some players have not submitted.
+        """
+        self._cancel()
+        self.generation += 1
+        self.phase = name
+        self.players = list(range(len(game.players)) if players is None else players)
+        self.done = [ False ] * len(self.players)
+        self.choices = [ None ] * len(self.players)
+        if game.is_server():
+            if self.grants and game.has_plugin("GrantManager"):
+                game.grant_many([ (p, Grant(name="phase_submit", kwargs=dict(player_num=p))) for p in self.players ])
+            if timeout is not None:
+                self._timer = game.call_later(timeout, self._on_timer, self.generation)
+
+    def _resolve(self, game):
+        """
+            mygame.phase_resolve()
+
+        Resolve the open phase now, whether or not all players submitted.
+        """
+        if self.phase is not None:
+            game.schedule("phase_resolve", self._resolution())
+
+    def _is_open(self, game):
+        """True while a phase is accepting submissions."""
+        return self.phase is not None
+
+    def _waiting(self, game):
+        """Return the list of participants who have not submitted."""
+        return [ p for p, done in zip(self.players, self.done) if not done ]
+
+    def _submitted(self, game, player_num):
+        """True if the player has submitted in the open phase."""
+        return player_num in self.players and self.done[self.players.index(player_num)]
+
+    def _cancel(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _on_timer(self, game, generation):
+        # A timeout queued before the phase closed, stale once the phase is reopened
+        if generation != self.generation:
+            return
+        self._timer = None
+        self._resolve(game)
+
+    def _resolution(self):
+        return dict(
+            phase=self.phase,
+            submissions=[ [ p, c ] for p, c, done in zip(self.players, self.choices, self.done) if done ],
+            missing=[ p for p, done in zip(self.players, self.done) if not done ],
+            generation=self.generation,
+        )
+
+    @action
+    def phase_submit(self, game, stash, player_num, choice=None):
+        idx = self.players.index(player_num)
+        self.done[idx] = True
+        self.choices[idx] = choice
+        if game.is_server():
+            others = tuple(p for p in game.notified if p != player_num and p is not GAME_MASTER)
+            if others:
+                game.notify(others, Notice(source=self.id, type=NoticeType.PHASE_SUBMITTED, data=dict(
+                    phase=self.phase, player_num=player_num,
+                )))
+            if all(self.done):
+                self._resolve(game)
+
+    @phase_submit.check
+    def phase_submit(self, game, stash, player_num, choice=None):
+        return self.phase is not None and player_num in self.players and not self.done[self.players.index(player_num)]
+
+    @phase_submit.notify
+    def phase_submit(self, game, stash, player_num, kwargs):
+        # Keep choices secret until the phase resolves, others receive
+        # PHASE_SUBMITTED instead
+        if player_num is not GAME_MASTER and player_num != kwargs.get('player_num'):
+            return False
+        return kwargs
+
+    @event_listener(NoticeType.PHASE_SUBMITTED)
+    def on_phase_submitted(self, game, seq, player_num, notice):
+        """Process a Notice from our upstream."""
+        if notice.source == self.id and notice.data['phase'] == self.phase and notice.data['player_num'] in self.players:
+            self.done[self.players.index(notice.data['player_num'])] = True
+
+    @action
+    def phase_resolve(self, game, stash, phase, submissions, missing, generation):
+        pass
+
+    @phase_resolve.check
+    def phase_resolve(self, game, stash, phase, submissions, missing, generation):
+        return self.phase == phase and self.generation == generation
+
+    @phase_resolve.before
+    def phase_resolve(self, game, stash, phase, submissions, missing, generation):
+        # Close before any resolve actions run, they may open the next phase
+        self._cancel()
+        self.phase = None
+        self.players, self.done, self.choices = [], [], []
+        if game.is_server() and self.grants and game.has_plugin("GrantManager"):
+            game.expire(Filter(name="phase_submit"))
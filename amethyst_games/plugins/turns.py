@@ -5,9 +5,13 @@
 # SPDX-License-Identifier: LGPL-3.0
 __all__ = 'Turns'.split()
 
+import copy
+import queue
+
 from amethyst.core import Attr
 
 from amethyst_games.plugin import EnginePlugin
+from amethyst_games.util   import GAME_MASTER
 
 class Turns(EnginePlugin):
     """
@@ -21,6 +25,16 @@ class Turns(EnginePlugin):
     'setup-0', 'setup-1', .... After the setup rounds complete, the round
     will be set to numeric 0 and play will begin with player 0.
 
+    :ivar checkpoint_every: Keep a turn timeline. The journal offset of
+    every turn is recorded and a checkpoint (`engine.get_state(GAME_MASTER)`)
+    is taken at the start of every N-th turn, once the action which started
+    the turn completes. Used by `turn_show()` and `turn_rewind()`. Disabled
+    (0) by default since every checkpoint is a full copy of the game state.
+    The timeline is not part of the saved game state.
+
+    :ivar timeline_limit: Maximum number of turns kept in the timeline,
+    older turns are dropped (0 for no limit).
+
 
     State Attributes
     ----------------
@@ -42,7 +56,7 @@ class Turns(EnginePlugin):
     :ivar setup_state: Current index in the setup_rounds list.
     """
     AMETHYST_PLUGIN_COMPAT  = 1.0
-    AMETHYST_ENGINE_METHODS = "_player _player_num _number _round _start _flag _roundflag _playerflag".split()
+    AMETHYST_ENGINE_METHODS = "_player _player_num _number _round _start _flag _roundflag _playerflag _history _show _rewind".split()
     AMETHYST_ENGINE_DEFAULT_METHOD_PREFIX = "turn_"
 
     current_turn   = Attr(int, default=-1)
@@ -52,8 +66,16 @@ class Turns(EnginePlugin):
     setup_rounds   = Attr()
     setup_state    = Attr(default=-1)
 
+    checkpoint_every = Attr(int, default=0)
+    timeline_limit   = Attr(int, default=100)
+    # Private attributes:
+    #   _timeline: list: dict(turn, round, player, journal, checkpoint) per turn
+    #   _pending:  dict: timeline entry to checkpoint when the action ends
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        self._timeline = []
+        self._pending = None
         # Catch likely common mistake of passing a number of setup rounds
         if isinstance(self.setup_rounds, int):
             self.setup_rounds = [1] * self.setup_rounds
@@ -120,7 +142,7 @@ class Turns(EnginePlugin):
 
         if round is None and isinstance(self.current_round, int):
             round = self.current_round
-            if self.current_player < 0 or player_num < 0 or player_num > num_players:
+            if self.current_player < 0 or player_num < 0 or player_num >= num_players:
                 round += 1
 
         # Current turn is guaranteed unique and predictable turn identifier
@@ -129,6 +151,108 @@ class Turns(EnginePlugin):
             self.current_round = round
         self.current_player = player_num % num_players
 
+        for p in engine.plugins:
+            p.on_turn_start(engine, self.current_turn, self.current_round, self.current_player)
+
+        if self.checkpoint_every:
+            entry = dict(
+                turn=self.current_turn, round=self.current_round, player=self.current_player,
+                journal=len(engine.journal), checkpoint=None,
+            )
+            self._timeline.append(entry)
+            if self.timeline_limit and len(self._timeline) > self.timeline_limit:
+                del self._timeline[:len(self._timeline) - self.timeline_limit]
+            if engine.is_acting():
+                self._pending = entry
+            else:
+                self._checkpoint(engine, entry)
+
+    def initialize(self, game, attrs=None):
+        super().initialize(game, attrs)
+        self._timeline = []
+        self._pending = None
+
+    def on_action_end(self, game, name, stash):
+        if self._pending is not None:
+            entry, self._pending = self._pending, None
+            self._checkpoint(game, entry)
+
+    def _checkpoint(self, engine, entry):
+        if entry['turn'] % self.checkpoint_every == 0:
+            entry['checkpoint'] = engine.get_state(GAME_MASTER)
+
+    def _entry(self, turn):
+        for idx in range(len(self._timeline) - 1, -1, -1):
+            if self._timeline[idx]['turn'] == turn:
+                return idx
+        raise Exception("Turn {} is not in the timeline".format(turn))
+
+    def _history(self, engine):
+        """
+            mygame.turn_history()
+
+        Return a list of dict(turn, round, player) for every turn in the
+        timeline.
+        """
+        return [ dict(turn=e['turn'], round=e['round'], player=e['player']) for e in self._timeline ]
+
+    def _show(self, engine, turn):
+        """
+            mygame.turn_show(3)
+
+        Return dict(turn, round, player, actions) for a turn in the
+        timeline, where actions is a list of (name, kwargs) pairs for the
+        actions taken during the turn, including the one which started the
+        next turn (if any).
+        """
+        idx = self._entry(turn)
+        entry = self._timeline[idx]
+        end = self._timeline[idx+1]['journal'] if idx + 1 < len(self._timeline) else len(engine.journal)
+        return dict(
+            turn=entry['turn'], round=entry['round'], player=entry['player'],
+            actions=[ (name, copy.deepcopy(kwargs)) for name, kwargs, stash in engine.journal[entry['journal']:end] ],
+        )
+
+    def _rewind(self, engine, turn):
+        """
+            mygame.turn_rewind(3)
+
+        Restore the game to the start of a turn in the timeline. The
+        nearest earlier checkpoint is loaded and the journaled actions
+        between it and the turn are replayed (without notifying
+        observers). Notices and actions queued by the replayed actions are
+        discarded, the actions are replayed from the journal. Later turns
+        are discarded from the journal and the timeline. Observers are not
+        told about the rewind, send them new state if they need it.
+        """
+        idx = self._entry(turn)
+        base = idx
+        while base >= 0 and self._timeline[base]['checkpoint'] is None:
+            base -= 1
+        if base < 0:
+            raise Exception("No checkpoint at or before turn {}".format(turn))
+        start = self._timeline[base]
+        replay = engine.journal[start['journal']:self._timeline[idx]['journal']]
+
+        del engine.journal[start['journal']:]
+        del self._timeline[base+1:]
+        self._pending = None
+        engine.set_state(copy.deepcopy(start['checkpoint']))
+
+        notified, engine.notified = engine.notified, dict()
+        run_queue, engine._queue = engine._queue, queue.Queue()
+        try:
+            for name, kwargs, stash in replay:
+                engine.call_immediate(name, copy.deepcopy(kwargs), stash=copy.deepcopy(stash))
+        finally:
+            engine.notified = notified
+            replayed, engine._queue = engine._queue, run_queue
+            # Keep anything else (e.g., timers, dispatches) for the real queue
+            while not replayed.empty():
+                item = replayed.get_nowait()
+                if item[0] not in ('notify', 'call'):
+                    run_queue.put(item)
+
     def _player(self, engine):
         """
             mygame.turn_player()
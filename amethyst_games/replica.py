@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+Shared-memory replicas of published game state.
+"""
+# SPDX-License-Identifier: LGPL-3.0
+__all__ = """
+ReplicaWriter
+ReplicaReader
+""".split()
+
+import json
+import struct
+import time
+from multiprocessing import shared_memory
+
+# Segment layout:
+#   magic    4s   b"AGRP"
+#   layout   u32  layout version
+#   seq      u64  seqlock sequence, odd while a write is in progress
+#   length   u64  payload length
+#   payload  ...
+_HEADER = struct.Struct("<4sIQQ")
+_SEQ = struct.Struct("<Q")
+_SEQ_OFFSET = 8
+_MAGIC = b"AGRP"
+_LAYOUT = 1
+
+# Segments created by writers in this process
+_owned = set()
+
+
+class ReplicaWriter(object):
+    """
+    Single writer of a shared memory replica segment.
+
+    Payloads (bytes) are published with a seqlock: the sequence number is
+    made odd before the payload is written and even again afterward, so
+    readers in other processes can detect (and retry) torn reads without
+    any locking or cooperation from the writer.
+
+        writer = ReplicaWriter("my-game", size=16 * 1024 * 1024)
+        writer.publish(b'{"hello": "world"}')
+
+    :ivar name: Shared memory segment name, pass it to `ReplicaReader`.
+
+    :ivar version: Number of payloads published.
+    """
+    def __init__(self, name=None, size=1 << 20):
+        self.shm = shared_memory.SharedMemory(name=name, create=True, size=size + _HEADER.size)
+        self.name = self.shm.name
+        self.capacity = size
+        self.version = 0
+        _HEADER.pack_into(self.shm.buf, 0, _MAGIC, _LAYOUT, 0, 0)
+        _owned.add(self.shm._name)
+
+    def publish(self, payload):
+        """Replace the segment payload. Returns the new version number."""
+        if len(payload) > self.capacity:
+            raise Exception("Replica payload of {} bytes exceeds segment capacity {}".format(len(payload), self.capacity))
+        buf = self.shm.buf
+        seq = 2 * self.version
+        _HEADER.pack_into(buf, 0, _MAGIC, _LAYOUT, seq + 1, len(payload))
+        buf[_HEADER.size:_HEADER.size + len(payload)] = payload
+        _SEQ.pack_into(buf, _SEQ_OFFSET, seq + 2)
+        self.version += 1
+        return self.version
+
+    def close(self, unlink=True):
+        """Release the segment (and by default, remove it)."""
+        self.shm.close()
+        if unlink:
+            _owned.discard(self.shm._name)
+            self.shm.unlink()
+
+
+class ReplicaReader(object):
+    """
+    Reader of a shared memory replica segment, usable from any process.
+
+        reader = ReplicaReader("my-game")
+        version, state = reader.load()
+
+    Reading never blocks the writer. A read which overlaps a publish is
+    retried, up to `timeout` seconds.
+    """
+    def __init__(self, name, loads=json.loads):
+        self.shm = shared_memory.SharedMemory(name=name)
+        self.loads = loads
+        self._untrack()
+        magic, layout, seq, length = _HEADER.unpack_from(self.shm.buf, 0)
+        if magic != _MAGIC or layout != _LAYOUT:
+            self.shm.close()
+            raise Exception("Shared memory segment '{}' is not a replica (layout {})".format(name, _LAYOUT))
+
+    def _untrack(self):
+        # Attaching registers the segment with the resource tracker which
+        # would remove it when this (reader) process exits.
+        if self.shm._name in _owned:
+            return
+        try:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(self.shm._name, "shared_memory")
+        except Exception:
+            pass
+
+    @property
+    def version(self):
+        """Version of the most recently completed publish."""
+        return _SEQ.unpack_from(self.shm.buf, _SEQ_OFFSET)[0] // 2
+
+    def read(self, timeout=1.0):
+        """Return (VERSION, PAYLOAD_BYTES) for a consistent snapshot."""
+        buf = self.shm.buf
+        deadline = None
+        while True:
+            seq = _SEQ.unpack_from(buf, _SEQ_OFFSET)[0]
+            if not seq & 1:
+                length = _HEADER.unpack_from(buf, 0)[3]
+                payload = bytes(buf[_HEADER.size:_HEADER.size + length])
+                if _SEQ.unpack_from(buf, _SEQ_OFFSET)[0] == seq:
+                    return seq // 2, payload
+            if deadline is None:
+                deadline = time.monotonic() + timeout
+            elif time.monotonic() > deadline:
+                raise TimeoutError("Replica '{}' did not settle".format(self.shm.name))
+            time.sleep(0)
+
+    def load(self, timeout=1.0):
+        """Return (VERSION, DATA), the decoded payload."""
+        version, payload = self.read(timeout)
+        return version, (self.loads(payload) if payload else None)
+
+    def close(self):
+        self.shm.close()
@@ -0,0 +1,355 @@
+# -*- coding: utf-8 -*-
+"""
+Storage backends for the ObjectStore plugin.
+"""
+# SPDX-License-Identifier: LGPL-3.0
+__all__ = """
+DictStorage
+SqliteStorage
+Snapshot
+""".split()
+
+import collections
+import collections.abc
+import copy
+import itertools
+import json
+import sqlite3
+import threading
+
+from amethyst.core import Object, register_amethyst_type
+
+from amethyst_games.filters import FilterIndex
+
+
+class DictStorage(object):
+    """
+    Default ObjectStore storage, plain in-memory dictionaries.
+
+    A storage backend is a factory of mutable mappings. The ObjectStore
+    opens one mapping for its shared store ("{NAMESPACE}/shared") and one
+    for each player store ("{NAMESPACE}/player-{N}"), see the ObjectStore
+    `namespace` parameter. Backends may also provide:
+
+    * `sync()`: called at the end of every action (after all changes for
+      the action have been made), typically to commit a transaction.
+
+    Mappings may also provide:
+
+    * `lookup(filt)`: return a set of candidate ids which may be accepted
+      by the filter, or `None` if the filter can not be answered without
+      a scan (see `FilterIndex.lookup`).
+
+    * `on_load`: attribute which, if set to a callable, is called as
+      `on_load(id, obj)` whenever an object is loaded into memory.
+
+    * `cached_items()`: iterate `(id, obj)` for objects currently in memory.
+
+    * `scan()`: iterate `(id, obj)` for every object without keeping them
+      in memory (used to build ObjectStore indexes).
+    """
+    def open(self, name):
+        return dict()
+
+    def sync(self):
+        pass
+
+
+class _Codec(Object):
+    # amethyst Object only used for its JSON hooks
+    amethyst_register_type = False
+
+_codec = _Codec()
+
+def _dumps(obj):
+    return json.dumps(obj, default=_codec.JSONEncoder)
+
+def _loads(data):
+    return json.loads(data, object_hook=_codec.JSONObjectHook)
+
+
+class SqliteStorage(DictStorage):
+    """
+    ObjectStore storage in an sqlite database fronted by a bounded LRU
+    cache of decoded objects. Intended for large, mostly-cold object
+    catalogs which should not be kept in memory for the lifetime of the
+    game.
+
+        store = ObjectStore(storage=SqliteStorage("world.sqlite"))
+
+    Objects are serialized with the amethyst JSON encoder (override via
+    the `dumps` and `loads` parameters) and written through to the
+    database immediately. The transaction is committed by `sync()` which
+    the ObjectStore calls at the end of every action.
+
+    Object name, type, and flags are stored in indexed columns so that
+    `stor_list_shared()` / `stor_list_player()` with `Filter` objects on
+    those attributes do not need to decode the whole store.
+
+    Objects are shared by reference only while they are in the cache. An
+    object modified after it has been evicted from the cache must be
+    stored again (or tracked, see `ObjectStore.track_changes`) for the
+    change to be saved.
+
+    Several games may share a database, each ObjectStore keeps its
+    objects under its own namespace.
+    """
+    def __init__(self, path=":memory:", cache_size=1024, dumps=_dumps, loads=_loads):
+        self.path = path
+        self.cache_size = cache_size
+        self.dumps = dumps
+        self.loads = loads
+        self._cache = collections.OrderedDict()    # (NAME, ID) => OBJ
+        self._lock = threading.RLock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS objects (
+                store TEXT NOT NULL,
+                id    TEXT NOT NULL,
+                name  TEXT,
+                type  TEXT,
+                data  TEXT NOT NULL,
+                PRIMARY KEY (store, id)
+            );
+            CREATE INDEX IF NOT EXISTS objects_name ON objects (store, name);
+            CREATE INDEX IF NOT EXISTS objects_type ON objects (store, type);
+            CREATE TABLE IF NOT EXISTS flags (
+                store TEXT NOT NULL,
+                id    TEXT NOT NULL,
+                flag  TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS flags_flag ON flags (store, flag);
+            CREATE INDEX IF NOT EXISTS flags_id ON flags (store, id);
+        """)
+
+    def open(self, name):
+        return SqliteMapping(self, name)
+
+    def sync(self):
+        with self._lock:
+            self.db.commit()
+
+    def close(self):
+        with self._lock:
+            self.db.commit()
+            self.db.close()
+            self._cache.clear()
+
+    def _cache_get(self, key):
+        obj = self._cache.get(key)
+        if obj is not None:
+            self._cache.move_to_end(key)
+        return obj
+
+    def _cache_put(self, key, obj):
+        self._cache[key] = obj
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+
+class _SqlFilterIndex(FilterIndex):
+    def __init__(self, mapping):
+        super().__init__()
+        self.mapping = mapping
+
+    def _keys(self, field, value):
+        return self.mapping._select(field, value)
+
+
+class SqliteMapping(collections.abc.MutableMapping):
+    """One ObjectStore location (shared or player store) in a `SqliteStorage`."""
+    def __init__(self, storage, name):
+        self.storage = storage
+        self.name = name
+        self.on_load = None
+        self._index = _SqlFilterIndex(self)
+
+    def __getitem__(self, id):
+        storage = self.storage
+        with storage._lock:
+            obj = storage._cache_get((self.name, id))
+            if obj is not None:
+                return obj
+            row = storage.db.execute("SELECT data FROM objects WHERE store = ? AND id = ?", (self.name, id)).fetchone()
+            if row is None:
+                raise KeyError(id)
+            obj = storage.loads(row[0])
+            storage._cache_put((self.name, id), obj)
+        if self.on_load is not None:
+            self.on_load(id, obj)
+        return obj
+
+    def __setitem__(self, id, obj):
+        storage = self.storage
+        name, type, flags = self._terms(obj)
+        data = storage.dumps(obj)
+        with storage._lock:
+            storage.db.execute(
+                "INSERT OR REPLACE INTO objects (store, id, name, type, data) VALUES (?, ?, ?, ?, ?)",
+                (self.name, id, name, type, data)
+            )
+            storage.db.execute("DELETE FROM flags WHERE store = ? AND id = ?", (self.name, id))
+            if flags:
+                storage.db.executemany(
+                    "INSERT INTO flags (store, id, flag) VALUES (?, ?, ?)",
+                    [ (self.name, id, f) for f in flags ]
+                )
+            storage._cache_put((self.name, id), obj)
+
+    def __delitem__(self, id):
+        storage = self.storage
+        with storage._lock:
+            cur = storage.db.execute("DELETE FROM objects WHERE store = ? AND id = ?", (self.name, id))
+            storage.db.execute("DELETE FROM flags WHERE store = ? AND id = ?", (self.name, id))
+            storage._cache.pop((self.name, id), None)
+            if not cur.rowcount:
+                raise KeyError(id)
+
+    def __contains__(self, id):
+        storage = self.storage
+        with storage._lock:
+            if (self.name, id) in storage._cache:
+                return True
+            return storage.db.execute("SELECT 1 FROM objects WHERE store = ? AND id = ?", (self.name, id)).fetchone() is not None
+
+    def __iter__(self):
+        with self.storage._lock:
+            ids = [ row[0] for row in self.storage.db.execute("SELECT id FROM objects WHERE store = ?", (self.name,)) ]
+        return iter(ids)
+
+    def __len__(self):
+        with self.storage._lock:
+            return self.storage.db.execute("SELECT COUNT(*) FROM objects WHERE store = ?", (self.name,)).fetchone()[0]
+
+    def clear(self):
+        storage = self.storage
+        with storage._lock:
+            storage.db.execute("DELETE FROM objects WHERE store = ?", (self.name,))
+            storage.db.execute("DELETE FROM flags WHERE store = ?", (self.name,))
+            for key in [ k for k in storage._cache if k[0] == self.name ]:
+                del storage._cache[key]
+
+    def cached_items(self):
+        with self.storage._lock:
+            return [ (k[1], obj) for k, obj in self.storage._cache.items() if k[0] == self.name ]
+
+    def scan(self, batch=256):
+        """Iterate (ID, OBJ) for every object, without filling the cache."""
+        storage = self.storage
+        last = None
+        while True:
+            with storage._lock:
+                if last is None:
+                    rows = storage.db.execute("SELECT id, data FROM objects WHERE store = ? ORDER BY id LIMIT ?", (self.name, batch)).fetchall()
+                else:
+                    rows = storage.db.execute("SELECT id, data FROM objects WHERE store = ? AND id > ? ORDER BY id LIMIT ?", (self.name, last, batch)).fetchall()
+                cached = [ storage._cache.get((self.name, id)) for id, data in rows ]
+            for (id, data), obj in zip(rows, cached):
+                yield id, (storage.loads(data) if obj is None else obj)
+            if len(rows) < batch:
+                return
+            last = rows[-1][0]
+
+    def lookup(self, filt):
+        return self._index.lookup(filt)
+
+    @staticmethod
+    def _terms(obj):
+        name = getattr(obj, "name", None)
+        type = getattr(obj, "type", None)
+        flags = getattr(obj, "flags", None)
+        return (
+            name if isinstance(name, str) else None,
+            type if isinstance(type, str) else None,
+            [ f for f in flags if isinstance(f, str) ] if isinstance(flags, (list, tuple, set, frozenset)) else (),
+        )
+
+    def _select(self, field, value):
+        if field == "flag":
+            sql = "SELECT id FROM flags WHERE store = ? AND flag = ?"
+        elif field in ("name", "type"):
+            sql = "SELECT id FROM objects WHERE store = ? AND {} = ?".format(field)
+        else:
+            sql = "SELECT id FROM objects WHERE store = ? AND id = ?"
+        with self.storage._lock:
+            return [ row[0] for row in self.storage.db.execute(sql, (self.name, value)) ]
+
+
+class Snapshot(collections.abc.Mapping):
+    """
+    Immutable mapping which shares unchanged entries with the snapshot it
+    was derived from.
+
+    Entries are spread over a fixed number of chunk dictionaries by key
+    hash. `evolve()` copies only the chunks holding changed keys, so
+    deriving a new snapshot costs time proportional to the number of
+    changes rather than the size of the mapping.
+
+    Snapshots encode to JSON as plain objects and copy (via
+    `copy.deepcopy`) to plain dictionaries. The values are shared with
+    other snapshots and must not be modified.
+    """
+    __slots__ = ('_chunks', '_len')
+    CHUNKS = 64
+    DELETE = object()
+
+    def __init__(self, items=()):
+        chunks = tuple(dict() for i in range(self.CHUNKS))
+        for key, value in (items.items() if isinstance(items, collections.abc.Mapping) else items):
+            chunks[hash(key) % self.CHUNKS][key] = value
+        self._chunks = chunks
+        self._len = sum(len(c) for c in chunks)
+
+    def evolve(self, changes):
+        """
+        Return a new snapshot with changes applied. `changes` is a dict
+        mapping keys to new values or to `Snapshot.DELETE`.
+        """
+        chunks = list(self._chunks)
+        length = self._len
+        copied = set()
+        for key, value in changes.items():
+            idx = hash(key) % self.CHUNKS
+            if idx not in copied:
+                chunks[idx] = dict(chunks[idx])
+                copied.add(idx)
+            chunk = chunks[idx]
+            if value is Snapshot.DELETE:
+                if key in chunk:
+                    del chunk[key]
+                    length -= 1
+            else:
+                if key not in chunk:
+                    length += 1
+                chunk[key] = value
+        snap = Snapshot.__new__(Snapshot)
+        snap._chunks = tuple(chunks)
+        snap._len = length
+        return snap
+
+    def __getitem__(self, key):
+        return self._chunks[hash(key) % self.CHUNKS][key]
+
+    def __contains__(self, key):
+        return key in self._chunks[hash(key) % self.CHUNKS]
+
+    def __iter__(self):
+        return itertools.chain.from_iterable(self._chunks)
+
+    def __len__(self):
+        return self._len
+
+    def __repr__(self):
+        return "Snapshot({!r})".format(dict(self))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return copy.deepcopy(dict(self), memo)
+
+    def __reduce__(self):
+        return (dict, (dict(self),))
+
+register_amethyst_type(Snapshot, dict, dict, wrap_encode=False)
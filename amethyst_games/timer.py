@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+
+"""
+# SPDX-License-Identifier: LGPL-3.0
+__all__ = 'TimerQueue'.split()
+
+import heapq
+import itertools
+import threading
+import time
+import weakref
+
+
+class TimerHandle(object):
+    """
+    Handle to a pending timer, returned by `TimerQueue.add()`. Call
+    `.cancel()` to prevent the timer from firing.
+    """
+    __slots__ = ('when', 'seq', 'engine', 'item', 'cancelled', '__weakref__')
+
+    def __init__(self, when, seq, engine, item):
+        self.when = when
+        self.seq = seq
+        self.engine = engine
+        self.item = item
+        self.cancelled = False
+
+    def __lt__(self, other):
+        return (self.when, self.seq) < (other.when, other.seq)
+
+    def cancel(self):
+        self.cancelled = True
+        self.item = None
+
+
+class TimerQueue(object):
+    """
+    Heap of engine timers serviced by a single daemon thread.
+
+    When a timer comes due, its item is put on the owning engine's run
+    queue so that the callback executes in the engine's thread, in order
+    with any other queued work. One TimerQueue is shared by all engines
+    by default (see `TimerQueue.default()`), so thousands of games cost a
+    single thread and heap rather than a thread per timer.
+
+    Engines are held by weak reference, timers for discarded engines are
+    silently dropped.
+
+    :ivar clock: Monotonic clock function, `time.monotonic` by default.
+    """
+    _default = None
+    _default_lock = threading.Lock()
+
+    @classmethod
+    def default(cls):
+        """Return the shared TimerQueue, creating it if necessary."""
+        if cls._default is None:
+            with cls._default_lock:
+                if cls._default is None:
+                    cls._default = cls()
+        return cls._default
+
+    def __init__(self, clock=time.monotonic, thread=True):
+        """
+        :param clock: Monotonic clock function.
+
+        :param thread: When False, no service thread is started and the
+            owner must call `run_due()` periodically (useful for tests
+            and for applications with their own event loop).
+        """
+        self.clock = clock
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._use_thread = thread
+        self._thread = None
+
+    def __len__(self):
+        return len(self._heap)
+
+    def add(self, when, engine, item):
+        """
+        Put item on the engine run queue at (monotonic) time `when`.
+        Returns a `TimerHandle`.
+        """
+        handle = TimerHandle(when, next(self._seq), weakref.ref(engine), item)
+        with self._cond:
+            heapq.heappush(self._heap, handle)
+            if self._heap[0] is handle:
+                self._cond.notify()
+            if self._use_thread and self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="amethyst-timers", daemon=True)
+                self._thread.start()
+        return handle
+
+    def next_due(self):
+        """Return the time of the earliest pending timer or `None`."""
+        with self._cond:
+            self._prune()
+            return self._heap[0].when if self._heap else None
+
+    def run_due(self, now=None):
+        """
+        Deliver all timers due at or before `now` (default: the current
+        clock time) to their engines. Returns the number delivered.
+        """
+        if now is None:
+            now = self.clock()
+        due = []
+        with self._cond:
+            self._prune()
+            while self._heap and self._heap[0].when <= now:
+                due.append(heapq.heappop(self._heap))
+                self._prune()
+        count = 0
+        for handle in due:
+            engine = handle.engine()
+            if engine is not None and not handle.cancelled:
+                engine._queue.put(handle.item)
+                count += 1
+        return count
+
+    def _prune(self):
+        while self._heap and self._heap[0].cancelled:
+            heapq.heappop(self._heap)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._prune()
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                delay = self._heap[0].when - self.clock()
+                if delay > 0:
+                    self._cond.wait(delay)
+                    continue
+            self.run_due()
@@ -0,0 +1,536 @@
+# -*- coding: utf-8 -*-
+"""
+Asyncio network transport between server engines and client engines.
+"""
+# SPDX-License-Identifier: LGPL-3.0
+__all__ = """
+GameServer
+GameClient
+ClientConnection
+Channel
+compression_dictionary
+""".split()
+
+import asyncio
+import itertools
+import json
+import struct
+import warnings
+import zlib
+
+from amethyst_games.notice import Notice, NoticeType
+
+# Frame: kind (1 byte), channel (u32), payload length (u32), payload
+# (network byte order). A channel observes one player of one game, its
+# id is chosen by the client when opening it:
+#   b"O" client open:     {"game": GAME_ID, "player": PLAYER_NUM, ...}
+#   b"I" server init:     [initialization_data, state]
+#   b"E" server event:    [seq, player_num, notice]
+#   b"T" client trigger:  [grant_id, kwargs]
+#   b"C" channel closed:  reason (either side)
+# Lower-case kinds (b"i", b"e") carry payloads from the deflate stream
+# of the channel (see compression_dictionary).
+_HEADER = struct.Struct("!cII")
+_OPEN, _INIT, _EVENT, _TRIGGER, _CLOSE = b"O", b"I", b"E", b"T", b"C"
+
+
+def _frame(kind, channel, payload):
+    """Return a frame of the given kind holding a str or bytes payload."""
+    if isinstance(payload, str):
+        payload = payload.encode("utf-8")
+    return _HEADER.pack(kind, channel, len(payload)) + payload
+
+def compression_dictionary(engine):
+    """
+    Return the preset deflate dictionary for connections to an engine,
+    built from the registered notice types and the action and attribute
+    names of the engine plugins. Server and client must have the same
+    plugins and notice types for their dictionaries to match (clients
+    send the adler32 checksum of theirs when opening a channel).
+    """
+    words = set(NoticeType.code_table()['types'])
+    for p in engine.plugins:
+        words.update(p._actions)
+        words.update(p._attrs)
+    words.update(Notice._attrs)
+    # deflate prefers matches near the end of the dictionary: put the
+    # structure of every event frame last.
+    tail = '{"%s": {"id": "", "type": "", "flags": [], "source": "", "data": {' % Notice._dundername
+    return ("".join('"{}": '.format(w) for w in sorted(words)) + tail).encode("utf-8")
+
+
+async def _read_frame(reader, max_size):
+    """Read one frame, returns (KIND, CHANNEL, PAYLOAD_BYTES) or (None, None, None) at EOF."""
+    try:
+        header = await reader.readexactly(_HEADER.size)
+    except asyncio.IncompleteReadError:
+        return None, None, None
+    kind, channel, length = _HEADER.unpack(header)
+    if length > max_size:
+        raise ValueError("Frame of {} bytes exceeds limit {}".format(length, max_size))
+    return kind, channel, await reader.readexactly(length)
+
+
+class _Connection(object):
+    """
+    Buffered frame writer. Frames queued with `send()` are written
+    together by a single task which waits for the socket to drain, the
+    connection is closed if more than `max_buffer` bytes are waiting.
+    """
+    def __init__(self, writer, max_buffer):
+        self.writer = writer
+        self.max_buffer = max_buffer
+        self.closed = False
+        self._frames = []
+        self._buffered = 0
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.ensure_future(self._flush())
+
+    def send_frame(self, kind, channel, payload, compressor=None):
+        """Queue a frame, compressed with the channel compressor if any."""
+        if compressor is None:
+            self.send(_frame(kind, channel, payload))
+        elif not self.closed:
+            data = compressor.compress(payload.encode("utf-8")) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            self.send(_frame(kind.lower(), channel, data))
+
+    def send(self, data):
+        if self.closed:
+            return
+        self._frames.append(data)
+        self._buffered += len(data)
+        if self._buffered > self.max_buffer:
+            self.close()
+        else:
+            self._wakeup.set()
+
+    async def _flush(self):
+        try:
+            while not self.closed:
+                await self._wakeup.wait()
+                self._wakeup.clear()
+                frames, self._frames = self._frames, []
+                if frames:
+                    self.writer.writelines(frames)
+                    await self.writer.drain()
+                    self._buffered -= sum(len(f) for f in frames)
+        except (ConnectionError, asyncio.CancelledError):
+            self.closed = True
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self._task.cancel()
+            self.writer.close()
+
+
+class _ServerChannel(object):
+    """An open channel of a server connection."""
+    __slots__ = ('engine', 'player_num', 'compressor', 'observer')
+
+    def __init__(self, engine, player_num):
+        self.engine = engine
+        self.player_num = player_num
+        self.compressor = None
+        self.observer = None
+
+
+class GameServer(object):
+    """
+    Serve engines to remote clients over TCP or Unix sockets.
+
+        server = GameServer(engine)
+        await server.start_tcp("0.0.0.0", 8123)
+
+    `games` is a single engine (game id None), a dict mapping game ids to
+    engines, or a callable returning the engine for a game id (or None).
+
+    Connections are multiplexed: a client opens any number of channels
+    over one connection, each observing one player in one game with its
+    own notice sequence (see `ClientConnection`). Opening a channel names
+    the game and the player (validated by the `authorize(request)`
+    callback, which returns the player number or raises to refuse the
+    channel). The server replies with the engine initialization data and
+    the state of that player, then sends every notice for the player as
+    it is produced (encoded once for all channels, see `Notice.encoded`).
+    Trigger requests on the channel are passed to `engine.trigger()`
+    (requires GrantManager). A request which fails (undecodable, or an
+    action which raises) closes its channel, other channels of the
+    connection stay open.
+
+    Engine run queues are processed on the event loop after each trigger
+    and every `interval` seconds (for timers): the engines of a dict, the
+    single engine, or the engines with open channels when looked up by a
+    callable. Connections which fall more than `max_buffer` bytes behind
+    are dropped, clients should reconnect to resynchronize.
+
+    Channels may ask for compression (see `ClientConnection.open`). Each
+    compressed channel has its own deflate stream at `compress_level` (0
+    to refuse compression), primed with the `compression_dictionary()`.
+    """
+    def __init__(self, games, authorize=None, interval=0.05, max_buffer=1 << 22, max_frame=1 << 20, compress_level=6):
+        if isinstance(games, dict):
+            self.lookup = games.get
+        elif hasattr(games, "plugins") or not callable(games):
+            self.lookup = { None: games }.get
+        else:
+            self.lookup = games
+        self.games = games
+        self.compress_level = compress_level
+        self.authorize = authorize or (lambda request: request.get("player"))
+        self.interval = interval
+        self.max_buffer = max_buffer
+        self.max_frame = max_frame
+        self.connections = set()
+        self._observed = dict()     # id(ENGINE) => [ ENGINE, open channels ]
+        self._handlers = set()
+        self._servers = []
+        self._pump = None
+
+    async def start_tcp(self, host=None, port=0, **kwargs):
+        """Listen on a TCP port, returns the `asyncio.Server`."""
+        return self._started(await asyncio.start_server(self._serve, host, port, **kwargs))
+
+    async def start_unix(self, path, **kwargs):
+        """Listen on a Unix socket, returns the `asyncio.Server`."""
+        return self._started(await asyncio.start_unix_server(self._serve, path, **kwargs))
+
+    def _started(self, server):
+        self._servers.append(server)
+        if self._pump is None:
+            self._pump = asyncio.ensure_future(self._run())
+        return server
+
+    async def close(self):
+        """Stop listening and close all connections."""
+        if self._pump is not None:
+            self._pump.cancel()
+            self._pump = None
+        for server in self._servers:
+            server.close()
+        for conn in tuple(self.connections):
+            conn.close()
+        for task in tuple(self._handlers):
+            task.cancel()
+        if self._handlers:
+            await asyncio.wait(tuple(self._handlers))
+        for server in self._servers:
+            await server.wait_closed()
+        self._servers = []
+
+    def engines(self):
+        """Return the engines whose run queues the server processes."""
+        if isinstance(self.games, dict):
+            return list(self.games.values())
+        if self.lookup is not self.games:
+            return [ self.games ]
+        return [ engine for engine, count in self._observed.values() ]
+
+    async def _run(self):
+        while True:
+            for engine in self.engines():
+                try:
+                    engine.process_queue()
+                except Exception as err:
+                    warnings.warn(f"Error processing engine run queue: {err!r}")
+            await asyncio.sleep(self.interval)
+
+    def _open(self, conn, channel, request):
+        engine = self.lookup(request.get("game"))
+        if engine is None:
+            raise KeyError("No such game")
+        chan = _ServerChannel(engine, self.authorize(request))
+        if request.get("compress") and self.compress_level:
+            zdict = compression_dictionary(engine)
+            if request.get("zdict") == zlib.adler32(zdict):
+                chan.compressor = zlib.compressobj(self.compress_level, zdict=zdict)
+
+        def observer(game, seq, player_num, notice):
+            conn.send_frame(_EVENT, channel, game.encode_event(seq, player_num, notice), chan.compressor)
+            if conn.closed:
+                game.unobserve(player_num, observer)
+        chan.observer = observer
+
+        engine.process_queue()
+        conn.send_frame(_INIT, channel, engine.dumps([ engine.initialization_data, engine.get_state(chan.player_num) ]), chan.compressor)
+        engine.observe(chan.player_num, observer)
+        self._observed.setdefault(id(engine), [ engine, 0 ])[1] += 1
+        return chan
+
+    def _close(self, chan):
+        chan.engine.unobserve(chan.player_num, chan.observer)
+        entry = self._observed[id(chan.engine)]
+        entry[1] -= 1
+        if not entry[1]:
+            del self._observed[id(chan.engine)]
+
+    async def _serve(self, reader, writer):
+        conn = _Connection(writer, self.max_buffer)
+        channels = dict()
+        task = asyncio.current_task()
+        self._handlers.add(task)
+        self.connections.add(conn)
+        try:
+            while not conn.closed:
+                kind, channel, payload = await _read_frame(reader, self.max_frame)
+                if kind is None:
+                    break
+                chan = channels.get(channel)
+                if kind == _TRIGGER and chan is not None:
+                    engine = chan.engine
+                    try:
+                        grant_id, kwargs = engine.loads(payload)
+                        engine.trigger(chan.player_num, grant_id, kwargs)
+                        engine.process_queue()
+                    except Exception as err:
+                        # Only the channel of the failed request is closed
+                        self._close(channels.pop(channel))
+                        conn.send_frame(_CLOSE, channel, str(err) or type(err).__name__)
+                elif kind == _OPEN and chan is None:
+                    try:
+                        channels[channel] = self._open(conn, channel, json.loads(payload))
+                    except Exception as err:
+                        conn.send_frame(_CLOSE, channel, str(err) or type(err).__name__)
+                elif kind == _CLOSE and chan is not None:
+                    self._close(channels.pop(channel))
+        except (ConnectionError, ValueError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            self._handlers.discard(task)
+            for chan in channels.values():
+                self._close(chan)
+            self.connections.discard(conn)
+            conn.close()
+
+
+class Channel(object):
+    """
+    One player of one game observed over a `ClientConnection`, see
+    `ClientConnection.open()`.
+
+    Received notices are dispatched to the engine (and its run queue
+    processed) as they arrive, then passed to the `on_notice(engine,
+    seq, player_num, notice)` callbacks. The `on_frame(kind, payload)`
+    callbacks receive every (decompressed) frame payload. If handling a
+    frame raises (bad payload, out of sequence notice, failing callback),
+    a warning is issued and only that channel is closed. Channels
+    without an engine decode nothing, e.g., for gateways which forward
+    frames to their own clients.
+
+    :ivar ready: Event set once the engine has been initialized (or the
+    channel closed).
+
+    :ivar compressed: Whether the server compresses the channel.
+
+    :ivar received: Bytes received on the channel.
+
+    :ivar closed: Reason the channel was closed, None while open.
+    """
+    def __init__(self, connection, id, engine, player, game, on_notice=None):
+        self.connection = connection
+        self.id = id
+        self.engine = engine
+        self.player = player
+        self.game = game
+        self.on_notice = [] if on_notice is None else on_notice
+        self.on_frame = []
+        self.ready = asyncio.Event()
+        self.compressed = False
+        self.received = 0
+        self.closed = None
+        self._decompressor = None
+
+    def _receive(self, kind, payload):
+        self.received += len(payload) + _HEADER.size
+        if kind.islower() and self._decompressor is not None:
+            payload = self._decompressor.decompress(payload)
+            kind = kind.upper()
+            self.compressed = True
+        for cb in self.on_frame:
+            cb(kind, payload)
+        engine = self.engine
+        if kind == _EVENT and engine is not None:
+            seq, player_num, notice = engine.loads(payload)
+            engine.dispatch(engine, seq, player_num, notice)
+            engine.process_queue()
+            for cb in self.on_notice:
+                cb(engine, seq, player_num, notice)
+        elif kind == _INIT:
+            if engine is not None:
+                init, state = engine.loads(payload)
+                engine._client_seq = 0
+                engine.initialize(init)
+                engine.set_state(state)
+            self.ready.set()
+        elif kind == _CLOSE:
+            self._closed(payload.decode("utf-8", "replace") or "closed")
+
+    def _closed(self, reason):
+        if self.closed is None:
+            self.closed = reason
+            self.connection.channels.pop(self.id, None)
+            self.ready.set()
+
+    def trigger(self, id, kwargs=None):
+        """Ask the server to trigger a grant."""
+        dumps = json.dumps if self.engine is None else self.engine.dumps
+        self.connection._conn.send_frame(_TRIGGER, self.id, dumps([ id, kwargs or {} ]))
+
+    def close(self):
+        """Stop observing the game, the connection remains open."""
+        if self.closed is None:
+            self.connection._conn.send_frame(_CLOSE, self.id, "")
+            self._closed("closed")
+
+
+class ClientConnection(object):
+    """
+    Connection to a `GameServer` carrying any number of games and players,
+    each over its own `Channel`:
+
+        conn = await ClientConnection().connect_tcp("game.example.com", 8123)
+        table1 = await conn.open(MyEngine(client=True), player=0, game="table-1")
+        table2 = await conn.open(MyEngine(client=True), player=1, game="table-2")
+        table1.trigger(grant.id, dict(x=1, y=2))
+
+    Every channel has its own notice sequence, so a single connection can
+    serve many logical observers (e.g., a gateway relaying many players
+    to the server).
+    """
+    def __init__(self, max_buffer=1 << 22, max_frame=1 << 24):
+        self.max_buffer = max_buffer
+        self.max_frame = max_frame
+        self.channels = dict()
+        self._ids = itertools.count(1)
+        self._conn = None
+        self._task = None
+
+    async def connect_tcp(self, host, port, **kwargs):
+        """Connect to a server TCP port."""
+        return self._connected(*await asyncio.open_connection(host, port, **kwargs))
+
+    async def connect_unix(self, path, **kwargs):
+        """Connect to a server Unix socket."""
+        return self._connected(*await asyncio.open_unix_connection(path, **kwargs))
+
+    def _connected(self, reader, writer):
+        self._conn = _Connection(writer, self.max_buffer)
+        self._task = asyncio.ensure_future(self._receive(reader))
+        return self
+
+    async def open(self, engine, player=None, game=None, request=None, compress=False, on_notice=None):
+        """
+        Open a channel observing `player` in `game` and wait until the
+        engine has been initialized. `request` holds additional data for
+        the server `authorize` callback. With `compress` set, the server
+        is asked to compress the frames of the channel (client and server
+        must have the same plugins). `on_notice` is the list of notice
+        callbacks of the channel, pass it to see the notices which arrive
+        along with the initial state.
+
+        :raises ConnectionError: If the server refused the channel or the
+        connection closed.
+        """
+        chan = Channel(self, next(self._ids), engine, player, game, on_notice)
+        request = dict(request or {}, game=game, player=player)
+        if compress and engine is not None:
+            zdict = compression_dictionary(engine)
+            request.update(compress=True, zdict=zlib.adler32(zdict))
+            chan._decompressor = zlib.decompressobj(zdict=zdict)
+        self.channels[chan.id] = chan
+        self._conn.send_frame(_OPEN, chan.id, json.dumps(request))
+        ready = asyncio.ensure_future(chan.ready.wait())
+        await asyncio.wait([ ready, self._task ], return_when=asyncio.FIRST_COMPLETED)
+        if not chan.ready.is_set() or chan.closed is not None:
+            ready.cancel()
+            self.channels.pop(chan.id, None)
+            raise ConnectionError("Channel refused: {}".format(chan.closed or "connection closed"))
+        return chan
+
+    async def _receive(self, reader):
+        try:
+            while True:
+                kind, channel, payload = await _read_frame(reader, self.max_frame)
+                if kind is None:
+                    break
+                chan = self.channels.get(channel)
+                if chan is not None:
+                    try:
+                        chan._receive(kind, payload)
+                    except Exception as err:
+                        # Only the channel which failed is closed
+                        reason = str(err) or type(err).__name__
+                        warnings.warn(f"Error processing channel {channel} frame: {err!r}")
+                        if chan.closed is None:
+                            self._conn.send_frame(_CLOSE, channel, reason)
+                            chan._closed(reason)
+        finally:
+            self._conn.close()
+            for chan in tuple(self.channels.values()):
+                chan._closed("connection closed")
+
+    async def close(self):
+        if self._conn is not None:
+            self._conn.close()
+        if self._task is not None:
+            try:
+                await self._task
+            except Exception:
+                pass
+
+
+class GameClient(object):
+    """
+    Keep a client engine in sync with a remote `GameServer`, over a
+    connection of its own (see `ClientConnection` to share a connection
+    among several games or players).
+
+        client = GameClient(MyEngine(client=True), player=1)
+        await client.connect_tcp("game.example.com", 8123)
+        client.trigger(grant.id, dict(x=1, y=2))
+
+    `on_notice`, `ready`, `compressed`, and `received` are as for
+    `Channel`.
+    """
+    def __init__(self, engine, player=None, hello=None, max_buffer=1 << 22, max_frame=1 << 24, compress=False, game=None):
+        self.engine = engine
+        self.player = player
+        self.game = game
+        self.hello = hello
+        self.compress = compress
+        self.on_notice = []
+        self.connection = ClientConnection(max_buffer=max_buffer, max_frame=max_frame)
+        self.channel = None
+
+    async def connect_tcp(self, host, port, **kwargs):
+        """Connect to a server TCP port and wait until initialized."""
+        await self.connection.connect_tcp(host, port, **kwargs)
+        return await self._open()
+
+    async def connect_unix(self, path, **kwargs):
+        """Connect to a server Unix socket and wait until initialized."""
+        await self.connection.connect_unix(path, **kwargs)
+        return await self._open()
+
+    async def _open(self):
+        self.channel = await self.connection.open(self.engine, self.player, self.game, self.hello, self.compress, self.on_notice)
+        return self
+
+    @property
+    def ready(self):
+        return self.channel.ready
+
+    @property
+    def compressed(self):
+        return self.channel.compressed
+
+    @property
+    def received(self):
+        return self.channel.received
+
+    def trigger(self, id, kwargs=None):
+        """Ask the server to trigger a grant."""
+        self.channel.trigger(id, kwargs)
+
+    async def close(self):
+        await self.connection.close()
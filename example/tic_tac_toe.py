@@ -9,7 +9,7 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
 from amethyst.core  import Object, Attr
 from amethyst_games import Engine, EnginePlugin, action, Filter
-from amethyst_games.plugins import GrantManager, Turns, Grant
+from amethyst_games.plugins import GrantManager, Turns, Grant, Grid
 from amethyst_games.util import random
 
 # Argument parsing
@@ -29,7 +29,6 @@ def getopts():
 # implements the core state. Additional methods can be placed here or in plugins.
 
 class TTT_Engine(Engine):
-    board   = Attr()
     width   = Attr(default=3)
     height  = Attr(default=3)
 
@@ -39,14 +38,14 @@ class TTT_Engine(Engine):
         """
         super(TTT_Engine,self).__init__(*args, **kwargs)
 
-        # Empty NxM board
-        if self.board is None:
-            self.board = [ [None] * self.width for i in range(self.height) ]
-
         # Most turn-based games will want the GrantManager and Turns plugin
         self.register_plugin(GrantManager())
         self.register_plugin(Turns())
 
+        # Empty NxM board. The Grid plugin tracks free cells and keeps
+        # client boards in sync.
+        self.register_plugin(Grid(width=self.width, height=self.height, shape="square8"))
+
         # All games need some plugins to implemnt behavior. Some games will
         # always consist of the same plugins, some may load different sets
         # of plugins depending on what game expansions are being played.
@@ -58,14 +57,9 @@ class TTT_Engine(Engine):
 
     def spaces_available(self):
         """
-        Utility function that computes a list of available places.
+        Utility function that returns a list of available places.
         """
-        avail = []
-        for j, row in enumerate(self.board):
-            for i, val in enumerate(row):
-                if val is None:
-                    avail.append( (i,j) )
-        return avail
+        return self.grid_free()
 
 
 # Tic-Tac-Toe "Plugin"
@@ -106,7 +100,7 @@ class TicTacToe(EnginePlugin):
         game.grant(game.turn_player_num(), Grant(name="place"))
 
     def is_valid_placement(self, game, x, y):
-        return game.board[y][x] is None
+        return game.grid_is_free((x, y))
 
     @action
     def begin(self, game, stash):
@@ -120,7 +114,7 @@ class TicTacToe(EnginePlugin):
         """
         Place action: Mark square with player number and grant end of turn action.
         """
-        game.board[y][x] = game.turn_player_num()
+        game.grid_place((x, y), game.turn_player_num())
         game.grant(game.turn_player_num(), Grant(name="end_turn"))
 
     @place.check
@@ -161,8 +155,9 @@ class TTTInterface(Object):
         """
         Print the current board state to screen.
         """
-        for row in self.engine.board:
-            print( "".join( "_" if x is None else str(x) for x in row ) )
+        game = self.engine
+        for y in range(game.height):
+            print( "".join( "_" if x is None else str(x) for x in (game.grid_at((i, y)) for i in range(game.width)) ) )
 
     def on_event(self, game, seq, player, notice):
         """
@@ -286,8 +281,9 @@ def MAIN1(argv):
 def dispatcher(engine, func):
     # In a real network app, the event will be serialized by the server,
     # transmitted, then deserialized on the client. That is what we do here.
-    def caller(game, *args):
-        a = engine.loads(game.dumps(args))
+    # The notice is encoded once and shared by every observer.
+    def caller(game, seq, player_num, notice):
+        a = engine.loads(game.encode_event(seq, player_num, notice))
         func(engine, *a)
     return caller
 
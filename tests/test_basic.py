@@ -4,7 +4,9 @@
 
 import unittest
 
-from amethyst_games import Engine, NoticeType
+from amethyst.core import Attr
+
+from amethyst_games import Engine, EnginePlugin, Notice, NoticeType, GAME_MASTER, NOBODY
 from amethyst_games.util import AmethystGameException
 
 class MyTest(unittest.TestCase):
@@ -19,6 +21,85 @@ class MyTest(unittest.TestCase):
         with self.assertRaisesRegex(AmethystGameException, r'already registered'):
             NoticeType.register(GRANT="FOO")
 
+    def test_notice_codes(self):
+        server, client = Engine(), Engine()
+        table = server.set_notice_codes()
+        self.assertEqual(table, NoticeType.code_table())
+        self.assertIn(NoticeType.CALL, table["types"])
+
+        # Clients adopt the table at initialization
+        client.initialize(server.loads(server.dumps(server.initialization_data)))
+        self.assertEqual(client._notice_types, table["types"])
+
+        notice = Notice(type=NoticeType.CALL, data=dict(name="foo"))
+        wire = server.dumps(notice)
+        self.assertNotIn(NoticeType.CALL, wire)
+        decoded = client.loads(wire)
+        self.assertEqual(decoded.type, NoticeType.CALL)
+        self.assertEqual(decoded.data, dict(name="foo"))
+        self.assertEqual(notice.type, NoticeType.CALL)
+
+        # Without codes, a string type passes through
+        self.assertEqual(client.loads(Engine().dumps(notice)).type, NoticeType.CALL)
+
+        with self.assertRaisesRegex(AmethystGameException, r'version mismatch'):
+            client.set_notice_codes(dict(version=table["version"], types=table["types"][1:]))
+        with self.assertRaisesRegex(AmethystGameException, r'Unknown notice code'):
+            client.loads('{"%s": {"type": 9999}}' % Notice._dundername)
+
+    def test_encode_once(self):
+        game = Engine()
+        calls = []
+        def dumps(obj):
+            calls.append(obj)
+            return game.dumps(obj)
+
+        received = []
+        for p in range(3):
+            game.observe(p, lambda g, seq, p, notice: received.append(notice.encoded(dumps)))
+        game.notify_immediate(None, Notice(type=NoticeType.CALL, data=dict(name="foo")))
+        self.assertEqual(len(received), 3)
+        self.assertEqual(len(set(received)), 1)
+        self.assertEqual(len(calls), 1)
+
+        notice = game.loads(game.encode_event(5, 2, Notice(type=NoticeType.CALL)))
+        self.assertEqual(notice[:2], [5, 2])
+        self.assertIsInstance(notice[2], Notice)
+
+    def test_state_visibility(self):
+        class Secrets(EnginePlugin):
+            AMETHYST_PLUGIN_COMPAT = 1
+            AMETHYST_STATE_VISIBILITY = dict(
+                hands="owner", deck="master", cache="derived",
+                score=lambda plugin, player, value: value if player is GAME_MASTER else len(value),
+            )
+            board = Attr(list, default=list)
+            hands = Attr(dict, default=dict)
+            deck  = Attr(list, default=list)
+            cache = Attr(dict, default=dict)
+            score = Attr(list, default=list)
+
+        game = Engine()
+        plugin = Secrets(board=[1, 2], hands={ 0: ["a"], 1: ["b"] }, deck=["c"], cache=dict(x=1), score=[3, 4])
+        game.register_plugin(plugin)
+
+        states = game.get_states([ 0, 1, NOBODY, GAME_MASTER ])
+        p0, p1, nobody, master = [ states[p]['plugin_state'][0] for p in (0, 1, NOBODY, GAME_MASTER) ]
+        self.assertEqual(p0['hands'], { 0: ["a"] })
+        self.assertEqual(p1['hands'], { 1: ["b"] })
+        self.assertEqual(nobody['hands'], {})
+        self.assertEqual(master['hands'], { 0: ["a"], 1: ["b"] })
+        self.assertNotIn('deck', p0)
+        self.assertEqual(master['deck'], ["c"])
+        self.assertNotIn('cache', master)
+        self.assertEqual(p0['score'], 2)
+        self.assertEqual(master['score'], [3, 4])
+
+        # Public parts are copied once and shared
+        self.assertIs(p0['board'], p1['board'])
+        self.assertIsNot(p0['board'], plugin.board)
+        self.assertEqual(game.get_state(1)['plugin_state'][0], p1)
+
 
 if __name__ == '__main__':
     unittest.main()
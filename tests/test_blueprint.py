@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: LGPL-3.0
+
+import unittest
+
+from amethyst.core import Attr
+
+from amethyst_games import Engine, EngineBlueprint, EnginePlugin, EnginePool, action
+from amethyst_games.plugins import Clock, GrantManager, Grant, Grid, ObjectStore, Turns
+from amethyst_games.timer import TimerQueue
+from amethyst_games.util import PluginCompatibilityException
+
+
+class Board(Engine):
+    size = Attr(int, default=3)
+
+
+class Game(EnginePlugin):
+    AMETHYST_PLUGIN_COMPAT = 1
+    AMETHYST_ENGINE_DEPENDS = "Grid".split()
+    AMETHYST_ENGINE_METHODS = "_take".split()
+
+    def _take(self, game, cell, player_num):
+        """Place a marker."""
+        return game.grid_place(cell, player_num)
+
+    @action
+    def begin(self, game, stash):
+        game.turn_start()
+
+
+class MyTest(unittest.TestCase):
+
+    def test_blueprint(self):
+        blueprint = EngineBlueprint(Board, [
+            GrantManager,
+            Turns,
+            (Grid, lambda game: dict(width=game.size, height=game.size)),
+            (Game, dict(), "TheGame"),
+        ])
+        cls = blueprint.engine_class
+        self.assertTrue(issubclass(cls, Board))
+        self.assertEqual(cls.take.__doc__, "Place a marker.")
+        self.assertIn("grid_place", vars(cls))
+
+        game1 = blueprint.new(dict(size=4))
+        game2 = blueprint.new()
+        self.assertTrue(game1.has_plugin("TheGame"))
+        self.assertEqual(game1.grid_count_free(), 16)
+        self.assertEqual(game2.grid_count_free(), 9)
+
+        # Methods act on the plugins of their own game
+        self.assertTrue(game1.take((0, 0), 1))
+        self.assertEqual(game1.grid_at((0, 0)), 1)
+        self.assertIsNone(game2.grid_at((0, 0)))
+        self.assertIsNot(game1.plugins[0], game2.plugins[0])
+
+        # Actions and listeners are registered
+        game1.players.extend([0, 1])
+        game1.initialize()
+        game1.call_immediate("begin")
+        self.assertEqual(game1.turn_player_num(), 0)
+
+    def test_validation(self):
+        with self.assertRaisesRegex(PluginCompatibilityException, r"requires plugin Grid"):
+            EngineBlueprint(Engine, [ Game ])
+        with self.assertRaisesRegex(PluginCompatibilityException, r"already has a method 'grid_at'"):
+            EngineBlueprint(Engine, [ Grid, Grid ])
+
+        # Registering more plugins later is still checked
+        game = EngineBlueprint(Engine, [ Grid ]).new()
+        with self.assertRaisesRegex(PluginCompatibilityException, r"already has a method"):
+            game.register_plugin(Grid())
+
+    def blueprint(self):
+        return EngineBlueprint(Board, [
+            GrantManager,
+            Turns,
+            (Grid, lambda game: dict(width=game.size, height=game.size)),
+            Game,
+        ])
+
+    def test_reset(self):
+        timers = TimerQueue(clock=lambda: 0, thread=False)
+        game = self.blueprint().new(dict(size=4, players=[0, 1]), timers=timers)
+        game.initialize()
+        game.observe(0, lambda *args: None)
+        game.call_immediate("begin")
+        game.take((1, 1), 0)
+        game.grant(0, Grant(name="begin"))
+        game.call_later(5, lambda game: self.fail("timer survived reset"))
+        grid_id = game.plugins[2].id
+
+        game.reset(dict(size=2))
+        self.assertEqual(game.size, 2)
+        self.assertEqual(game.players, [])
+        self.assertEqual(game.journal, [])
+        self.assertEqual(game.notified, {})
+        self.assertEqual(game.grid_count_free(), 4)
+        self.assertEqual(game.turn_player_num(), -1)
+        self.assertEqual(len(game.list_grants(0)), 0)
+        self.assertNotEqual(game.plugins[2].id, grid_id)
+        self.assertEqual(timers.run_due(10), 0)
+
+        # Plays again like a new game
+        game.players.extend([0, 1])
+        game.initialize()
+        game.call_immediate("begin")
+        self.assertEqual(game.turn_player_num(), 0)
+        self.assertTrue(game.take((0, 0), 0))
+
+    def test_reset_configured(self):
+        indexes = dict(cost="sorted")
+        game = Engine()
+        game.register_plugin(Grid(dict(shape="square8"), width=5, height=5))
+        game.register_plugin(Clock(initial=60.0))
+        game.register_plugin(ObjectStore(indexes=indexes))
+        game.grid_place((4, 4), 1)
+        game.plugins[1].initial = 1.0
+        game.plugins[2].indexes = dict(owner="hash")
+
+        # Plugins are reset with their constructor arguments
+        game.reset()
+        grid, clock, store = game.plugins
+        self.assertEqual((grid.shape, grid.width, grid.height), ("square8", 5, 5))
+        self.assertIsNone(game.grid_at((4, 4)))
+        self.assertEqual(clock.initial, 60.0)
+        self.assertEqual(store.indexes, dict(cost="sorted"))
+        self.assertIsNot(store.indexes, indexes)
+
+    def test_pool(self):
+        blueprint = self.blueprint()
+        pool = EnginePool(blueprint, size=1)
+        game1 = pool.acquire(dict(size=4))
+        game2 = pool.acquire()
+        game1.take((0, 0), 1)
+        self.assertTrue(pool.release(game1))
+        self.assertFalse(pool.release(game2))
+        self.assertEqual(len(pool), 1)
+
+        game = pool.acquire(dict(size=5))
+        self.assertIs(game, game1)
+        self.assertEqual(game.grid_count_free(), 25)
+        self.assertEqual(len(pool), 0)
+        with self.assertRaises(Exception):
+            pool.release(Engine())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: LGPL-3.0
+import sys
+if sys.version_info < (3,6):
+    raise Exception("Python 3.6 required -- this is only " + sys.version)
+
+import unittest
+
+from os.path import dirname, abspath
+sys.path.insert(1, dirname(dirname(abspath(__file__))))
+
+import amethyst_games
+from amethyst_games import action, NoticeType, TimerQueue
+from amethyst_games.plugins import Clock, Turns
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class Referee(amethyst_games.EnginePlugin):
+    AMETHYST_PLUGIN_COMPAT = 1
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.timeouts = []
+
+    @action
+    def clock_timeout(self, game, stash, player_num):
+        self.timeouts.append(player_num)
+        game.turn_start()
+
+    @action
+    def end_turn(self, game, stash):
+        game.turn_start()
+
+
+class Engine(amethyst_games.Engine):
+    def __init__(self, *args, clock=None, **kwargs):
+        self.now = FakeClock()
+        super().__init__(*args, timers=TimerQueue(clock=self.now, thread=False), **kwargs)
+        self.register_plugin(Turns())
+        self.register_plugin(clock or Clock())
+        self.register_plugin(Referee())
+        self.players.extend([0, 1])
+
+    def advance(self, seconds):
+        self.now.now += seconds
+        self.timers.run_due()
+        self.process_queue()
+
+
+class ClockTest(unittest.TestCase):
+    def test_bank(self):
+        game = Engine(clock=Clock(initial=60, increment=5))
+        notices = []
+        game.observe(None, lambda game, seq, player, notice: notices.append(notice))
+        game.turn_start()
+        self.assertEqual(game.clock_remaining(0), 60)
+        game.advance(20)
+        self.assertEqual(game.clock_remaining(0), 40)
+        game.call_immediate("end_turn")
+        self.assertEqual(game.plugins[1].remaining, [ 45, 60 ])
+        self.assertEqual(game.plugins[1].running, 1)
+
+        game.advance(59)
+        self.assertEqual(game.plugins[2].timeouts, [])
+        game.advance(1)
+        self.assertEqual(game.plugins[2].timeouts, [ 1 ])
+        self.assertEqual(game.plugins[1].remaining, [ 45, 0 ])
+        self.assertEqual(game.turn_player_num(), 0)
+        self.assertEqual(game.plugins[1].running, 0)
+        clock = [ n.data for n in notices if n.type == NoticeType.CLOCK ]
+        self.assertEqual(clock[-1], dict(remaining=[ 45, 0 ], running=0))
+
+    def test_turn_limit_and_delay(self):
+        game = Engine(clock=Clock(turn_limit=10, delay=2))
+        game.turn_start()
+        game.advance(5)
+        self.assertEqual(game.clock_remaining(0), 7)
+        self.assertIsNone(game.clock_remaining(1))
+        game.advance(6.5)
+        self.assertEqual(game.plugins[2].timeouts, [])
+        game.advance(0.5)
+        self.assertEqual(game.plugins[2].timeouts, [ 0 ])
+
+        # Stopped clocks do not time out
+        game.clock_stop()
+        game.advance(100)
+        self.assertEqual(game.plugins[2].timeouts, [ 0 ])
+
+    def test_stale_timeout(self):
+        game = Engine(clock=Clock(turn_limit=10))
+        game.turn_start()
+        # Timeout reaches the run queue, but the player moves first
+        game.now.now += 10
+        game.timers.run_due()
+        game.call_immediate("end_turn")
+        game.call_immediate("end_turn")
+        self.assertEqual(game.turn_player_num(), 0)
+        game.process_queue()
+        self.assertEqual(game.plugins[2].timeouts, [])
+        self.assertEqual(game.clock_remaining(0), 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,13 +5,16 @@ import sys
 if sys.version_info < (3,6):
     raise Exception("Python 3.6 required -- this is only " + sys.version)
 
+import time
 import unittest
 
 from os.path import dirname, abspath
 sys.path.insert(1, dirname(dirname(abspath(__file__))))
 
-from amethyst_games import action
-from amethyst_games.plugins import GrantManager, Grant
+from amethyst_games import action, Filter, NoticeType
+from amethyst_games.plugins import GrantManager, Grant, Turns
+from amethyst_games.timer import TimerQueue
+from amethyst_games.util import GAME_MASTER, NOBODY
 import amethyst_games
 
 
@@ -53,6 +56,10 @@ class BaseGame(amethyst_games.EnginePlugin):
         else:
             game.Grant(name="test_pass_none")
 
+    @action
+    def noop(self, game, stash):
+        pass
+
     @action
     def test_masking(self, game, stash, test=None, param='something', msg=None):
         """
@@ -124,6 +131,203 @@ class MyTest(unittest.TestCase):
             game.trigger(0, grant.id, dict(test=self, param=None))
         self.assertNoGrants()
 
+    def test_expire_by_filter(self):
+        self.game = game = Engine()
+        game.players.append(1)
+        notices = []
+        game.observe(0, lambda game, seq, player, notice: notices.append(notice))
+
+        game.grant(0, Grant(name="place", flags=set(["turn:turn-1"])))
+        game.grant(0, Grant(name="place", flags=set(["turn:turn-2"])))
+        game.grant(1, Grant(name="end_turn", flags=set(["turn:turn-1"])))
+        keep = Grant(name="end_turn")
+        game.grant(0, keep)
+        game.process_queue()
+        del notices[:]
+
+        game.expire([ Filter(flag="turn:turn-1"), Filter(name="nothing") ])
+        game.process_queue()
+        self.assertEqual(len(game.list_grants(0)), 2)
+        self.assertEqual(len(game.list_grants(1)), 0)
+        self.assertIs(game.find_grant(0, keep.id), keep)
+        self.assertEqual([ n.type for n in notices ], [ NoticeType.EXPIRE ])
+
+        self.assertEqual(len(game.list_grants(0, Filter(name="place"))), 1)
+        game.expire(Filter(name="place") | Filter(id=keep.id))
+        self.assertEqual(game.list_grants(0), ())
+
+        # Nothing left to expire, no notice
+        game.process_queue()
+        del notices[:]
+        game.expire(Filter(name="place"))
+        game.process_queue()
+        self.assertEqual(notices, [])
+
+    def test_timed_expiry(self):
+        self.game = game = Engine(timers=TimerQueue(thread=False))
+        now = time.time()
+        soon = Grant(name="soon", dt_expires=now + 60)
+        later = Grant(name="later", dt_expires=now + 120)
+        past = Grant(name="past", dt_expires=now - 1)
+        game.grant(0, [ later, soon, past ])
+
+        # Timer for the past-due grant fires through the run queue
+        self.assertEqual(game.timers.run_due(), 1)
+        game.process_queue()
+        self.assertCountEqual(game.list_grants(0), [ soon, later ])
+
+        game.expire_due(now + 90)
+        self.assertEqual(game.list_grants(0), (later,))
+        self.assertIsNotNone(game.timers.next_due())
+        game.expire(later.id)
+        game.expire_due(now + 200)
+        self.assertEqual(game.list_grants(0), ())
+
+    def test_turn_expiry(self):
+        self.game = game = Engine()
+        game.register_plugin(Turns())
+        game.players.append(1)
+        game.turn_start()
+        this_turn = Grant(name="a", turn_expires=game.turn_number())
+        next_turn = Grant(name="b", turn_expires=game.turn_number() + 1)
+        this_round = Grant(name="c", round_expires=game.turn_round())
+        game.grant(0, [ this_turn, next_turn, this_round ])
+
+        game.turn_start()
+        self.assertCountEqual(game.list_grants(0), [ next_turn, this_round ])
+        game.turn_start()
+        self.assertEqual(game.list_grants(0), ())
+
+    def test_future_round_expiry(self):
+        self.game = game = Engine()
+        game.register_plugin(Turns(setup_rounds=1))
+        game.players.append(1)
+        game.turn_start()
+        self.assertEqual(game.turn_round(), "setup-0")
+        next_round = Grant(name="a", round_expires=0)
+        later_round = Grant(name="b", round_expires=1)
+        game.grant(0, [ next_round, later_round ])
+
+        # Future rounds are kept until they have passed
+        game.turn_start()
+        self.assertEqual(game.turn_round(), "setup-0")
+        self.assertCountEqual(game.list_grants(0), [ next_round, later_round ])
+        game.turn_start()
+        game.turn_start()
+        self.assertEqual(game.turn_round(), 0)
+        self.assertCountEqual(game.list_grants(0), [ next_round, later_round ])
+        game.turn_start()
+        game.turn_start()
+        self.assertEqual(game.turn_round(), 1)
+        self.assertEqual(game.list_grants(0), ( later_round, ))
+
+    def test_targeted_notices(self):
+        self.game = game = Engine()
+        game.players.append(1)
+        game.plugins[0].notify_counts = True
+        seen = dict()
+        for p in (0, 1, NOBODY, GAME_MASTER):
+            seen[p] = []
+            game.observe(p, lambda game, seq, player, notice: seen[player].append(notice.type))
+
+        grant = Grant(name="secret")
+        game.grant(0, grant)
+        game.expire(grant.id)
+        game.process_queue()
+        self.assertEqual(seen[0], [ NoticeType.GRANT, NoticeType.EXPIRE ])
+        self.assertEqual(seen[GAME_MASTER], [ NoticeType.GRANT, NoticeType.EXPIRE ])
+        self.assertEqual(seen[1], [ NoticeType.GRANT_COUNT, NoticeType.GRANT_COUNT ])
+        self.assertEqual(seen[NOBODY], [ NoticeType.GRANT_COUNT, NoticeType.GRANT_COUNT ])
+
+    def test_state_hides_grants(self):
+        self.game = game = Engine()
+        game.players.append(1)
+        game.grant(0, Grant(name="secret"))
+        game.grant(1, Grant(name="other"))
+        game.process_queue()
+        self.assertEqual(list(game.get_state(0)['plugin_state'][0]['grants']), [0])
+        self.assertEqual(list(game.get_state(1)['plugin_state'][0]['grants']), [1])
+        self.assertEqual(game.get_state(NOBODY)['plugin_state'][0]['grants'], {})
+        self.assertCountEqual(game.get_state(GAME_MASTER)['plugin_state'][0]['grants'], [0, 1])
+
+    def test_grant_many(self):
+        self.game = game = Engine()
+        game.players.extend([1, 2])
+        seen = dict()
+        for p in (0, 1, 2, GAME_MASTER):
+            seen[p] = []
+            game.observe(p, lambda game, seq, player, notice: seen[player].append(notice))
+
+        shared = Grant(name="pass")
+        game.grant_many(
+            [ ((0, 1, 2), shared) ]
+            + [ (p, [ Grant(name="pick", data=dict(card=i)) for i in range(10) ]) for p in (0, 1, 2) ]
+        )
+        game.process_queue()
+        for p in (0, 1, 2):
+            self.assertEqual(len(seen[p]), 1)
+            self.assertEqual(len(game.list_grants(p)), 11)
+            self.assertEqual(tuple(seen[p][0].data['player_nums']), (p,))
+        self.assertEqual(len(seen[GAME_MASTER]), 1)
+
+        self.assertCountEqual(game.locate_grant(shared.id), [ (0, shared), (1, shared), (2, shared) ])
+        self.assertEqual(game.locate_grant("nonesuch"), ())
+        game.expire(shared.id)
+        self.assertEqual(game.locate_grant(shared.id), ())
+        self.assertEqual(len(game.list_grants(2)), 10)
+
+    def test_dependencies(self):
+        self.game = game = Engine()
+        worker = Grant(name="noop")
+        farm = Grant(name="noop", consumes=worker.id)
+        forest = Grant(name="noop", consumes=worker.id, conflicts=farm.id)
+        harvest = Grant(name="noop", after=[farm.id, forest.id])
+        feed = Grant(name="noop", before=farm.id, requires="nonesuch")
+        game.grant(0, [ farm, forest, harvest, feed ])
+
+        # No worker yet, harvest waits on the others, feed lacks a requirement
+        self.assertEqual(game.list_grants(0), ())
+        self.assertEqual(len(game.list_grants(0, blocked=True)), 4)
+        self.assertFalse(game.trigger(0, farm.id, dict()))
+
+        game.grant(0, worker)
+        self.assertCountEqual(game.list_grants(0), [ worker, farm, forest ])
+        self.assertTrue(game.grant_available(farm.id))
+
+        # Farm consumes the worker and conflicts with the forest, feed must happen before farm
+        self.assertTrue(game.trigger(0, farm.id, dict()))
+        game.process_queue()
+        self.assertEqual(game.list_grants(0), (harvest,))
+        self.assertEqual(game.list_grants(0, blocked=True), (harvest,))
+
+    def test_client_dependencies(self):
+        self.game = game = Engine()
+        game.players.append(1)
+        game.initialize()
+        client = Engine(client=True)
+        client.initialize(game.initialization_data)
+        client.set_state(game.loads(game.dumps(game.get_state(1))))
+        game.observe(1, lambda game, seq, player, notice: client.dispatch(client, seq, player, notice))
+
+        # Requirements are met by the grants of the same player only
+        key = Grant(name="noop")
+        door = Grant(name="noop", requires=key.id)
+        game.grant(0, key)
+        game.grant(1, door)
+        game.process_queue()
+        client.process_queue()
+        for engine in (game, client):
+            self.assertFalse(engine.grant_available(door.id))
+            self.assertEqual(engine.list_grants(1), ())
+
+        game.grant(1, key)
+        game.process_queue()
+        client.process_queue()
+        for engine in (game, client):
+            self.assertTrue(engine.grant_available(door.id))
+            self.assertTrue(engine.grant_available(door.id, 1))
+            self.assertCountEqual(engine.list_grants(1), [ key, door ])
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,86 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: LGPL-3.0
+import unittest
+
+import amethyst_games
+from amethyst_games import NoticeType
+from amethyst_games.plugins import Grid
+
+
+class Engine(amethyst_games.Engine):
+    def __init__(self, *args, grid=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.register_plugin(grid or Grid(width=4, height=3))
+
+
+class GridBasic(unittest.TestCase):
+    def test_place(self):
+        game = Engine()
+        self.assertEqual(game.grid_count_free(), 12)
+        self.assertTrue(game.grid_place((1, 2), "a"))
+        self.assertFalse(game.grid_place((1, 2), "b"))
+        self.assertFalse(game.grid_place((4, 0), "b"))
+        self.assertTrue(game.grid_place((0, 0), "a"))
+        self.assertEqual(game.grid_at((1, 2)), "a")
+        self.assertEqual(game.grid_where("a"), [ (0, 0), (1, 2) ])
+        self.assertEqual(game.grid_count_free(), 10)
+        self.assertNotIn((1, 2), game.grid_free())
+
+        self.assertTrue(game.grid_move((1, 2), (3, 2)))
+        self.assertFalse(game.grid_move((1, 2), (3, 1)))
+        self.assertEqual(game.grid_occupied(), { (0, 0): "a", (3, 2): "a" })
+        self.assertEqual(game.grid_remove((0, 0), (1, 1)), [ "a" ])
+        game.grid_clear()
+        self.assertEqual(game.grid_count_free(), 12)
+
+    def test_neighbors(self):
+        square = Engine()
+        self.assertCountEqual(square.grid_neighbors((0, 0)), [ (1, 0), (0, 1) ])
+        square.grid_place((1, 0), "x")
+        self.assertEqual(square.grid_neighbors((0, 0), free=True), [ (0, 1) ])
+        self.assertEqual(len(square.grid_region((1, 1), 1)), 5)
+
+        board = Engine(grid=Grid(width=4, height=3, shape="square8"))
+        self.assertEqual(len(board.grid_neighbors((1, 1))), 8)
+        self.assertEqual(len(board.grid_region((0, 0), 1)), 4)
+
+        hexes = Engine(grid=Grid(width=5, height=5, shape="hex"))
+        self.assertEqual(len(hexes.grid_neighbors((2, 2))), 6)
+        self.assertCountEqual(hexes.grid_neighbors((0, 0)), [ (1, 0), (0, 1) ])
+        self.assertEqual(len(hexes.grid_region((2, 2), 2)), 19)
+
+    def test_lines(self):
+        game = Engine(grid=Grid(width=4, height=4, shape="square8"))
+        self.assertEqual(game.grid_line((0, 0), (1, 1)), [ (1, 1), (2, 2), (3, 3) ])
+        self.assertEqual(game.grid_line((0, 0), (1, 0), 2), [ (1, 0), (2, 0) ])
+        for cell in ((0, 0), (1, 1), (2, 2)):
+            game.grid_place(cell, 0)
+        game.grid_place((3, 3), 1)
+        self.assertEqual(game.grid_run((1, 1), (1, 1)), [ (0, 0), (1, 1), (2, 2) ])
+        self.assertEqual(game.grid_run((1, 1), (1, 0)), [ (1, 1) ])
+        self.assertEqual(game.grid_rect(0, 0, 1, 5, free=False), [ (0, 0), (1, 1) ])
+
+    def test_sync(self):
+        server = Engine()
+        client = Engine(grid=Grid(id=server.plugins[0].id, width=4, height=3), client=True)
+        notices = []
+        server.observe(None, lambda game, seq, player, notice: notices.append(notice))
+        server.observe(None, lambda game, *args: client.dispatch_immediate(*client.loads(game.dumps([ game, *args ]))))
+
+        server.grid_place((0, 1), "a")
+        server.grid_move((0, 1), (2, 2))
+        server.process_queue()
+        client.process_queue()
+        self.assertEqual([ n.type for n in notices ], [ NoticeType.GRID_SET ] * 2)
+        self.assertEqual(client.grid_where("a"), [ (2, 2) ])
+        self.assertEqual(client.grid_count_free(), 11)
+
+        other = Engine()
+        other.set_state(other.loads(server.dumps(server.get_state(None))))
+        self.assertEqual(other.grid_at((2, 2)), "a")
+        self.assertFalse(other.grid_is_free((2, 2)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: LGPL-3.0
+
+import importlib
+import os
+import subprocess
+import sys
+import unittest
+
+import amethyst_games
+import amethyst_games.plugins
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def run(code):
+    return subprocess.check_output([ sys.executable, "-c", code ], cwd=ROOT).decode().strip()
+
+def loaded_after(code):
+    """Return the amethyst_games modules loaded by running code in a fresh interpreter."""
+    return set(run(code + "\nimport sys; print(' '.join(m for m in sys.modules if m.startswith('amethyst_games')))").split())
+
+
+class MyTest(unittest.TestCase):
+
+    def test_exports(self):
+        for pkg in (amethyst_games, amethyst_games.plugins):
+            for module, names in pkg._exports.items():
+                mod = importlib.import_module(pkg.__name__ + "." + module)
+                self.assertEqual(set(names.split()), set(getattr(mod, "__all__", names.split())), mod.__name__)
+        self.assertIs(amethyst_games.Grant, amethyst_games.plugins.grants.Grant)
+
+    def test_import_budget(self):
+        # Only the modules actually needed are imported
+        self.assertEqual(loaded_after("import amethyst_games"), { "amethyst_games" })
+        self.assertEqual(
+            loaded_after("from amethyst_games import Filter"),
+            { "amethyst_games", "amethyst_games.filters", "amethyst_games.util" }
+        )
+        self.assertNotIn("amethyst_games.plugins", loaded_after("from amethyst_games import Engine"))
+
+    def test_builtin_notice_types(self):
+        self.assertEqual(run("from amethyst_games import NoticeType; print(NoticeType.GRANT)"), "::grant")
+
+    def test_loads_lazy_types(self):
+        from amethyst_games import Engine, Grant, Turns
+        from amethyst_games.engine import _TYPE_MODULES
+        for module in amethyst_games.plugins._exports:
+            self.assertIn("amethyst_games.plugins." + module, _TYPE_MODULES)
+
+        saved = Engine().dumps([ Grant(name="roll"), Turns() ])
+        code = "from amethyst_games import Engine; print(' '.join(type(o).__name__ for o in Engine().loads({!r})))"
+        self.assertEqual(run(code.format(saved)), "Grant Turns")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,18 +3,60 @@
 # SPDX-License-Identifier: LGPL-3.0
 import unittest
 
+from amethyst.core import Object, Attr
+
 import amethyst_games
+from amethyst_games import action, NoticeType
 from amethyst_games.filters import Filter, Filterable
 from amethyst_games.plugins import ObjectStore
+from amethyst_games.storage import Snapshot, SqliteStorage
 
 
 class Engine(amethyst_games.Engine):
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, store=None, **kwargs):
         super().__init__(*args, **kwargs)
-        self.register_plugin(ObjectStore())
+        self.register_plugin(store or ObjectStore())
+        self.register_plugin(Mutator())
         self.players.append(0)
 
 
+class Card(Object):
+    owner = Attr(int)
+    cost = Attr(int)
+    tapped = Attr(bool)
+
+
+class Deck(Object):
+    cards = Attr(list)
+
+
+class Mutator(amethyst_games.EnginePlugin):
+    AMETHYST_PLUGIN_COMPAT = 1
+
+    @action
+    def deal(self, game, stash):
+        for i in range(10):
+            for p in game.players:
+                game.stor_set_player(p, "card-{}-{}".format(p, i), Card(owner=p, cost=i))
+        game.stor_set_shared("discard", Card(cost=0))
+        game.stor_set_shared("discard", Card(cost=1))
+        game.stor_set_shared("temp", Card())
+        game.stor_del("temp", "card-1-9")
+
+    @action
+    def tap(self, game, stash, id):
+        card = game.stor_get(id)
+        card.tapped = True
+        card.cost = 1
+
+
+def connect(server, client, player):
+    """Send server notices for player to client through a json round-trip."""
+    def cb(game, seq, player_num, notice):
+        client.dispatch_immediate(*client.loads(game.dumps([ game, seq, player_num, notice ])))
+    server.observe(player, cb)
+
+
 class ObjectStoreListShared(unittest.TestCase):
     def setUp(self):
         self.game = Engine()
@@ -48,5 +90,232 @@ class ObjectStoreListShared(unittest.TestCase):
         )
 
 
+class ObjectStoreLookup(unittest.TestCase):
+    def setUp(self):
+        self.game = Engine()
+        self.game.players.extend([1, 2])
+
+    def test_get_and_del(self):
+        game = self.game
+        shared = Filterable(name='shared')
+        mine = Filterable(name='mine')
+        game.stor_set_shared(shared.id, shared)
+        game.stor_set_player(1, mine.id, mine)
+        game.stor_set_player(2, mine.id, mine)
+
+        self.assertIs(game.stor_get(shared.id), shared)
+        self.assertIs(game.stor_get(mine.id), mine)
+        self.assertIsNone(game.stor_get('nonesuch'))
+
+        game.stor_del_player(1, mine.id)
+        self.assertIs(game.stor_get(mine.id), mine)
+        game.stor_del(mine.id, shared.id)
+        self.assertIsNone(game.stor_get(mine.id))
+        self.assertIsNone(game.stor_get(shared.id))
+        self.assertEqual(game.stor_list_player(2), [])
+
+
+class ObjectStoreTracking(unittest.TestCase):
+    def test_patch(self):
+        server = Engine(store=ObjectStore(track_changes=True))
+        client = Engine(store=ObjectStore(id=server.plugins[0].id), client=True)
+        notices = []
+        connect(server, client, 0)
+        server.observe(0, lambda game, seq, player, notice: notices.append(notice))
+
+        shared, mine = Card(cost=3), Card(owner=0, cost=5)
+        server.stor_set_shared("shared", shared)
+        server.stor_set_player(0, "mine", mine)
+        server.process_queue()
+        del notices[:]
+
+        server.call_immediate("tap", dict(id="shared"))
+        server.call_immediate("tap", dict(id="mine"))
+        server.process_queue()
+
+        patches = [ n for n in notices if n.type == NoticeType.STORE_PATCH ]
+        self.assertEqual(len(patches), 2)
+        self.assertEqual(patches[0].data, dict(shared={ "shared": dict(set=dict(tapped=True, cost=1)) }))
+        self.assertEqual(patches[1].data, dict(player={ 0: { "mine": dict(set=dict(tapped=True, cost=1)) } }))
+
+        client.process_queue()
+        self.assertEqual(client.stor_get("shared"), Card(cost=1, tapped=True))
+        self.assertEqual(client.stor_get("mine"), Card(owner=0, cost=1, tapped=True))
+
+        # Removed objects are no longer tracked
+        server.stor_del("shared")
+        server.process_queue()
+        del notices[:]
+        shared.tapped = False
+        server.stor_flush()
+        server.process_queue()
+        self.assertEqual(notices, [])
+        self.assertIs(type(shared.dict), dict)
+
+    def test_snapshot(self):
+        game = Engine(store=ObjectStore(track_changes=True))
+        game.players.append(1)
+        game.call_immediate("deal")
+        first = game.get_state(amethyst_games.GAME_MASTER)['plugin_state'][0]
+        self.assertIsInstance(first['_storage'], Snapshot)
+        self.assertEqual(first['_player_storage'][0]["card-0-3"], Card(owner=0, cost=3))
+
+        game.call_immediate("tap", dict(id="card-0-3"))
+        game.stor_del_player(1, "card-1-0")
+        second = game.get_state(amethyst_games.GAME_MASTER)['plugin_state'][0]
+        self.assertEqual(first['_player_storage'][0]["card-0-3"], Card(owner=0, cost=3))
+        self.assertEqual(second['_player_storage'][0]["card-0-3"], Card(owner=0, cost=1, tapped=True))
+        self.assertIs(first['_player_storage'][0]["card-0-4"], second['_player_storage'][0]["card-0-4"])
+        self.assertEqual(len(second['_player_storage'][1]), 8)
+        self.assertIs(game.get_state(None)['plugin_state'][0]['_storage'], second['_storage'])
+
+        other = Engine(store=ObjectStore())
+        other.plugins[0].set_state(other.loads(game.dumps(second)))
+        self.assertEqual(other.stor_get("card-0-3"), Card(owner=0, cost=1, tapped=True))
+        other.plugins[0].set_state(second)
+        other.stor_get("card-0-4").cost = 7
+        self.assertEqual(second['_player_storage'][0]["card-0-4"], Card(owner=0, cost=4))
+
+    def test_snapshot_nested(self):
+        game = Engine(store=ObjectStore(track_changes=True))
+        game.stor_set_shared("deck", Deck(cards=["a", "b"]))
+        game.stor_set_shared("score", dict(points=1))
+        game.stor_set_shared("card", Card(cost=2))
+        first = game.get_state(amethyst_games.GAME_MASTER)['plugin_state'][0]['_storage']
+
+        # Changes inside field values and plain values are not reported
+        game.stor_get("deck").cards.append("c")
+        game.stor_get("score")["points"] = 5
+        second = game.get_state(amethyst_games.GAME_MASTER)['plugin_state'][0]['_storage']
+        self.assertEqual(first["deck"].cards, ["a", "b"])
+        self.assertEqual(second["deck"].cards, ["a", "b", "c"])
+        self.assertEqual(first["score"], dict(points=1))
+        self.assertEqual(second["score"], dict(points=5))
+        self.assertIs(first["card"], second["card"])
+
+
+class ObjectStoreBatch(unittest.TestCase):
+    def setUp(self):
+        self.game = Engine(store=ObjectStore(coalesce=True))
+        self.game.players.append(1)
+        self.seen = dict()
+        for p in (0, 1, None):
+            self.seen[p] = []
+            self.game.observe(p, lambda game, seq, player, notice: self.seen[player].append(notice))
+
+    def test_coalesce(self):
+        game = self.game
+        game.call_immediate("deal")
+        game.process_queue()
+        for p in (0, 1):
+            notices = [ n for n in self.seen[p] if n.type != NoticeType.CALL ]
+            self.assertEqual([ n.type for n in notices ], [ NoticeType.STORE_SET, NoticeType.STORE_DEL ])
+            self.assertEqual(notices[0].data['shared'], { "discard": Card(cost=1) })
+            self.assertEqual(len(notices[0].data['player'][p]), 10 if p == 0 else 9)
+        self.assertEqual(self.seen[1][1].data, dict(shared=("temp",), player={ 1: ["card-1-9"] }))
+        self.assertEqual(len(self.seen[None]), 3)   # STORE_SET, STORE_DEL, CALL
+        self.assertIsNone(game.stor_get("temp"))
+
+    def test_many(self):
+        game = self.game
+        game.plugins[0].coalesce = False
+        game.stor_set_shared_many({ "a": Card(), "b": Card() })
+        game.stor_set_player_many(0, [ ("c", Card()), ("d", Card()) ])
+        game.stor_del_many(shared=["a"], player={ 0: ["c"] })
+        game.process_queue()
+        self.assertEqual([ n.type for n in self.seen[None] ], [ NoticeType.STORE_SET, NoticeType.STORE_DEL ])
+        self.assertEqual([ n.type for n in self.seen[0] ], [ NoticeType.STORE_SET, NoticeType.STORE_SET, NoticeType.STORE_DEL ])
+        self.assertEqual(self.seen[0][2].data, dict(shared=("a",), player={ 0: ["c"] }))
+        self.assertEqual(game.stor_list_player(0), [ Card() ])
+
+
+class ObjectStoreIndexes(unittest.TestCase):
+    def setUp(self):
+        self.game = Engine(store=ObjectStore(track_changes=True, indexes=dict(owner="hash", tapped="hash", cost="sorted")))
+        self.game.players.append(1)
+        self.game.call_immediate("deal")
+
+    def test_find(self):
+        game = self.game
+        self.assertEqual(len(game.stor_find_player(0, owner=0)), 10)
+        self.assertEqual(game.stor_find_player(1, owner=0), [])
+        self.assertEqual(game.stor_find_player(1, owner=1, cost=3), [ Card(owner=1, cost=3) ])
+        self.assertEqual(game.stor_find(cost=1), [ Card(cost=1) ])
+        with self.assertRaises(Exception):
+            game.stor_find(name="discard")
+
+        # Tracked changes update the index
+        game.call_immediate("tap", dict(id="card-1-3"))
+        self.assertEqual(game.stor_find_player(1, tapped=True), [ Card(owner=1, cost=1, tapped=True) ])
+        self.assertEqual(game.stor_find_player(1, cost=3), [])
+        game.stor_del_player(1, "card-1-3")
+        self.assertEqual(game.stor_find_player(1, tapped=True), [])
+
+    def test_range(self):
+        game = self.game
+        self.assertEqual([ c.cost for c in game.stor_range_player(0, "cost", 2, 5) ], [2, 3, 4, 5])
+        self.assertEqual([ c.cost for c in game.stor_range_player(1, "cost", 7) ], [7, 8])
+        self.assertEqual(len(game.stor_range_player(0, "cost", hi=4)), 5)
+        with self.assertRaises(Exception):
+            game.stor_range("owner", 0, 1)
+
+
+class ObjectStoreSqlite(unittest.TestCase):
+    def setUp(self):
+        self.storage = SqliteStorage(cache_size=4)
+        self.game = Engine(store=ObjectStore(storage=self.storage, track_changes=True))
+
+    def test_storage(self):
+        game = self.game
+        game.call_immediate("deal")
+        self.assertLessEqual(len(self.storage._cache), 4)
+        self.assertEqual(game.stor_get("card-0-3"), Card(owner=0, cost=3))
+        self.assertEqual(len(game.stor_list_player(0)), 10)
+        self.assertIsNone(game.stor_get("temp"))
+
+        # Evicted objects are reloaded, tracked changes written back
+        game.call_immediate("tap", dict(id="card-0-3"))
+        self.storage._cache.clear()
+        self.assertEqual(game.stor_get("card-0-3"), Card(owner=0, cost=1, tapped=True))
+
+        state = game.plugins[0].get_state(amethyst_games.GAME_MASTER)
+        self.assertEqual(len(state['_player_storage'][0]), 10)
+        self.assertEqual(state['_storage'], { "discard": Card(cost=1) })
+
+    def test_indexed_filter(self):
+        game = self.game
+        objects = [
+            Filterable(name='a', flags=set('abd')),
+            Filterable(name='b', flags=set('bcd')),
+            Filterable(name='c', flags=set('abc')),
+        ]
+        for obj in objects:
+            game.stor_set_shared(obj.id, obj)
+        self.storage._cache.clear()
+        self.assertCountEqual(game.stor_list_shared(Filter(flag='a')), [objects[0], objects[2]])
+        self.assertEqual(len(self.storage._cache), 2)
+        self.assertEqual(game.stor_list_shared(Filter(name='b')), [objects[1]])
+
+    def test_shared_database(self):
+        other = Engine(store=ObjectStore(storage=self.storage))
+        self.game.call_immediate("deal")
+        other.call_immediate("deal")
+        other.stor_set_shared("discard", Card(cost=5))
+        self.assertEqual(self.game.stor_get("discard"), Card(cost=1))
+        self.assertEqual(other.stor_get("discard"), Card(cost=5))
+
+    def test_lazy_indexes(self):
+        game = Engine(store=ObjectStore(storage=self.storage, indexes=dict(cost="sorted")))
+        game.call_immediate("deal")
+        state = game.plugins[0].get_state(amethyst_games.GAME_MASTER)
+        game.plugins[0].set_state(state)
+        self.storage._cache.clear()
+        game.plugins[0].initialize(game)
+        # Indexes are built on use, without loading the store into the cache
+        self.assertEqual(len(self.storage._cache), 0)
+        self.assertEqual([ c.cost for c in game.stor_range_player(0, "cost", 8) ], [8, 9])
+        self.assertEqual(len(self.storage._cache), 2)
+
+
 if __name__ == '__main__':
     unittest.main()
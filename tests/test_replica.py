@@ -0,0 +1,73 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: LGPL-3.0
+import unittest
+
+import amethyst_games
+from amethyst_games import ReplicaReader, ReplicaWriter, TimerQueue
+from amethyst_games.plugins import ObjectStore, Replica
+
+
+class Engine(amethyst_games.Engine):
+    def __init__(self, *args, replica=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.register_plugin(ObjectStore(track_changes=True))
+        self.register_plugin(replica or Replica())
+
+
+class ReplicaSegment(unittest.TestCase):
+    def test_seqlock(self):
+        writer = ReplicaWriter(size=64)
+        self.addCleanup(writer.close)
+        reader = ReplicaReader(writer.name)
+        self.addCleanup(reader.close)
+
+        self.assertEqual(reader.read(), (0, b""))
+        writer.publish(b'{"a": 1}')
+        self.assertEqual(reader.load(), (1, dict(a=1)))
+        with self.assertRaises(Exception):
+            writer.publish(b"x" * 65)
+
+        # Write in progress
+        writer.shm.buf[8] += 1
+        with self.assertRaises(TimeoutError):
+            reader.read(timeout=0.01)
+
+
+class ReplicaPlugin(unittest.TestCase):
+    def test_publish(self):
+        timers = TimerQueue(thread=False)
+        game = Engine(timers=timers)
+        game.register_plugin(Mutator())
+        self.addCleanup(game.replica_close)
+        reader = ReplicaReader(game.replica_name(), loads=game.loads)
+        self.addCleanup(reader.close)
+
+        game.call_immediate("reveal", dict(id="a", value=1))
+        version, state = reader.load()
+        self.assertEqual(version, 1)
+        store = state['plugin_state'][0]
+        self.assertEqual(store['_storage'], dict(a=1))
+        self.assertNotIn('_player_storage', store)
+
+        # Throttled: second action published when the interval expires
+        self.assertGreater(game.plugins[1].min_interval, 0)
+        game.plugins[1].min_interval = 60
+        game.call_immediate("reveal", dict(id="b", value=2))
+        self.assertEqual(reader.version, 1)
+        timers.run_due(timers.clock() + 61)
+        game.process_queue()
+        self.assertEqual(reader.load()[1]['plugin_state'][0]['_storage'], dict(a=1, b=2))
+
+
+class Mutator(amethyst_games.EnginePlugin):
+    AMETHYST_PLUGIN_COMPAT = 1
+
+    @amethyst_games.action
+    def reveal(self, game, stash, id, value):
+        game.stor_set_shared(id, value)
+        game.stor_set_player(0, "secret", value)
+
+
+if __name__ == '__main__':
+    unittest.main()
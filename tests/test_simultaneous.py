@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: LGPL-3.0
+import sys
+if sys.version_info < (3,6):
+    raise Exception("Python 3.6 required -- this is only " + sys.version)
+
+import unittest
+
+from os.path import dirname, abspath
+sys.path.insert(1, dirname(dirname(abspath(__file__))))
+
+import amethyst_games
+from amethyst_games import action, Filter, NoticeType, TimerQueue
+from amethyst_games.plugins import GrantManager, SimultaneousPhase
+
+
+class RockPaperScissors(amethyst_games.EnginePlugin):
+    AMETHYST_PLUGIN_COMPAT = 1
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.results = []
+        self.next_phase = "again"
+
+    @action
+    def begin_round(self, game, stash, timeout=None):
+        game.phase_open("throw", timeout=timeout)
+
+    @action
+    def phase_submit(self, game, stash, player_num, choice=None):
+        pass
+
+    @phase_submit.check
+    def phase_submit(self, game, stash, player_num, choice=None):
+        return choice in ("rock", "paper", "scissors")
+
+    @action
+    def phase_resolve(self, game, stash, phase, submissions, missing, generation):
+        self.results.append((phase, submissions, missing))
+        game.phase_open(self.next_phase)
+
+
+class Engine(amethyst_games.Engine):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, timers=TimerQueue(thread=False), **kwargs)
+        self.register_plugin(GrantManager())
+        self.register_plugin(SimultaneousPhase())
+        self.register_plugin(RockPaperScissors())
+        self.players.extend([0, 1, 2])
+
+    def submit(self, player_num, choice):
+        grants = self.list_grants(player_num, Filter(name="phase_submit"))
+        if not grants:
+            return False
+        return self.trigger(player_num, grants[0].id, dict(choice=choice))
+
+
+class PhaseTest(unittest.TestCase):
+    def test_all_submitted(self):
+        game = Engine()
+        calls = []
+        submitted = []
+        game.observe(1, lambda game, seq, player, notice: notice.type == NoticeType.CALL and calls.append(notice))
+        game.observe(1, lambda game, seq, player, notice: notice.type == NoticeType.PHASE_SUBMITTED and submitted.append(notice))
+        game.call_immediate("begin_round")
+        self.assertFalse(game.submit(0, "lizard"))
+        game.process_queue()
+        self.assertTrue(game.submit(0, "rock"))
+        self.assertTrue(game.submit(2, "paper"))
+        game.process_queue()
+        self.assertFalse(game.submit(0, "paper"))
+        self.assertEqual(game.phase_waiting(), [ 1 ])
+        self.assertEqual(game.plugins[2].results, [])
+        self.assertEqual(game.get_state(1)['plugin_state'][1]['choices'], [ None, None, None ])
+
+        self.assertTrue(game.submit(1, "scissors"))
+        game.process_queue()
+        self.assertEqual(game.plugins[2].results, [
+            ("throw", [ [0, "rock"], [1, "scissors"], [2, "paper"] ], []),
+        ])
+        self.assertEqual(game.plugins[1].phase, "again")
+        self.assertEqual(len(game.list_grants(0, Filter(name="phase_submit"))), 1)
+
+        # Player 1 never saw the choices of others before resolution
+        submits = [ n.data for n in calls if n.name == "phase_submit" ]
+        self.assertEqual(submits, [ dict(player_num=1, choice="scissors") ])
+        self.assertEqual([ n.data['player_num'] for n in submitted ], [ 0, 2 ])
+
+    def test_client_mirror(self):
+        server = Engine()
+        server.initialize()
+        clients = dict()
+        for p in (0, 1):
+            client = clients[p] = Engine(client=True)
+            client.initialize(server.initialization_data)
+            client.set_state(server.get_state(p))
+            server.observe(p, lambda game, seq, player, notice, client=client: client.dispatch(client, seq, player, notice))
+        def sync():
+            server.process_queue()
+            for client in clients.values():
+                client.process_queue()
+
+        server.call_immediate("begin_round")
+        sync()
+        self.assertTrue(server.submit(1, "rock"))
+        sync()
+        self.assertTrue(server.submit(2, "paper"))
+        sync()
+        for p, client in clients.items():
+            self.assertEqual(client.phase_waiting(), [ 0 ])
+            self.assertEqual(client.plugins[1].choices, [ None, "rock" if p == 1 else None, None ])
+
+        self.assertTrue(server.submit(0, "scissors"))
+        sync()
+        for client in clients.values():
+            self.assertEqual(client.plugins[1].phase, "again")
+            self.assertEqual(client.plugins[2].results, server.plugins[2].results)
+
+    def test_timeout(self):
+        game = Engine()
+        game.call_immediate("begin_round", dict(timeout=10))
+        game.submit(1, "rock")
+        game.process_queue()
+        game.timers.run_due(game.timers.clock() + 11)
+        game.process_queue()
+        self.assertEqual(game.plugins[2].results, [ ("throw", [ [1, "rock"] ], [ 0, 2 ]) ])
+
+    def test_timeout_race(self):
+        game = Engine()
+        game.plugins[2].next_phase = "throw"
+        game.call_immediate("begin_round", dict(timeout=10))
+        for p, choice in enumerate(("rock", "paper", "scissors")):
+            game.submit(p, choice)
+        # Timeout queued behind the last submission, both resolve the phase
+        game.timers.run_due(game.timers.clock() + 11)
+        game.process_queue()
+        self.assertEqual(game.plugins[2].results, [
+            ("throw", [ [0, "rock"], [1, "paper"], [2, "scissors"] ], []),
+        ])
+        self.assertEqual(game.plugins[1].phase, "throw")
+        self.assertEqual(game.phase_waiting(), [ 0, 1, 2 ])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,271 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: LGPL-3.0
+
+import asyncio
+import os
+import tempfile
+import unittest
+
+from amethyst.core import Attr
+
+import amethyst_games
+from amethyst_games import EnginePlugin, action
+from amethyst_games.plugins import Grant, GrantManager
+from amethyst_games.transport import ClientConnection, GameClient, GameServer
+
+
+class Counter(EnginePlugin):
+    AMETHYST_PLUGIN_COMPAT = 1
+    count = Attr(int, default=0)
+
+    @action
+    def bump(self, game, stash, player_num, by=1):
+        self.count += by
+
+
+class Engine(amethyst_games.Engine):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.register_plugin(GrantManager())
+        self.register_plugin(Counter())
+
+
+async def until(cond, timeout=5):
+    deadline = asyncio.get_event_loop().time() + timeout
+    while not cond():
+        if asyncio.get_event_loop().time() > deadline:
+            raise AssertionError("timed out")
+        await asyncio.sleep(0.01)
+
+
+class MyTest(unittest.TestCase):
+
+    def play(self, listen, connect):
+        async def main():
+            game = Engine(dict(players=[0, 1]))
+            game.initialize()
+            grant = Grant(name="bump", repeatable=True, kwargs=dict(player_num=1))
+            game.grant(1, grant)
+            game.process_queue()
+
+            server = GameServer(game)
+            await listen(server)
+            client1 = await connect(GameClient(Engine(client=True), player=1))
+            client0 = await connect(GameClient(Engine(client=True), player=0))
+            seen = []
+            client0.on_notice.append(lambda engine, seq, player, notice: seen.append(notice.type))
+
+            # Client state came from the server, including its grants
+            self.assertIsNotNone(client1.engine.find_grant(1, grant.id))
+            self.assertIsNone(client0.engine.find_grant(1, grant.id))
+
+            client1.trigger(grant.id, dict(by=2))
+            client1.trigger(grant.id, dict(by=3))
+            await until(lambda: client0.engine.plugins[1].count == 5)
+            self.assertEqual(game.plugins[1].count, 5)
+            self.assertEqual(client1.engine.plugins[1].count, 5)
+            self.assertEqual(seen, [ amethyst_games.NoticeType.CALL ] * 2)
+
+            await client0.close()
+            await until(lambda: len(server.connections) == 1)
+            await client1.close()
+            await server.close()
+        asyncio.run(main())
+
+    def test_tcp(self):
+        port = []
+        async def listen(server):
+            srv = await server.start_tcp("127.0.0.1", 0)
+            port.append(srv.sockets[0].getsockname()[1])
+        async def connect(client):
+            return await client.connect_tcp("127.0.0.1", port[0])
+        self.play(listen, connect)
+
+    @unittest.skipUnless(hasattr(asyncio, "start_unix_server"), "Unix sockets not supported")
+    def test_unix(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "game.sock")
+            async def listen(server):
+                await server.start_unix(path)
+            async def connect(client):
+                return await client.connect_unix(path)
+            self.play(listen, connect)
+
+    def test_compression(self):
+        async def main():
+            game = Engine(dict(players=[0, 1]))
+            game.initialize()
+            grant = Grant(name="bump", repeatable=True, kwargs=dict(player_num=1))
+            game.grant(1, grant)
+            game.process_queue()
+
+            server = GameServer(game)
+            srv = await server.start_tcp("127.0.0.1", 0)
+            addr = srv.sockets[0].getsockname()[:2]
+            plain = await GameClient(Engine(client=True), player=0).connect_tcp(*addr)
+            packed = await GameClient(Engine(client=True), player=1, compress=True).connect_tcp(*addr)
+            self.assertFalse(plain.compressed)
+            self.assertTrue(packed.compressed)
+            self.assertIsNotNone(packed.engine.find_grant(1, grant.id))
+            start = plain.received, packed.received
+
+            for i in range(50):
+                packed.trigger(grant.id, dict(by=1))
+            await until(lambda: plain.engine.plugins[1].count == 50 and packed.engine.plugins[1].count == 50)
+            # Repetitive notices compress well
+            self.assertLess(packed.received - start[1], (plain.received - start[0]) / 3)
+
+            await plain.close()
+            await packed.close()
+            await server.close()
+        asyncio.run(main())
+
+    def test_backpressure(self):
+        async def main():
+            game = Engine()
+            game.initialize()
+            server = GameServer(game, max_buffer=1000)
+            srv = await server.start_tcp("127.0.0.1", 0)
+            reader, writer = await asyncio.open_connection(*srv.sockets[0].getsockname()[:2])
+            writer.write(b"O" + (1).to_bytes(4, "big") + (2).to_bytes(4, "big") + b"{}")
+            await until(lambda: server.connections)
+            conn = next(iter(server.connections))
+            # Client never reads: queue far more than the buffer limit
+            for i in range(100):
+                conn.send(b"x" * 100)
+            self.assertTrue(conn.closed)
+            writer.close()
+            await server.close()
+        asyncio.run(main())
+
+    def test_multiplex(self):
+        async def main():
+            games = dict(a=Engine(dict(players=[0, 1])), b=Engine(dict(players=[0, 1])))
+            grants = dict()
+            for name, game in games.items():
+                game.initialize()
+                grants[name] = Grant(name="bump", repeatable=True, kwargs=dict(player_num=0))
+                game.grant(0, grants[name])
+                game.process_queue()
+
+            server = GameServer(games)
+            srv = await server.start_tcp("127.0.0.1", 0)
+            conn = await ClientConnection().connect_tcp(*srv.sockets[0].getsockname()[:2])
+            chans = dict()
+            seqs = dict()
+            for name in games:
+                for player in (0, 1):
+                    chan = await conn.open(Engine(client=True), player=player, game=name, compress=(player == 1))
+                    seqs[name, player] = []
+                    chan.on_notice.append(lambda engine, seq, p, notice, key=(name, player): seqs[key].append(seq))
+                    chans[name, player] = chan
+            self.assertEqual(len(server.connections), 1)
+            with self.assertRaises(ConnectionError):
+                await conn.open(Engine(client=True), game="nope")
+
+            # Triggers go to the game of their channel
+            chans["a", 0].trigger(grants["a"].id, dict(by=2))
+            chans["b", 0].trigger(grants["b"].id, dict(by=3))
+            chans["b", 0].trigger(grants["b"].id, dict(by=4))
+            await until(lambda: all(len(seqs["b", p]) == 2 and len(seqs["a", p]) == 1 for p in (0, 1)))
+            self.assertEqual(games["a"].plugins[1].count, 2)
+            self.assertEqual(games["b"].plugins[1].count, 7)
+            self.assertEqual(chans["a", 1].engine.plugins[1].count, 2)
+            self.assertEqual(chans["b", 1].engine.plugins[1].count, 7)
+            self.assertTrue(chans["b", 1].compressed)
+            self.assertFalse(chans["b", 0].compressed)
+            # Every channel counts its own notices
+            self.assertEqual(seqs["a", 0][0], seqs["a", 1][0])
+            self.assertEqual(seqs["b", 0], [ seqs["b", 0][0], seqs["b", 0][0] + 1 ])
+
+            # Closing a channel leaves the others open
+            chans["a", 0].close()
+            await until(lambda: len(games["a"].notified.get(0, ())) == 0)
+            chans["b", 0].trigger(grants["b"].id, dict(by=1))
+            await until(lambda: chans["b", 1].engine.plugins[1].count == 8)
+            self.assertEqual(chans["a", 0].closed, "closed")
+            self.assertIsNone(chans["a", 1].closed)
+
+            await conn.close()
+            self.assertEqual(chans["b", 1].closed, "connection closed")
+            await server.close()
+        asyncio.run(main())
+
+    def test_channel_errors(self):
+        async def main():
+            games = dict(a=Engine(dict(players=[0])), b=Engine(dict(players=[0])))
+            grants = dict()
+            for name, game in games.items():
+                game.initialize()
+                grants[name] = Grant(name="bump", repeatable=True, kwargs=dict(player_num=0))
+                game.grant(0, grants[name])
+                game.process_queue()
+
+            server = GameServer(games)
+            srv = await server.start_tcp("127.0.0.1", 0)
+            conn = await ClientConnection().connect_tcp(*srv.sockets[0].getsockname()[:2])
+            bad = await conn.open(Engine(client=True), player=0, game="a")
+            good = await conn.open(Engine(client=True), player=0, game="b")
+            other = await conn.open(Engine(client=True), player=0, game="a")
+
+            # An action which raises closes only its own channel
+            bad.trigger(grants["a"].id, dict(by="oops"))
+            await until(lambda: bad.closed is not None)
+            good.trigger(grants["b"].id, dict(by=2))
+            await until(lambda: good.engine.plugins[1].count == 2)
+            self.assertIsNone(other.closed)
+            self.assertEqual(len(server.connections), 1)
+
+            # Malformed payloads too
+            conn._conn.send_frame(b"T", other.id, "not json")
+            await until(lambda: other.closed is not None)
+            good.trigger(grants["b"].id, dict(by=3))
+            await until(lambda: good.engine.plugins[1].count == 5)
+
+            # The pump survives a raising action
+            games["b"].schedule("bump", dict(player_num=0, by="oops"))
+            await asyncio.sleep(2 * server.interval)
+            good.trigger(grants["b"].id, dict(by=1))
+            await until(lambda: good.engine.plugins[1].count == 6)
+
+            await conn.close()
+            await server.close()
+        with self.assertWarns(Warning):
+            asyncio.run(main())
+
+    def test_client_channel_errors(self):
+        async def main():
+            game = Engine(dict(players=[0]))
+            game.initialize()
+            grant = Grant(name="bump", repeatable=True, kwargs=dict(player_num=0))
+            game.grant(0, grant)
+            game.process_queue()
+
+            server = GameServer(game)
+            srv = await server.start_tcp("127.0.0.1", 0)
+            conn = await ClientConnection().connect_tcp(*srv.sockets[0].getsockname()[:2])
+            a = await conn.open(Engine(client=True), player=0)
+            b = await conn.open(Engine(client=True), player=0)
+            def fail(engine, seq, player, notice):
+                raise RuntimeError("callback failed")
+            a.on_notice.append(fail)
+
+            # A raising callback closes only its own channel
+            a.trigger(grant.id, dict(by=2))
+            await until(lambda: a.closed is not None)
+            self.assertEqual(a.closed, "callback failed")
+            await until(lambda: b.engine.plugins[1].count == 2)
+            b.trigger(grant.id, dict(by=3))
+            await until(lambda: b.engine.plugins[1].count == 5)
+            self.assertIsNone(b.closed)
+            await until(lambda: len(game.notified.get(0, ())) == 1)
+
+            await conn.close()
+            await server.close()
+        with self.assertWarns(Warning):
+            asyncio.run(main())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: LGPL-3.0
+import unittest
+
+from amethyst.core import Attr
+
+import amethyst_games
+from amethyst_games import action
+from amethyst_games.plugins import Turns
+
+
+class Counter(amethyst_games.EnginePlugin):
+    AMETHYST_PLUGIN_COMPAT = 1
+    total = Attr(int, default=0)
+
+    @action
+    def begin(self, game, stash):
+        game.turn_start()
+
+    @action
+    def add(self, game, stash, n):
+        self.total += n
+
+    @action
+    def end_turn(self, game, stash):
+        game.notify(None, amethyst_games.Notice(type=amethyst_games.NoticeType.CALL, name="noop"))
+        game.turn_start()
+
+
+class Engine(amethyst_games.Engine):
+    def __init__(self, *args, turns=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.register_plugin(turns or Turns(checkpoint_every=1))
+        self.register_plugin(Counter())
+        self.players.extend([0, 1])
+
+    def play(self):
+        self.call_immediate("begin")
+        for turn in range(6):
+            self.call_immediate("add", dict(n=turn))
+            self.call_immediate("add", dict(n=100))
+            self.call_immediate("end_turn")
+
+
+class TurnTimeline(unittest.TestCase):
+    def test_rounds(self):
+        game = Engine()
+        game.play()
+        self.assertEqual([ (e['turn'], e['round'], e['player']) for e in game.turn_history()[:4] ],
+                         [ (0, 0, 0), (1, 0, 1), (2, 1, 0), (3, 1, 1) ])
+
+    def test_show(self):
+        game = Engine()
+        game.play()
+        shown = game.turn_show(2)
+        self.assertEqual((shown['turn'], shown['player']), (2, 0))
+        self.assertEqual(shown['actions'], [ ("add", dict(n=2)), ("add", dict(n=100)), ("end_turn", dict()) ])
+        self.assertEqual(game.turn_show(6)['actions'], [])
+
+    def test_rewind(self):
+        for every in (1, 4):
+            game = Engine(turns=Turns(checkpoint_every=every))
+            notices = []
+            game.observe(None, lambda game, seq, player, notice: notices.append(notice))
+            game.play()
+            game.process_queue()
+            total = game.plugins[1].total
+            seen = len(notices)
+
+            game.turn_rewind(3)
+            self.assertEqual(game.turn_number(), 3)
+            self.assertEqual(game.turn_player_num(), 1)
+            self.assertEqual(game.plugins[1].total, 0 + 1 + 2 + 300)
+            self.assertEqual(len(game.turn_history()), 4)
+            game.process_queue()
+            self.assertEqual(len(notices), seen)
+
+            # Play continues from the rewound turn
+            for turn in range(3, 6):
+                game.call_immediate("add", dict(n=turn))
+                game.call_immediate("add", dict(n=100))
+                game.call_immediate("end_turn")
+            self.assertEqual(game.plugins[1].total, total)
+            self.assertEqual(game.turn_show(4)['actions'], [ ("add", dict(n=4)), ("add", dict(n=100)), ("end_turn", dict()) ])
+
+        with self.assertRaises(Exception):
+            game.turn_rewind(42)
+
+    def test_limits(self):
+        game = Engine(turns=Turns())
+        game.play()
+        self.assertEqual(game.turn_history(), [])
+
+        game = Engine(turns=Turns(checkpoint_every=2, timeline_limit=3))
+        game.play()
+        self.assertEqual([ e['turn'] for e in game.turn_history() ], [4, 5, 6])
+        game.turn_rewind(5)
+        self.assertEqual(game.plugins[1].total, 0 + 1 + 2 + 3 + 4 + 500)
+        with self.assertRaises(Exception):
+            game.turn_rewind(2)
+
+
+if __name__ == '__main__':
+    unittest.main()